@@ -0,0 +1,208 @@
+# active_test.py
+# In-process cache for the latest active test_id
+#
+# Every bot message used to run a sorted find_one on active_test_ids (often
+# twice per message). The cache answers from memory while the value is fresh
+# (ACTIVE_TEST_TTL seconds) and can be pushed a new value by a watcher that
+# follows a change stream, or polls when change streams are unavailable
+# (standalone MongoDB). Hit/miss counters are exposed through stats().
+#
+#   AsyncActiveTestCache - for motor / storage.py collections (bots)
+#   ActiveTestCache      - for pymongo collections (APIs, evaluator)
+
+import asyncio
+import os
+import threading
+import time
+
+ACTIVE_TEST_TTL = float(os.getenv("ACTIVE_TEST_TTL", "5"))
+ACTIVE_TEST_POLL_INTERVAL = float(os.getenv("ACTIVE_TEST_POLL_INTERVAL", "2"))
+DEFAULT_TEST_ID = "default"
+
+ACTIVE_QUERY = {"status": "active"}
+ACTIVE_SORT = [("created_at", -1)]
+WATCH_PIPELINE = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+
+
+class _CacheState:
+    """TTL bookkeeping shared by the sync and async caches"""
+
+    def __init__(self, ttl=ACTIVE_TEST_TTL, default=DEFAULT_TEST_ID):
+        self.ttl = ttl
+        self.default = default
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.pushes = 0
+        self._value = None
+        self._expires_at = 0.0
+
+    def _fresh(self):
+        return self._value is not None and time.monotonic() < self._expires_at
+
+    def _store(self, doc):
+        test_id = doc['test_id'] if doc else self.default
+        if test_id != self._value:
+            if doc:
+                print(f"✅ Retrieved latest Test ID from database: {test_id}")
+            else:
+                print("⚠️  No active test_id found in database. Using default.")
+        self._value = test_id
+        self._expires_at = time.monotonic() + self.ttl
+        return test_id
+
+    def set(self, test_id):
+        """Push a known value (e.g. right after creating a test)"""
+        self.pushes += 1
+        self._value = test_id
+        self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self):
+        """Force the next lookup to hit the database"""
+        self._expires_at = 0.0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "test_id": self._value,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "refreshes": self.refreshes,
+            "pushes": self.pushes,
+            "ttl": self.ttl
+        }
+
+
+class AsyncActiveTestCache(_CacheState):
+    """Active test cache for an awaitable (motor-like) collection"""
+
+    def __init__(self, collection, ttl=ACTIVE_TEST_TTL, default=DEFAULT_TEST_ID):
+        super().__init__(ttl, default)
+        self.collection = collection
+        self._lock = None
+        self._watcher = None
+
+    async def refresh(self):
+        """Reload the active test_id from MongoDB"""
+        self.refreshes += 1
+        doc = await self.collection.find_one(ACTIVE_QUERY, sort=ACTIVE_SORT)
+        return self._store(doc)
+
+    async def get(self, refresh=False):
+        """Return the latest active test_id (from memory when fresh)"""
+        if not refresh and self._fresh():
+            self.hits += 1
+            return self._value
+
+        self.misses += 1
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # Another coroutine may have refreshed while we waited
+            if not refresh and self._fresh():
+                return self._value
+            return await self.refresh()
+
+    async def watch(self, poll_interval=ACTIVE_TEST_POLL_INTERVAL):
+        """Keep the cache current: change stream if supported, polling otherwise"""
+        try:
+            async with self.collection.watch(WATCH_PIPELINE) as stream:
+                print("📡 Active test watcher: change stream")
+                async for _ in stream:
+                    await self.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"📡 Active test watcher: polling every {poll_interval}s ({type(e).__name__})")
+
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"❌ Active test refresh failed: {e}")
+            await asyncio.sleep(poll_interval)
+
+    def start_watcher(self, poll_interval=ACTIVE_TEST_POLL_INTERVAL):
+        """Start the watcher task on the running loop (idempotent)"""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self.watch(poll_interval))
+        return self._watcher
+
+    async def stop_watcher(self):
+        if self._watcher:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._watcher = None
+
+
+class ActiveTestCache(_CacheState):
+    """Active test cache for a sync pymongo collection"""
+
+    def __init__(self, collection, ttl=ACTIVE_TEST_TTL, default=DEFAULT_TEST_ID):
+        super().__init__(ttl, default)
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Reload the active test_id from MongoDB"""
+        self.refreshes += 1
+        doc = self.collection.find_one(ACTIVE_QUERY, sort=ACTIVE_SORT)
+        return self._store(doc)
+
+    def get(self, refresh=False):
+        """Return the latest active test_id (from memory when fresh)"""
+        if not refresh and self._fresh():
+            self.hits += 1
+            return self._value
+
+        self.misses += 1
+        with self._lock:
+            if not refresh and self._fresh():
+                return self._value
+            return self.refresh()
+
+    def _watch(self, poll_interval):
+        try:
+            with self.collection.watch(WATCH_PIPELINE) as stream:
+                for _ in stream:
+                    if self._stop.is_set():
+                        return
+                    self.refresh()
+        except Exception as e:
+            print(f"📡 Active test watcher: polling every {poll_interval}s ({type(e).__name__}: {e})")
+
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"❌ Active test refresh failed: {e}")
+            self._stop.wait(poll_interval)
+
+    def start_watcher(self, poll_interval=ACTIVE_TEST_POLL_INTERVAL):
+        """Start a daemon thread that keeps the cache current (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, args=(poll_interval,), daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop_watcher(self):
+        self._stop.set()
+
+
+_async_cache = None
+
+
+def get_active_test_cache() -> AsyncActiveTestCache:
+    """Process-wide async cache on top of storage.get_store()"""
+    global _async_cache
+    if _async_cache is None:
+        from storage import get_store
+        _async_cache = AsyncActiveTestCache(get_store().test_collection)
+    return _async_cache
@@ -1,5 +1,5 @@
 import os
-import requests
+import sys
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
@@ -7,6 +7,10 @@ import uvicorn
 from pymongo import MongoClient
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_dispatch import get_dispatcher
+
 load_dotenv()
 
 # MongoDB connection setup
@@ -39,33 +43,6 @@ bot_tokens = {
 YOUR_CHAT_ID = os.getenv("YOUR_TELEGRAM_CHAT_ID")  # Get from @userinfobot
 
 
-def send_start_command_to_bot(token, test_id, bot_name):
-    """
-    Send /start command with test_id to a specific bot
-    """
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    
-    # Message that triggers the bot with test_id
-    message = f"/start {test_id}"
-    
-    payload = {
-        "chat_id": YOUR_CHAT_ID,
-        "text": message
-    }
-    
-    try:
-        response = requests.post(url, data=payload)
-        if response.status_code == 200:
-            print(f"✅ Test ID {test_id} sent to {bot_name}")
-            return True
-        else:
-            print(f"❌ Failed to send to {bot_name}: {response.text}")
-            return False
-    except Exception as e:
-        print(f"❌ Error sending to {bot_name}: {e}")
-        return False
-
-
 @app.get("/send_testid/{test_id}")
 async def send_testid_to_all_bots(test_id: str):
     """
@@ -77,18 +54,27 @@ async def send_testid_to_all_bots(test_id: str):
     print(f"{'='*70}\n")
     
     results = {}
-    success_count = 0
     
-    # Send to all bots
-    for bot_name, token in bot_tokens.items():
-        if token:
-            success = send_start_command_to_bot(token, test_id, bot_name)
-            results[bot_name] = "sent" if success else "failed"
-            if success:
-                success_count += 1
+    # Send /start <test_id> to all bots at once (about one Telegram round-trip in total;
+    # timeout, rate limit and retries - see telegram_dispatch.py)
+    to_send = {bot_name: token for bot_name, token in bot_tokens.items() if token}
+    outcomes = await get_dispatcher().fan_out(
+        [(token, YOUR_CHAT_ID, f"/start {test_id}", bot_name) for bot_name, token in to_send.items()]
+    )
+    sent = {}
+    for bot_name, (success, error) in zip(to_send, outcomes):
+        sent[bot_name] = success
+        if success:
+            print(f"✅ Test ID {test_id} sent to {bot_name}")
+        else:
+            print(f"❌ Failed to send to {bot_name}: {error}")
+    for bot_name in bot_tokens:
+        if bot_name in sent:
+            results[bot_name] = "sent" if sent[bot_name] else "failed"
         else:
             results[bot_name] = "no_token"
             print(f"⚠️  {bot_name}: Token not found in .env")
+    success_count = sum(sent.values())
     
     # Store in MongoDB
     test_data = {
@@ -115,6 +101,11 @@ async def send_testid_to_all_bots(test_id: str):
     }
 
 
+@app.on_event("shutdown")
+async def close_dispatcher():
+    await get_dispatcher().aclose()
+
+
 @app.get("/test_ids")
 async def get_all_test_ids():
     """
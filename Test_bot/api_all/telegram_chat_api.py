@@ -1,5 +1,6 @@
 import os
-from fastapi import FastAPI, HTTPException
+import sys
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
 from dotenv import load_dotenv
@@ -8,6 +9,13 @@ from typing import List, Optional
 from pydantic import BaseModel
 import uvicorn
 
+# Shared bot modules live one level up (Test_bot/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conversation_summary import message_stats
+from db_schema import ensure_indexes
+from pagination import (DEFAULT_PAGE_SIZE, FORMATS, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, after_filter,
+                        date_range, decode_cursor, keyset_stages, ndjson_response, take_page)
+
 load_dotenv()
 
 # MongoDB connection
@@ -19,6 +27,23 @@ friends_collection = db['telegram_friends']
 
 app = FastAPI(title="Telegram Chat API")
 
+# Keyset orders for the list endpoints (the second field makes cursors unique)
+FRIEND_SORT = [("person_id", 1), ("_id", 1)]
+MESSAGE_SORT = [("timestamp", 1), ("_id", 1)]
+MESSAGE_FIELDS = {"person_id": 1, "role": 1, "name": 1, "text": 1, "timestamp": 1}
+
+# Replies slower than this are not counted in the average response time
+MAX_RESPONSE_GAP = 86400
+
+
+@app.on_event("startup")
+def create_indexes():
+    """Make sure the telegram_chats / telegram_friends indexes exist"""
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"[SCHEMA] ⚠️  Could not ensure indexes: {e}")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -94,8 +119,8 @@ def root():
     return {
         "message": "Telegram Chat API",
         "endpoints": {
-            "GET /api/friends": "Get all friends list with start/end time",
-            "GET /api/conversations": "Get all conversations together",
+            "GET /api/friends": "Friends with start/end time (paged: after, limit; filters: date_from, date_to; format=ndjson streams)",
+            "GET /api/conversations": "All messages by timestamp (paged: after, limit; filters: person_id, role, date_from, date_to; format=ndjson streams)",
             "GET /api/messages/{person_id}": "Get stats + messages by person_id",
             "GET /api/stats/{person_id}": "Get statistics for specific person",
             "POST /api/performance/{person_id}": "Update performance for a person"
@@ -103,91 +128,128 @@ def root():
     }
 
 
+def friends_pipeline(date_from=None, date_to=None, after=None, limit=None):
+    """telegram_friends joined with the stats of their telegram_chats messages"""
+    timestamp = date_range(date_from, date_to)
+    lookup = ([{"$match": {"timestamp": timestamp}}] if timestamp else []) + \
+        message_stats(roles=("sender", "receiver"), max_gap_seconds=MAX_RESPONSE_GAP)
+
+    return keyset_stages(FRIEND_SORT, after) + [
+        {"$lookup": {
+            "from": "telegram_chats",
+            "localField": "person_id",
+            "foreignField": "person_id",
+            "pipeline": lookup,
+            "as": "stats"
+        }},
+        # Friends without messages are listed too - unless a date range asks for activity
+        {"$unwind": {"path": "$stats", "preserveNullAndEmptyArrays": timestamp is None}},
+    ] + ([{"$limit": limit + 1}] if limit else [])
+
+
+def friend_row(friend):
+    """Shape one friends_pipeline result like the /api/friends entries"""
+    stats = friend.get("stats") or {}
+    start_time = stats.get("start_time")
+    end_time = stats.get("end_time")
+    duration_seconds = (end_time - start_time).total_seconds() if start_time and end_time else None
+    avg_ms = stats.get("avg_response_ms")
+
+    return {
+        "person_id": friend.get("person_id"),
+        "username": friend.get("username"),
+        "name": friend.get("name"),
+        "duration": format_duration(duration_seconds),
+        "avg_response_time": format_duration(avg_ms / 1000 if avg_ms is not None else None),
+        "performance": friend.get("performance", None),
+        "chat_id": friend.get("chat_id"),
+        "total_messages": stats.get("total_messages", 0),
+        "start_time": start_time,
+        "end_time": end_time
+    }
+
+
 @app.get("/api/friends")
-def get_all_friends():
-    """Get all friends list with start_time and end_time"""
+def get_all_friends(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    format: str = Query("json", pattern=FORMATS)
+):
+    """Friends list with start_time and end_time, one page at a time (by person_id)"""
     try:
-        friends = list(friends_collection.find({}).sort("person_id", 1))
+        if format == "ndjson":
+            cursor = friends_collection.aggregate(
+                friends_pipeline(date_from, date_to, after), batchSize=STREAM_BATCH_SIZE
+            )
+            return ndjson_response(friend_row(friend) for friend in cursor)
         
-        result = []
-        for friend in friends:
-            person_id = friend.get("person_id")
-            
-            # Get messages for this friend to find start/end time
-            messages = list(chat_collection.find(
-                {"person_id": person_id}
-            ).sort("timestamp", 1))
-            
-            msg_count = len(messages)
-            
-            # Get first and last message timestamps
-            start_time = None
-            end_time = None
-            duration_seconds = None
-            
-            if messages:
-                start_time = messages[0].get("timestamp")
-                end_time = messages[-1].get("timestamp")
-                if start_time and end_time:
-                    duration_seconds = (end_time - start_time).total_seconds()
-            
-            # Calculate average response time
-            avg_response_seconds = calculate_avg_response_time(messages)
-            
-            # Get performance from friend document
-            performance = friend.get("performance", None)
-            
-            result.append({
-                "person_id": person_id,
-                "username": friend.get("username"),
-                "name": friend.get("name"),
-                "duration": format_duration(duration_seconds),
-                "avg_response_time": format_duration(avg_response_seconds),
-                "performance": performance,
-                "chat_id": friend.get("chat_id"),
-                "total_messages": msg_count,
-                "start_time": start_time,
-                "end_time": end_time
-            })
+        friends = friends_collection.aggregate(friends_pipeline(date_from, date_to, after, limit))
+        friends, next_cursor = take_page(friends, FRIEND_SORT, limit)
+        result = [friend_row(friend) for friend in friends]
         
         return {
             "total_friends": len(result),
-            "friends": result
+            "friends": result,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {e}")
 
 
+def message_row(msg):
+    return {
+        "person_id": msg.get("person_id"),
+        "role": msg.get("role"),
+        "name": msg.get("name"),
+        "text": msg.get("text"),
+        "timestamp": msg.get("timestamp")
+    }
+
+
 @app.get("/api/conversations")
-def get_all_conversations():
-    """Get all conversations together sorted by timestamp"""
+def get_all_conversations(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    person_id: Optional[int] = None,
+    role: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    format: str = Query("json", pattern=FORMATS)
+):
+    """Messages of all conversations sorted by timestamp, one page at a time"""
     try:
-        # Get all messages sorted by timestamp
-        messages = list(chat_collection.find({}).sort("timestamp", 1))
+        query = {}
+        if person_id is not None:
+            query["person_id"] = person_id
+        if role:
+            query["role"] = role
+        timestamp = date_range(date_from, date_to)
+        if timestamp:
+            query["timestamp"] = timestamp
+        if after:
+            query = {"$and": [query, after_filter(MESSAGE_SORT, decode_cursor(after, MESSAGE_SORT))]}
         
-        if not messages:
-            return {
-                "total_messages": 0,
-                "conversations": []
-            }
+        cursor = chat_collection.find(query, MESSAGE_FIELDS).sort(MESSAGE_SORT)
         
-        # Format messages
-        result = []
-        for msg in messages:
-            result.append({
-                "person_id": msg.get("person_id"),
-                "role": msg.get("role"),
-                "name": msg.get("name"),
-                "text": msg.get("text"),
-                "timestamp": msg.get("timestamp")
-            })
+        if format == "ndjson":
+            return ndjson_response(message_row(msg) for msg in cursor.batch_size(STREAM_BATCH_SIZE))
+        
+        messages, next_cursor = take_page(cursor.limit(limit + 1), MESSAGE_SORT, limit)
+        result = [message_row(msg) for msg in messages]
         
         return {
             "total_messages": len(result),
-            "conversations": result
+            "conversations": result,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {e}")
 
@@ -381,8 +443,8 @@ if __name__ == "__main__":
     print("TELEGRAM CHAT API".center(60))
     print("=" * 60)
     print("\nEndpoints:")
-    print("  GET    /api/friends               - All friends with start/end time")
-    print("  GET    /api/conversations         - All conversations together")
+    print("  GET    /api/friends               - Friends with start/end time (?after=&limit=)")
+    print("  GET    /api/conversations         - All messages by timestamp (?after=&limit=)")
     print("  GET    /api/messages/{person_id}  - Stats + messages")
     print("  GET    /api/stats/{person_id}     - Only statistics")
     print("  POST   /api/performance/{person_id} - Update performance")
@@ -2,7 +2,8 @@
 # Conversation Management API
 
 import os
-from fastapi import FastAPI, HTTPException
+import sys
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
 from dotenv import load_dotenv
@@ -11,6 +12,15 @@ from pydantic import BaseModel
 from typing import List, Optional
 import uvicorn
 
+# Shared bot modules live one level up (Test_bot/)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from active_test import ActiveTestCache
+from db_schema import ensure_indexes
+from conversation_stats import STATS_COLLECTION, ensure_rollup
+from conversation_summary import SCORE_SORT, aggregate_stats, conversation_row, conversations_pipeline, stats_row, with_fresh_stats
+from pagination import (DEFAULT_PAGE_SIZE, FORMATS, MAX_PAGE_SIZE, STREAM_BATCH_SIZE, date_range,
+                        ndjson_response, score_band, take_page)
+
 load_dotenv()
 
 MongoDB_Url = os.getenv("DB_URI")
@@ -19,107 +29,49 @@ db = client['Raihan']
 collection = db['chat_bot']
 scores_collection = db['evaluation_scores']
 test_collection = db['active_test_ids']
+active_tests = ActiveTestCache(test_collection)
 
 SALES_PERSON_USERNAME = os.getenv("SALES_PERSON_USERNAME", "raihantapader")
 
 
 def get_latest_test_id():
-    """Get the most recent active test_id from database"""
+    """Get the most recent active test_id (served from the in-process cache)"""
     try:
-        latest_test = test_collection.find_one(
-            {"status": "active"},
-            sort=[("created_at", -1)]
-        )
-        if latest_test:
-            return latest_test['test_id']
-        return "default"
+        return active_tests.get()
     except Exception as e:
         print(f"[DB] Error: {e}")
         return "default"
 
 
-def calculate_average_response_time(conversation_id: str):
-    """Calculate average response time between customer and salesperson messages"""
-    try:
-        all_messages = list(collection.find(
-            {"conversation_id": conversation_id}
-        ).sort("timestamp", 1))
-        
-        if len(all_messages) < 2:
-            return "N/A"
-        
-        response_times = []
-        
-        for i in range(len(all_messages) - 1):
-            current_msg = all_messages[i]
-            next_msg = all_messages[i + 1]
-            
-            if current_msg.get("role") != next_msg.get("role"):
-                time_diff = next_msg["timestamp"] - current_msg["timestamp"]
-                response_time_seconds = time_diff.total_seconds()
-                if response_time_seconds > 0:
-                    response_times.append(response_time_seconds)
-        
-        if not response_times:
-            return "N/A"
-        
-        avg_response_time = sum(response_times) / len(response_times)
-        
-        if avg_response_time < 60:
-            return f"{avg_response_time:.1f} sec"
-        elif avg_response_time < 3600:
-            return f"{avg_response_time / 60:.1f} min"
-        else:
-            return f"{avg_response_time / 3600:.1f} hr"
-            
-    except Exception as e:
-        print(f"[ERROR] {e}")
-        return "N/A"
+# FastAPI app
+app = FastAPI(
+    title="Conversation Management API",
+    description="API for storing and retrieving Telegram conversations",
+)
 
 
-def extract_score_number(score_str):
-    """
-    Extract numeric score from string like '50/100', '43.2/100'
-    Returns float for sorting (higher = better)
-    """
-    if score_str == "N/A" or score_str is None:
-        return 0
-    
-    try:
-        # Handle format like "50/100" or "43.2/100"
-        if "/" in str(score_str):
-            score_part = str(score_str).split("/")[0]
-            return float(score_part)
-        else:
-            return float(score_str)
-    except (ValueError, TypeError):
-        return 0
+@app.on_event("startup")
+def start_active_test_watcher():
+    """Keep the active test_id cache current in the background"""
+    active_tests.start_watcher()
 
 
-def extract_score_number(score_str):
-    """
-    Extract numeric score from string like '50/100', '43.2/100'
-    Returns float for sorting (higher = better)
-    """
-    if score_str == "N/A" or score_str is None:
-        return 0
-    
+@app.on_event("startup")
+def create_indexes():
+    """Make sure the chat_bot / evaluation_scores / active_test_ids indexes exist"""
     try:
-        # Handle format like "50/100" or "43.2/100"
-        if "/" in str(score_str):
-            score_part = str(score_str).split("/")[0]
-            return float(score_part)
-        else:
-            return float(score_str)
-    except (ValueError, TypeError):
-        return 0
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"[SCHEMA] ⚠️  Could not ensure indexes: {e}")
 
 
-# FastAPI app
-app = FastAPI(
-    title="Conversation Management API",
-    description="API for storing and retrieving Telegram conversations",
-)
+@app.on_event("startup")
+def build_conversation_stats():
+    """Build the conversation_stats rollup the first time (kept current by the bots)"""
+    try:
+        ensure_rollup(db)
+    except Exception as e:
+        print(f"[STATS] ⚠️  Could not build conversation_stats: {e}")
 
 app.add_middleware(
     CORSMiddleware,
@@ -162,9 +114,10 @@ def root():
         "description": "API for storing and retrieving Telegram conversations",
         "endpoints": {
             "GET /api/latest_test_id": "Get the latest active test_id",
+            "GET /api/cache/active_test": "Active test_id cache hit/miss counters",
             "GET /api/room_id/{room_id}/{conversation_id}": "Get all messages for a room and conversation",
-            "GET /api/conversations": "Get all conversations with evaluation scores",
-            "GET /api/stats": "Get all conversation statistics",
+            "GET /api/conversations": "Conversations with evaluation scores (paged: after, limit; filters: room_id, date_from, date_to, min_score, max_score; format=ndjson streams)",
+            "GET /api/stats": "Conversation statistics (same paging and filters)",
             "DELETE /api/test/{test_id}": "Delete a test by test_id"
         }
     }
@@ -180,6 +133,12 @@ def get_current_test_id():
     }
 
 
+@app.get("/api/cache/active_test")
+def get_active_test_cache_stats():
+    """Hit/miss counters of the active test_id cache"""
+    return active_tests.stats()
+
+
 @app.get("/api/{room_id}/{conversation_id}", response_model=List[MessageOutput])
 def get_room_conversation(room_id: int, conversation_id: str):
     """
@@ -216,170 +175,108 @@ def get_room_conversation(room_id: int, conversation_id: str):
         raise HTTPException(status_code=500, detail=f"Error: {e}")
 
 
+def message_filter(room_id: Optional[int] = None, date_from: Optional[datetime] = None,
+                   date_to: Optional[datetime] = None):
+    """chat_bot filter for the messages a summary is computed from"""
+    match = {}
+    if room_id is not None:
+        match["room_id"] = room_id
+    timestamp = date_range(date_from, date_to)
+    if timestamp:
+        match["timestamp"] = timestamp
+    return match or None
+
+
+def score_filter(min_score: Optional[float] = None, max_score: Optional[float] = None):
+    band = score_band(min_score, max_score)
+    return {"score_numeric": band} if band else None
+
+
 @app.get("/api/conversations")
-def get_all_conversations():
+def get_all_conversations(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    room_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    format: str = Query("json", pattern=FORMATS)
+):
     """
-    GET method to fetch all conversations with evaluation scores.
-    Sorted by score (highest first)
+    GET method to fetch conversations with evaluation scores, one page at a time.
+    Sorted by score (highest first). Pass next_cursor back as `after` for the
+    next page, or format=ndjson to stream every match.
     """
     try:
-        evaluated_tests = list(scores_collection.find({}))
-        
-        if not evaluated_tests:
-            return {"total_conversations": 0, "conversations": []}
-        
-        conversations = []
-        
-        for eval_record in evaluated_tests:
-            test_id = eval_record.get("test_id")
-            if not test_id:
-                continue
-            
-            message_count = collection.count_documents({"conversation_id": test_id})
-            if message_count == 0:
-                continue
-            
-            total_messages = message_count
-            customer_messages = collection.count_documents({"conversation_id": test_id, "role": "customer"})
-            salesperson_messages = collection.count_documents({"conversation_id": test_id, "role": "salesperson"})
-            
-            first_msg = collection.find_one({"conversation_id": test_id}, sort=[("timestamp", 1)])
-            last_msg = collection.find_one({"conversation_id": test_id}, sort=[("timestamp", -1)])
-            
-            duration_str = "N/A"
-            if first_msg and last_msg:
-                duration = last_msg["timestamp"] - first_msg["timestamp"]
-                total_seconds = int(duration.total_seconds())
-                hours = total_seconds // 3600
-                total_seconds %= 3600
-                minutes = total_seconds // 60
-                seconds = total_seconds % 60
-                duration_str = f"{hours} Hr {minutes} Min {seconds} Sec"
-            
-            avg_response_time = calculate_average_response_time(test_id)
-            
-            score_display = eval_record.get("score", "N/A")
-            score_numeric = extract_score_number(score_display)
-            
-            conversations.append({
-                "test_id": test_id,
-                "response_time": avg_response_time,
-                "score": score_display,
-                "score_numeric": score_numeric,  # For sorting
-                "english_level": eval_record.get("english_level", "N/A"),
-                "level_description": eval_record.get("assessment", "N/A"),
-                "total_messages": total_messages,
-                "customer_messages": customer_messages,
-                "salesperson_messages": salesperson_messages,
-                "test_duration": duration_str,
-                "start_time": first_msg["timestamp"] if first_msg else None,
-                "end_time": last_msg["timestamp"] if last_msg else None
-            })
+        pipeline = dict(
+            match=score_filter(min_score, max_score),
+            message_match=message_filter(room_id, date_from, date_to),
+            sort=SCORE_SORT,
+            after=after
+        )
         
-        # Sort by score (highest first)
-        conversations.sort(key=lambda x: x["score_numeric"], reverse=True)
+        if format == "ndjson":
+            cursor = scores_collection.aggregate(conversations_pipeline(**pipeline), batchSize=STREAM_BATCH_SIZE)
+            return ndjson_response(conversation_row(doc) for doc in with_fresh_stats(db, cursor))
         
-        # Remove score_numeric from response
-        for conv in conversations:
-            del conv["score_numeric"]
+        docs = scores_collection.aggregate(conversations_pipeline(**pipeline, limit=limit))
+        docs, next_cursor = take_page(docs, SCORE_SORT, limit)
+        conversations = [conversation_row(doc) for doc in with_fresh_stats(db, docs)]
         
-        return {"total_conversations": len(conversations), "conversations": conversations}
+        return {
+            "total_conversations": len(conversations),
+            "conversations": conversations,
+            "next_cursor": next_cursor
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {e}")
 
 
 @app.get("/api/stats")
-def get_all_conversation_stats():
+def get_all_conversation_stats(
+    after: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    room_id: Optional[int] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+    max_score: Optional[float] = None,
+    format: str = Query("json", pattern=FORMATS)
+):
     """
-    GET method to fetch statistics for ALL test_ids.
-    Sorted by score (highest first)
+    GET method to fetch statistics for every test_id, one page at a time.
+    Sorted by score (highest first); same paging and filters as /api/conversations.
     """
     try:
-        # Get all unique test_ids
-        all_test_ids = collection.distinct("conversation_id")
+        pipeline = dict(
+            match=score_filter(min_score, max_score),
+            message_match=message_filter(room_id, date_from, date_to),
+            after=after
+        )
+        
+        if format == "ndjson":
+            cursor = aggregate_stats(db, **pipeline, batchSize=STREAM_BATCH_SIZE)
+            return ndjson_response(stats_row(doc) for doc in with_fresh_stats(db, cursor))
         
-        if not all_test_ids:
+        docs = aggregate_stats(db, **pipeline, limit=limit)
+        docs, next_cursor = take_page(docs, SCORE_SORT, limit)
+        
+        if not docs and after is None:
             raise HTTPException(
                 status_code=404,
                 detail="No conversations found"
             )
         
-        all_stats = []
-        
-        for test_id in all_test_ids:
-            total_messages = collection.count_documents({"conversation_id": test_id})
-            
-            customer_messages = collection.count_documents({
-                "conversation_id": test_id,
-                "role": "customer"
-            })
-            
-            salesperson_messages = collection.count_documents({
-                "conversation_id": test_id,
-                "role": "salesperson"
-            })
-            
-            first_msg = collection.find_one(
-                {"conversation_id": test_id},
-                sort=[("timestamp", 1)]
-            )
-            last_msg = collection.find_one(
-                {"conversation_id": test_id},
-                sort=[("timestamp", -1)]
-            )
-            
-            duration_str = None
-            if first_msg and last_msg:
-                duration = last_msg["timestamp"] - first_msg["timestamp"]
-                total_seconds = int(duration.total_seconds())
-                hours = total_seconds // 3600
-                total_seconds %= 3600
-                minutes = total_seconds // 60
-                seconds = total_seconds % 60
-                duration_str = f"{hours} Hr {minutes} Min {seconds} Sec"
-            
-            result_data = scores_collection.find_one({"test_id": test_id})
-            
-            score_display = "N/A"
-            english_level = "N/A"
-            level_description = "N/A"
-            
-            if result_data:
-                score_display = result_data.get("score", "N/A")
-                english_level = result_data.get("english_level", "N/A")
-                level_description = result_data.get("assessment", "N/A")
-            
-            # Extract numeric score for sorting
-            score_numeric = extract_score_number(score_display)
-            
-            response_time = calculate_average_response_time(test_id)
-            
-            all_stats.append({
-                "test_id": test_id,
-                "total_messages": total_messages,
-                "customer_messages": customer_messages,
-                "salesperson_messages": salesperson_messages,
-                "duration": duration_str,
-                "score": score_display,
-                "score_numeric": score_numeric,  # For sorting
-                "english_level": english_level,
-                "level_description": level_description,
-                "response_time": response_time,
-                "start_time": first_msg["timestamp"] if first_msg else None,
-                "end_time": last_msg["timestamp"] if last_msg else None,
-            })
-        
-        # Sort by score (highest first)
-        all_stats.sort(key=lambda x: x["score_numeric"], reverse=True)
-        
-        # Remove score_numeric from response
-        for stat in all_stats:
-            del stat["score_numeric"]
+        all_stats = [stats_row(doc) for doc in with_fresh_stats(db, docs)]
         
         return {
             "total_tests": len(all_stats),
-            "stats": all_stats
+            "stats": all_stats,
+            "next_cursor": next_cursor
         }
         
     except HTTPException:
@@ -392,7 +289,7 @@ def get_all_conversation_stats():
 def delete_test(test_id: str):
     """
     DELETE method to delete all data for a specific test_id.
-    Deletes from: chat_bot, evaluation_scores, active_test_ids
+    Deletes from: chat_bot, evaluation_scores, active_test_ids, conversation_stats
     """
     try:
         # Check if test_id exists
@@ -410,6 +307,8 @@ def delete_test(test_id: str):
         messages_deleted = collection.delete_many({"conversation_id": test_id})
         scores_deleted = scores_collection.delete_many({"test_id": test_id})
         tests_deleted = test_collection.delete_many({"test_id": test_id})
+        db[STATS_COLLECTION].delete_one({"_id": test_id})
+        active_tests.invalidate()
         
         return {
             "message": f"Test '{test_id}' deleted successfully",
@@ -434,8 +333,8 @@ if __name__ == "__main__":
     print("  GET    /                                  - Root")
     print("  GET    /api/latest_test_id                - Get current active test_id")
     print("  GET    /api/{room_id}/{conversation_id}   - Get room conversation")
-    print("  GET    /api/conversations                 - Get all conversations (sorted by score)")
-    print("  GET    /api/stats                         - Get all stats (sorted by score)")
+    print("  GET    /api/conversations                 - Conversations by score (?after=&limit=, format=ndjson)")
+    print("  GET    /api/stats                         - Stats by score (?after=&limit=, format=ndjson)")
     print("  DELETE /api/test/{test_id}                - Delete a test by test_id")
     print("="*70)
     print("\nServer running at: http://10.10.20.111:8086")
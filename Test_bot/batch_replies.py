@@ -0,0 +1,45 @@
+# batch_replies.py
+# Concurrent, order-preserving reply generation for a batch of queued messages
+#
+# process_batch_responses used to call the LLM once per queued salesperson
+# message, one after another, and sleep 0.5s between sends - a burst of five
+# messages cost five serial round-trips before the last reply went out.
+# generate_in_order() starts up to BATCH_MAX_PARALLEL generations at once and
+# hands the results back strictly in queue order, each as soon as it (and
+# every earlier one) is ready, so the first reply is sent after ~one round-trip.
+#
+# Served serially, each reply also saw the customer's own replies to the earlier
+# messages of the burst. Concurrent generations cannot, so the bots pass every
+# earlier queued salesperson line along with the message being answered.
+
+import asyncio
+import os
+
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", "4"))
+
+
+async def generate_in_order(items, generate, on_ready=None, max_parallel=BATCH_MAX_PARALLEL):
+    """Run `await generate(item)` for every item with at most max_parallel in flight
+
+    `await on_ready(idx, item, result)` is called in input order (idx from 1).
+    Returns the list of results, in input order.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def run(item):
+        async with semaphore:
+            return await generate(item)
+
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    results = []
+    try:
+        for idx, (item, task) in enumerate(zip(items, tasks), 1):
+            result = await task
+            results.append(result)
+            if on_ready:
+                await on_ready(idx, item, result)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+    return results
@@ -0,0 +1,124 @@
+# bench_batch_scoring.py
+# English evaluation: one request per message vs numbered batches with a JSON
+# array reply (EvaluationEngine batch_size), on the fixture corpus
+# evaluation_corpus.json (40 salesperson messages with reference scores).
+#
+# For each batch size it reports requests, prompt / completion tokens, an
+# estimated cost, wall time and accuracy: mean absolute error against the
+# reference scores, how often the score band matches, and how far the scores
+# are from the per-message mode (batch_size 1).
+#
+# Offline (default) the model is a fake server that answers with the
+# reference scores and garbles every 4th batch reply, so the numbers show the
+# token/latency saving and that the fallback works - not real accuracy.
+# With --live the real API is used (aluraagency_OPEPNAI_API_KEY) and the
+# accuracy columns are the real comparison.
+#
+# Usage:  python benchmarks/bench_batch_scoring.py [batch sizes, e.g. 1,5,10,20] [--live]
+
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+
+LIVE = "--live" in sys.argv
+ARGS = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+# batch size 1 (per-message) always runs first - it is the baseline
+BATCH_SIZES = sorted({1, *(int(size) for size in ARGS[0].split(","))}) if ARGS else [1, 5, 10, 20]
+LLM_DELAY = 0.3
+
+# gpt-3.5-turbo list prices, USD per 1M tokens
+PRICE_INPUT = 0.50
+PRICE_OUTPUT = 1.50
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_corpus.json")
+
+
+def fake_rater(reference):
+    """reply_fn answering with the reference scores; every 4th batch reply is prose"""
+    batches = {"count": 0}
+
+    def reply(body):
+        content = body["messages"][-1]["content"]
+        if "JSON array" not in content:
+            text = re.search(r'"(.*)"\n\nRespond', content, re.S).group(1)
+            return str(reference[text])
+        texts = [json.loads(line.split(". ", 1)[1]) for line in content.splitlines() if re.match(r"\d+\. \"", line)]
+        batches["count"] += 1
+        if batches["count"] % 4 == 0:
+            return "Sure! Here are the scores: " + ", ".join(f"#{i} -> {reference[t]}" for i, t in enumerate(texts, 1))
+        return json.dumps([reference[text] for text in texts])
+
+    return reply
+
+
+def band(score):
+    return 0 if score >= 70 else 1 if score >= 50 else 2 if score >= 30 else 3
+
+
+def main():
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = json.load(f)
+    texts = [item["text"] for item in corpus]
+    reference = {item["text"]: item["reference"] for item in corpus}
+
+    llm = None
+    if not LIVE:
+        llm = FakeOpenAIServer(delay=LLM_DELAY)
+        llm.start_in_thread()
+        os.environ["OPENAI_BASE_URL"] = llm.base_url
+        os.environ.setdefault("aluraagency_OPEPNAI_API_KEY", "sk-bench")
+
+    import llm_client
+    from evaluation_engine import EvaluationEngine
+    from test_english_level import SYSTEM_PROMPT, USER_TEMPLATE
+
+    print("=" * 96)
+    print("BATCH SCORING BENCHMARK".center(96))
+    print("=" * 96)
+    print(f"  Corpus: {len(texts)} messages   Mode: {'live API' if LIVE else f'fake model, {LLM_DELAY}s latency'}\n")
+    print(f"  {'batch':>5} {'requests':>9} {'prompt tok':>11} {'compl tok':>10} {'cost $':>9} {'time':>7} "
+          f"{'MAE ref':>8} {'band ok':>8} {'MAE vs 1':>9} {'fallbacks':>10}")
+
+    baseline = None
+    for batch_size in BATCH_SIZES:
+        if llm:
+            llm.reply_fn = fake_rater(reference)
+        for key in llm_client.usage_totals:
+            llm_client.usage_totals[key] = 0
+        # No cache collection: every mode pays for every message
+        engine = EvaluationEngine(f"bench_batch_{batch_size}", SYSTEM_PROMPT, USER_TEMPLATE,
+                                  batch_size=batch_size)
+
+        started = time.perf_counter()
+        scores = engine.score_sync(texts, fallback=None)
+        elapsed = time.perf_counter() - started
+
+        usage = llm_client.usage_totals
+        cost = (usage["prompt_tokens"] * PRICE_INPUT + usage["completion_tokens"] * PRICE_OUTPUT) / 1e6
+        pairs = [(score, reference[text]) for score, text in zip(scores, texts) if score is not None]
+        mae = sum(abs(s - r) for s, r in pairs) / len(pairs) if pairs else float("nan")
+        band_ok = sum(band(s) == band(r) for s, r in pairs) / len(pairs) if pairs else 0
+        if baseline is None:
+            baseline = scores
+        both = [(s, b) for s, b in zip(scores, baseline) if s is not None and b is not None]
+        vs_single = sum(abs(s - b) for s, b in both) / len(both) if both else float("nan")
+
+        print(f"  {batch_size:>5} {engine.stats['api_calls']:>9} {usage['prompt_tokens']:>11} "
+              f"{usage['completion_tokens']:>10} {cost:>9.5f} {elapsed:>6.2f}s {mae:>8.1f} {band_ok:>8.0%} "
+              f"{vs_single:>9.1f} {engine.stats['batch_fallbacks']:>10}")
+        if engine.stats["failures"]:
+            print(f"        {engine.stats['failures']} message(s) could not be scored")
+
+    print("=" * 96)
+    if llm:
+        llm.stop_thread()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# bench_context_window.py
+# Prompt size per turn: full history (old) vs context_window.build_context.
+#
+# Plays one long salesperson test of TURNS exchanges against the fake OpenAI
+# server. The summary calls go to the fake server too, so the rolling
+# summariser runs for real. Prints prompt tokens at a few checkpoints.
+#
+# Usage:  python benchmarks/bench_context_window.py [turns] [prompt_chars]
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+
+TURNS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+PROMPT_CHARS = int(sys.argv[2]) if len(sys.argv) > 2 else 6000
+
+SALES_LINE = "That model comes with a two year warranty and free delivery, would you like to see the price list?"
+CUSTOMER_LINE = "Hmm, that sounds nice but I'm worried about the price. Is there any discount this week?"
+
+
+async def main():
+    server = FakeOpenAIServer(delay=0.01, reply="Customer wants a discount and free delivery.")
+    await server.start()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("aluraagency_OPEPNAI_API_KEY", "sk-bench")
+
+    import llm_client
+    from context_window import build_context, count_tokens, message_tokens, schedule_summary
+
+    system = {"role": "system", "content": "x " * (PROMPT_CHARS // 2)}
+    full = [system]
+    conv = {'messages': [system], 'product': "a couch"}
+    checkpoints = {1, 10, 25, 50, 100, 200, 500, 1000, TURNS}
+
+    print("=" * 70)
+    print("CONTEXT WINDOW BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Turns: {TURNS}   System prompt: {count_tokens(system['content']):,} tokens\n")
+    print(f"  {'Turn':>6}{'Full history':>16}{'Windowed':>12}{'Kept msgs':>12}{'Summary':>10}")
+
+    for turn in range(1, TURNS + 1):
+        full.append({"role": "user", "content": SALES_LINE})
+        conv['messages'].append({"role": "user", "content": SALES_LINE})
+
+        full_tokens = sum(message_tokens(m) for m in full)
+        window_tokens = sum(message_tokens(m) for m in build_context(conv))
+
+        full.append({"role": "assistant", "content": CUSTOMER_LINE})
+        conv['messages'].append({"role": "assistant", "content": CUSTOMER_LINE})
+        task = schedule_summary(conv, llm_client.chat_completion)
+        if task:
+            await task
+
+        if turn in checkpoints:
+            print(f"  {turn:>6}{full_tokens:>16,}{window_tokens:>12,}{len(conv['messages']):>12}"
+                  f"{'yes' if conv.get('summary') else 'no':>10}")
+
+    print("=" * 70)
+    await llm_client.close()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
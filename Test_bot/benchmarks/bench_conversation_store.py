@@ -0,0 +1,92 @@
+# bench_conversation_store.py
+# Soak test: memory of the old unbounded dict vs ConversationStore.
+#
+# Simulates CHATS distinct chats, each with a /start (system prompt + product)
+# and TURNS salesperson/customer exchanges, then reports resident memory.
+# Each mode runs in its own interpreter so the numbers don't mix.
+#
+# Usage:  python benchmarks/bench_conversation_store.py [chats] [turns] [prompt_chars]
+
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+TURNS = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+PROMPT_CHARS = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+
+def rss_mb():
+    """Current resident set size in MB (Linux /proc, falls back to peak RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def simulate(mode):
+    from conversation_store import ConversationStore
+
+    system_prompt = "x" * PROMPT_CHARS
+    histories = {} if mode == "dict" else ConversationStore(max_chats=1000, max_turns=30)
+    baseline = rss_mb()
+    start = time.perf_counter()
+
+    for chat_id in range(CHATS):
+        product = random.choice(["a camera", "a couch", "running shoes", "a blender"])
+        conv = {
+            'messages': [{"role": "system", "content": system_prompt + f"\n\nYou are interested in buying: {product}"}],
+            'product': product,
+            'test_id': "BENCH"
+        }
+        if mode == "dict":
+            histories[chat_id] = conv
+        else:
+            histories.put(chat_id, conv)
+
+        for turn in range(TURNS):
+            conv['messages'].append({"role": "user", "content": f"Salesperson line {turn} for chat {chat_id}"})
+            conv['messages'].append({"role": "assistant", "content": f"Customer reply {turn} for chat {chat_id}"})
+        if mode != "dict":
+            histories.trim(conv)
+
+    elapsed = time.perf_counter() - start
+    print(f"{mode}|{len(histories)}|{rss_mb() - baseline:.1f}|{rss_mb():.1f}|{elapsed:.2f}")
+
+
+def main():
+    if len(sys.argv) > 4:
+        simulate(sys.argv[4])
+        return
+
+    print("=" * 70)
+    print("CONVERSATION STORE SOAK BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Chats: {CHATS:,}   Turns/chat: {TURNS}   System prompt: {PROMPT_CHARS:,} chars\n")
+    print(f"  {'Mode':<20}{'Chats kept':>12}{'RSS growth':>14}{'RSS total':>13}{'Time':>9}")
+
+    for mode in ("dict", "store"):
+        out = subprocess.run(
+            [sys.executable, __file__, str(CHATS), str(TURNS), str(PROMPT_CHARS), mode],
+            capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(f"  {mode}: failed\n{out.stderr}")
+            continue
+        name, kept, growth, total, elapsed = out.stdout.strip().splitlines()[-1].split("|")
+        label = "plain dict (old)" if name == "dict" else "ConversationStore"
+        print(f"  {label:<20}{int(kept):>12,}{growth + ' MB':>14}{total + ' MB':>13}{elapsed + 's':>9}")
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# bench_entity_cache.py
+# Telethon monitor chat lookups: get_chat() + get_sender() per message (old)
+# vs EntityCache (new), fully offline.
+#
+# Fake events answer get_chat()/get_sender() after TG_RTT seconds, as Telegram
+# does when the entity is not in the session cache. MESSAGES messages arrive
+# in bursts of BURST (handled concurrently, as Telethon dispatches them) from
+# CHATS private chats, every tenth of them a bot. Reports the Telegram calls
+# made, the handling time and the cache hit rate.
+#
+# Usage:  python benchmarks/bench_entity_cache.py [messages] [chats] [telegram_rtt_seconds]
+
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram_entities import EntityCache
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CHATS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+TG_RTT = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+BURST = 100
+MY_USER_ID = 1
+
+
+class FakeEvent:
+    """The parts of a Telethon NewMessage event the monitor uses"""
+
+    calls = 0
+
+    def __init__(self, chat_id, sender_id):
+        self.chat_id = chat_id
+        self.message = SimpleNamespace(sender_id=sender_id)
+
+    def _user(self, user_id):
+        is_bot = user_id % 10 == 0
+        return SimpleNamespace(id=user_id, bot=is_bot, username=f"user{user_id}" + ("_bot" if is_bot else ""),
+                               first_name=f"Friend {user_id}", last_name=None)
+
+    async def get_chat(self):
+        FakeEvent.calls += 1
+        await asyncio.sleep(TG_RTT)
+        return self._user(self.chat_id)
+
+    async def get_sender(self):
+        FakeEvent.calls += 1
+        await asyncio.sleep(TG_RTT)
+        return self._user(self.message.sender_id)
+
+
+def make_events():
+    events = []
+    for i in range(MESSAGES):
+        chat_id = 100 + i % CHATS
+        events.append(FakeEvent(chat_id, MY_USER_ID if i % 3 == 0 else chat_id))
+    return events
+
+
+async def handle_old(event):
+    """The lookups handle_new_message used to do for every message"""
+    chat = await event.get_chat()
+    if getattr(chat, 'bot', False):
+        return None
+    username = getattr(chat, 'username', None)
+    if username and username.lower().endswith('bot'):
+        return None
+    sender = await event.get_sender()
+    return "receiver" if sender.id == MY_USER_ID else "sender"
+
+
+async def handle_new(event, entities):
+    info = await entities.get(event, MY_USER_ID)
+    if not info["allowed"]:
+        return None
+    return "receiver" if event.message.sender_id == MY_USER_ID else "sender"
+
+
+async def run(handler, events):
+    FakeEvent.calls = 0
+    started = time.perf_counter()
+    roles = []
+    for i in range(0, len(events), BURST):
+        roles += await asyncio.gather(*(handler(event) for event in events[i:i + BURST]))
+    return time.perf_counter() - started, FakeEvent.calls, roles
+
+
+async def main():
+    events = make_events()
+
+    print("=" * 70)
+    print("TELETHON ENTITY CACHE BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Messages: {MESSAGES} from {CHATS} chats (bursts of {BURST})   Telegram round-trip: {TG_RTT * 1000:.0f} ms\n")
+
+    old_time, old_calls, old_roles = await run(handle_old, events)
+    print(f"  get_chat + get_sender (old): {old_time:6.2f}s   {old_calls:5d} Telegram calls")
+
+    entities = EntityCache()
+    new_time, new_calls, new_roles = await run(lambda event: handle_new(event, entities), events)
+    stats = entities.stats()
+    print(f"  EntityCache (new):           {new_time:6.2f}s   {new_calls:5d} Telegram calls   "
+          f"hit rate {stats['hit_rate']:.1%}, {stats['denied']} bot messages skipped")
+
+    print(f"\n  Same decisions: {'✅' if old_roles == new_roles else '❌'}   "
+          f"{old_calls / max(new_calls, 1):.0f}x fewer Telegram calls")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
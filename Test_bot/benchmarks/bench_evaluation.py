@@ -0,0 +1,96 @@
+# bench_evaluation.py
+# English-level evaluation: one blocking call per message (old) vs
+# EvaluationEngine (concurrent, retried, cached), fully offline.
+#
+# Scores MESSAGES salesperson messages against a fake OpenAI server that
+# answers after LLM_DELAY seconds and rate-limits every 10th request (429).
+# The engine runs twice: a cold run, then a re-run after NEW messages were
+# added - only those should reach the API.
+#
+# Usage:  python benchmarks/bench_evaluation.py [messages] [llm_delay_seconds]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+LLM_DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+NEW = 5
+
+SYSTEM_PROMPT = "You are an English examiner. Respond with ONLY a score between 0-100."
+USER_TEMPLATE = "Evaluate this salesperson message:\n\n\"{text}\"\n\nRespond with only the score (0-100):"
+
+
+def run_sequential(base_url, texts):
+    """Old behaviour: one blocking call per message, in order"""
+    from openai import OpenAI
+    client = OpenAI(api_key="sk-bench", base_url=base_url, max_retries=3)
+    scores = []
+    for text in texts:
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": USER_TEMPLATE.format(text=text)}
+            ],
+            max_tokens=10,
+            temperature=0.0
+        )
+        scores.append(int(response.choices[0].message.content))
+    client.close()
+    return scores
+
+
+def main():
+    llm = FakeOpenAIServer(delay=LLM_DELAY)
+    llm.reply_fn = lambda body: str(40 + len(body["messages"][-1]["content"]) % 60)
+    llm.status_fn = lambda n: 429 if n % 10 == 0 else 200
+    llm.start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = llm.base_url
+
+    import mongomock
+    from evaluation_engine import EvaluationEngine
+
+    texts = [f"Hey! Thanks for asking about package {i}. Want to see some samples?" for i in range(MESSAGES)]
+
+    print("=" * 70)
+    print("ENGLISH EVALUATION BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Messages: {MESSAGES}   LLM latency: {LLM_DELAY}s   every 10th request -> 429\n")
+
+    started = time.perf_counter()
+    old_scores = run_sequential(llm.base_url, texts)
+    sequential = time.perf_counter() - started
+    print(f"  Sequential (old):          {sequential:6.2f}s   {MESSAGES} calls")
+
+    cache = mongomock.MongoClient().db.evaluation_cache
+    engine = EvaluationEngine("bench_evaluation", SYSTEM_PROMPT, USER_TEMPLATE, api_key="sk-bench",
+                              cache_collection=cache)
+
+    started = time.perf_counter()
+    scores = engine.score_sync(texts)
+    cold = time.perf_counter() - started
+    print(f"  Engine, cold cache:        {cold:6.2f}s   {engine.stats['api_calls']} calls "
+          f"({engine.stats['retries']} retried)   {sequential / cold:.1f}x faster")
+
+    # Next run (fresh process, persistent cache): only the new messages are scored
+    texts += [f"No worries mate, the deluxe option {i} has heaps of photos." for i in range(NEW)]
+    rerun = EvaluationEngine("bench_evaluation", SYSTEM_PROMPT, USER_TEMPLATE, api_key="sk-bench",
+                             cache_collection=cache)
+    started = time.perf_counter()
+    rerun_scores = rerun.score_sync(texts)
+    warm = time.perf_counter() - started
+    print(f"  Engine, re-run (+{NEW} new):  {warm:6.2f}s   {rerun.stats['api_calls']} calls "
+          f"({rerun.stats['cache_hits']} cache hits)")
+
+    print(f"\n  Scores match old path:     {scores == old_scores and rerun_scores[:MESSAGES] == old_scores}")
+    print("=" * 70)
+    llm.stop_thread()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# bench_llm_client.py
+# Compare the old blocking OpenAI calls with the shared async llm_client.
+#
+# N salesperson chats send one message each at the same moment. With the sync
+# client every handler blocks the event loop, so replies come out one by one.
+# With llm_client they overlap and the batch finishes in ~one round-trip.
+#
+# Usage:  python benchmarks/bench_llm_client.py [chats] [delay_seconds]
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+
+MESSAGES = [
+    {"role": "system", "content": "You are a customer."},
+    {"role": "user", "content": "Hello, sir. How can I help you today?"}
+]
+
+
+async def run_blocking(base_url):
+    """Old behaviour: sync client called straight from the coroutine"""
+    from openai import OpenAI
+    client = OpenAI(api_key="fake", base_url=base_url)
+
+    async def handler():
+        client.chat.completions.create(model="gpt-3.5-turbo", messages=MESSAGES)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(CHATS)))
+    return time.perf_counter() - start
+
+
+async def run_async():
+    """New behaviour: awaited calls through the shared pool"""
+    import llm_client
+
+    async def handler():
+        await llm_client.chat_completion(model="gpt-3.5-turbo", messages=MESSAGES)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(CHATS)))
+    elapsed = time.perf_counter() - start
+    await llm_client.close()
+    return elapsed
+
+
+def main():
+    server = FakeOpenAIServer(delay=DELAY).start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ.setdefault("aluraagency_OPEPNAI_API_KEY", "fake")
+
+    blocking = asyncio.run(run_blocking(server.base_url))
+    concurrent = asyncio.run(run_async())
+    server.stop_thread()
+
+    print("=" * 60)
+    print("LLM CLIENT BENCHMARK".center(60))
+    print("=" * 60)
+    print(f"  Chats:               {CHATS}")
+    print(f"  Fake LLM latency:    {DELAY:.2f}s")
+    print(f"  Blocking client:     {blocking:.2f}s")
+    print(f"  Async llm_client:    {concurrent:.2f}s")
+    print(f"  Speed-up:            {blocking / concurrent:.1f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# bench_message_log.py
+# chat_bot write throughput: insert_one per message (old) vs MessageLog.
+#
+# WRITERS concurrent writers (5 bots x customer/salesperson) each log
+# MESSAGES messages one after another, like the bots' handlers do. The
+# in-memory backend gets RTT seconds of simulated network latency per call,
+# so the difference comes from round-trips, not from mongomock.
+#
+# Usage:  python benchmarks/bench_message_log.py [writers] [messages] [rtt_seconds]
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import MemoryBackend, MessageStore
+from message_log import MessageLog
+
+WRITERS = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+MESSAGES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+RTT = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+
+class SlowCollection:
+    """Adds a fixed round-trip time to every write"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    async def insert_one(self, *args, **kwargs):
+        await asyncio.sleep(RTT)
+        return await self._collection.insert_one(*args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs):
+        await asyncio.sleep(RTT)
+        return await self._collection.insert_many(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+async def run(enabled):
+    store = MessageStore(MemoryBackend())
+    store.chat_collection = SlowCollection(store.chat_collection)
+    spill = os.path.join(tempfile.mkdtemp(), "spill.jsonl")
+    log = MessageLog(store, enabled=enabled, spill_path=spill)
+
+    async def writer(n):
+        for i in range(MESSAGES):
+            await log.add("BENCH", "customer" if n % 2 else "salesperson", f"message {i}", n, f"bot_{n}", room_id=n % 5 + 1)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(WRITERS)))
+    await log.close()
+    elapsed = time.perf_counter() - start
+
+    count = await store.chat_collection.count_documents({})
+    return count, elapsed, log.batches
+
+
+async def main():
+    print("=" * 70)
+    print("CHAT_BOT WRITE BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Writers: {WRITERS}   Messages/writer: {MESSAGES}   Simulated RTT: {RTT * 1000:.0f} ms\n")
+    print(f"  {'Mode':<26}{'Docs':>8}{'Time':>10}{'Inserts/s':>12}{'Round-trips':>14}")
+
+    for label, enabled in (("insert_one (old)", False), ("MessageLog write-behind", True)):
+        count, elapsed, batches = await run(enabled)
+        trips = batches if enabled else count
+        print(f"  {label:<26}{count:>8,}{elapsed:>9.2f}s{count / elapsed:>12,.0f}{trips:>14,}")
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
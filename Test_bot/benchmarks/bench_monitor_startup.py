@@ -0,0 +1,88 @@
+# bench_monitor_startup.py
+# Telethon monitor startup: cleanup_database()'s two full-collection $group
+# aggregations (old) vs prepare_database()'s index check and estimated counts
+# (new), on mongomock telegram_chats of growing size. Fully offline.
+#
+# mongomock runs aggregations in Python, so absolute times are only
+# indicative - the point is which one grows with the history. Both columns
+# start with the schema version already recorded, as on a production
+# database after its first start (mongomock ignores partialFilterExpression,
+# so its own bootstrap would otherwise never record it). What is left of the
+# new column is estimated_document_count(), which mongomock answers by
+# counting; MongoDB reads it from the collection metadata.
+#
+# Usage:  python benchmarks/bench_monitor_startup.py [rows ...]
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock
+
+from db_schema import INFO_COLLECTION, SCHEMA_VERSION, ensure_indexes
+
+SIZES = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 50000]
+
+# The pipelines cleanup_database() ran before connecting
+DUPLICATE_MESSAGES = [
+    {"$match": {"message_id": {"$exists": True}}},
+    {"$group": {"_id": {"message_id": "$message_id", "chat_id": "$chat_id"},
+                "docs": {"$push": "$_id"}, "count": {"$sum": 1}}},
+    {"$match": {"count": {"$gt": 1}}}
+]
+DUPLICATE_LEGACY = [
+    {"$match": {"message_id": {"$exists": False}}},
+    {"$group": {"_id": {"chat_id": "$chat_id", "role": "$role", "name": "$name", "text": "$text"},
+                "docs": {"$push": "$_id"}, "count": {"$sum": 1}}},
+    {"$match": {"count": {"$gt": 1}}}
+]
+
+
+def make_db(rows):
+    db = mongomock.MongoClient().db
+    db.telegram_chats.insert_many([
+        {"person_id": i % 40, "message_id": i, "chat_id": 1000 + i % 40, "role": "sender",
+         "name": "Friend", "text": f"message {i}"}
+        for i in range(rows)
+    ])
+    ensure_indexes(db)
+    # Recorded by the first start in production - set it here so the bench measures later starts
+    db[INFO_COLLECTION].update_one({"_id": "indexes"}, {"$set": {"version": SCHEMA_VERSION}}, upsert=True)
+    return db
+
+
+def old_startup(db):
+    chats = db.telegram_chats
+    list(chats.aggregate(DUPLICATE_MESSAGES))
+    list(chats.aggregate(DUPLICATE_LEGACY))
+    chats.count_documents({})
+    db.telegram_friends.count_documents({})
+
+
+def new_startup(db):
+    ensure_indexes(db)
+    db.telegram_chats.estimated_document_count()
+    db.telegram_friends.estimated_document_count()
+
+
+def main():
+    print("=" * 70)
+    print("TELEGRAM MONITOR STARTUP BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  {'rows':>8}   {'cleanup_database (old)':>24}   {'prepare_database (new)':>24}")
+    for rows in SIZES:
+        db = make_db(rows)
+        started = time.perf_counter()
+        old_startup(db)
+        old = time.perf_counter() - started
+        started = time.perf_counter()
+        new_startup(db)
+        new = time.perf_counter() - started
+        print(f"  {rows:>8}   {old * 1000:>21.1f} ms   {new * 1000:>21.1f} ms")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
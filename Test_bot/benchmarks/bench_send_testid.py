@@ -0,0 +1,81 @@
+# bench_send_testid.py
+# /send_testid fan-out: blocking requests.post per bot (old) vs
+# TelegramDispatcher (concurrent, shared httpx client), fully offline.
+#
+# A fake Bot API answers sendMessage after TG_DELAY seconds. The dispatcher
+# fans out twice (cold: creates its client, warm: reuses it), then runs again
+# with the first call of each token rate limited (429, retry_after=1) to show
+# the retry.
+#
+# Usage:  python benchmarks/bench_send_testid.py [bots] [telegram_delay_seconds]
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram import FakeTelegramServer
+
+BOTS = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+TG_DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+CHAT_ID = "12345"
+
+
+def send_sequential(base_url, tokens, test_id):
+    """Old behaviour: requests.post (no timeout) for each bot, one after another"""
+    import requests
+    ok = 0
+    for token in tokens:
+        response = requests.post(f"{base_url}{token}/sendMessage", data={"chat_id": CHAT_ID, "text": f"/start {test_id}"})
+        ok += response.status_code == 200
+    return ok
+
+
+async def main():
+    telegram = await FakeTelegramServer(delay=TG_DELAY).start()
+    from telegram_dispatch import TelegramDispatcher
+
+    tokens = [f"{100 + i}:FAKE" for i in range(BOTS)]
+    sends = [(token, CHAT_ID, "/start TEST_1", f"bot_{i + 1}") for i, token in enumerate(tokens)]
+
+    print("=" * 70)
+    print("SEND_TESTID FAN-OUT BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Bots: {BOTS}   Telegram latency: {TG_DELAY}s\n")
+
+    started = time.perf_counter()
+    ok = await asyncio.to_thread(send_sequential, telegram.base_url, tokens, "TEST_1")
+    sequential = time.perf_counter() - started
+    print(f"  Sequential requests (old):   {sequential:5.2f}s   {ok}/{BOTS} sent")
+
+    # The API keeps one dispatcher, so only its first request pays for creating the client
+    dispatcher = TelegramDispatcher(api_url=telegram.base_url)
+    for label in ("cold", "warm"):
+        if label == "warm":
+            await asyncio.sleep(dispatcher.min_interval)  # per-token interval, not timed
+        started = time.perf_counter()
+        results = await dispatcher.fan_out(sends)
+        fan_out = time.perf_counter() - started
+        print(f"  Dispatcher fan-out ({label}):   {fan_out:5.2f}s   {sum(ok for ok, _ in results)}/{BOTS} sent   "
+              f"{sequential / fan_out:.1f}x faster")
+    await dispatcher.aclose()
+
+    # Every token's first call gets 429 retry_after=1
+    first_call = telegram.calls
+    telegram.status_fn = lambda n: 429 if n <= first_call + BOTS else 200
+    dispatcher = TelegramDispatcher(api_url=telegram.base_url)
+    started = time.perf_counter()
+    results = await dispatcher.fan_out(sends)
+    limited = time.perf_counter() - started
+    print(f"  Fan-out, 429 on first call:  {limited:5.2f}s   {sum(ok for ok, _ in results)}/{BOTS} sent   "
+          f"({dispatcher.stats['rate_limited']} rate limited, retried after retry_after)")
+    await dispatcher.aclose()
+
+    print("=" * 70)
+    await telegram.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
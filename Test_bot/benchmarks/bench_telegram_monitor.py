@@ -0,0 +1,145 @@
+# bench_telegram_monitor.py
+# Telethon monitor persistence under a message flood, fully offline.
+#
+# MESSAGES private messages from CHATS chats arrive at once (as Telethon would
+# dispatch them, one handler task per update). Old path: blocking insert_one
+# per message on the event loop. New path: MessagePipeline (queue + batched
+# insert_many in a worker thread). MongoDB is mongomock with DB_RTT seconds
+# added per round-trip (no unique index: mongomock checks it in O(n) per
+# insert, which would swamp the round-trips being measured). Reports how long
+# the handlers took, the worst event loop stall (what the MTProto connection
+# would feel), the time until every message was stored, and how many were
+# kept - the old global processed_ids set drops messages whose id was already
+# used in another chat.
+#
+# Usage:  python benchmarks/bench_telegram_monitor.py [messages] [chats] [db_rtt_seconds]
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock
+
+from telegram_pipeline import ChatDedup, MessagePipeline
+
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+CHATS = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+DB_RTT = float(sys.argv[3]) if len(sys.argv) > 3 else 0.002
+
+
+class SlowCollection:
+    """mongomock collection that sleeps DB_RTT per call, like a remote server"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def insert_one(self, doc):
+        time.sleep(DB_RTT)
+        return self._collection.insert_one(doc)
+
+    def insert_many(self, docs, ordered=True):
+        time.sleep(DB_RTT)
+        return self._collection.insert_many(docs, ordered=ordered)
+
+
+def make_messages():
+    # Message ids restart in every chat, like Telegram's private chats
+    return [
+        {"person_id": chat, "message_id": i // CHATS, "chat_id": 1000 + chat, "role": "sender",
+         "name": f"Friend {chat}", "text": f"hello {i}", "timestamp": datetime.now()}
+        for i in range(MESSAGES) for chat in [i % CHATS]
+    ]
+
+
+async def lag_monitor(stop, interval=0.005):
+    """Worst delay between when a 5 ms sleep should wake up and when it does"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run_old(collection, messages, per_chat=False):
+    processed_ids = set()
+    lock = asyncio.Lock()
+
+    async def handler(message):
+        key = (message["chat_id"], message["message_id"]) if per_chat else message["message_id"]
+        async with lock:
+            if key in processed_ids:
+                return
+            processed_ids.add(key)
+        collection.insert_one(dict(message))
+
+    await asyncio.gather(*(handler(m) for m in messages))
+
+
+async def run_new(messages, pipeline):
+    dedup = ChatDedup()
+
+    async def handler(message):
+        if dedup.seen(message["chat_id"], message["message_id"]):
+            return
+        await pipeline.submit(dict(message))
+
+    await asyncio.gather(*(handler(m) for m in messages))
+
+
+async def measure(run):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(lag_monitor(stop))
+    await asyncio.sleep(0.02)
+    started = time.perf_counter()
+    handled, stored = await run()
+    handlers = handled - started
+    total = stored - started
+    stop.set()
+    worst = await monitor
+    return handlers, worst, total
+
+
+async def main():
+    messages = make_messages()
+
+    print("=" * 70)
+    print("TELEGRAM MONITOR FLOOD BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Messages: {MESSAGES} from {CHATS} chats   DB round-trip: {DB_RTT * 1000:.0f} ms\n")
+
+    for label, per_chat in (("old", False), ("old, per-chat ids", True)):
+        old = mongomock.MongoClient().db.telegram_chats
+
+        async def old_run():
+            await run_old(SlowCollection(old), messages, per_chat)
+            now = time.perf_counter()
+            return now, now
+
+        handlers, worst, total = await measure(old_run)
+        print(f"  {'insert_one (' + label + '):':<32} handlers {handlers:6.2f}s   "
+              f"worst loop stall {worst * 1000:7.1f} ms   stored {old.count_documents({})}/{MESSAGES} in {total:.2f}s")
+
+    new = mongomock.MongoClient().db.telegram_chats
+    pipeline = MessagePipeline(SlowCollection(new), verbose=False)
+    pipeline.start()
+
+    async def new_run():
+        await run_new(messages, pipeline)
+        handled = time.perf_counter()
+        await pipeline.close()
+        return handled, time.perf_counter()
+
+    handlers, worst, total = await measure(new_run)
+    print(f"  {'MessagePipeline (new):':<32} handlers {handlers:6.2f}s   worst loop stall {worst * 1000:7.1f} ms   "
+          f"stored {new.count_documents({})}/{MESSAGES} in {total:.2f}s ({pipeline.stats['batches']} batches)")
+
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
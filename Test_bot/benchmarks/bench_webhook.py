@@ -0,0 +1,111 @@
+# bench_webhook.py
+# Load test of webhook mode, fully offline.
+#
+# Starts a fake OpenAI server, a fake Telegram Bot API and the bot_webhook app
+# (all five personas) in one process, then POSTs CHATS salesperson messages
+# per bot to the webhook like Telegram would. Reports update -> reply latency
+# (RESPONSE_DELAY is set to 0 so only dispatch + generation is measured).
+#
+# Usage:  python benchmarks/bench_webhook.py [chats_per_bot] [llm_delay_seconds]
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAIServer
+from fake_telegram import FakeTelegramServer, make_update, post_updates
+
+CHATS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+LLM_DELAY = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+PORT = 8765
+
+
+async def main():
+    llm = FakeOpenAIServer(delay=LLM_DELAY)
+    await llm.start()
+    telegram = FakeTelegramServer()
+    await telegram.start()
+
+    os.environ.update({
+        "OPENAI_BASE_URL": llm.base_url,
+        "aluraagency_OPEPNAI_API_KEY": "sk-bench",
+        "CHAT_STORAGE": "memory",
+        "TELEGRAM_API_URL": telegram.base_url,
+        "WEBHOOK_URL": f"http://127.0.0.1:{PORT}",
+    })
+    for n in range(1, 6):
+        os.environ[f"TELEGRAM_BOT_{n}_TOKEN"] = f"{n}00:FAKE"
+
+    import uvicorn
+    import bot_webhook
+
+    server = uvicorn.Server(uvicorn.Config(bot_webhook.app, host="127.0.0.1", port=PORT, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    for bot in bot_webhook.bots_by_key.values():
+        bot["module"].RESPONSE_DELAY = 0
+
+    print("=" * 70)
+    print("WEBHOOK MODE BENCHMARK".center(70))
+    print("=" * 70)
+    print(f"  Bots: {len(bot_webhook.bots_by_key)}   Chats/bot: {CHATS}   LLM latency: {LLM_DELAY}s")
+    print(f"  Webhooks registered: {len(telegram.webhooks)}\n")
+
+    posted_at = {}
+    jobs = []
+    update_id = 0
+    for token, url in telegram.webhooks.items():
+        updates = []
+        for chat in range(CHATS):
+            update_id += 1
+            chat_id = 10_000 + chat
+            updates.append(make_update(update_id, chat_id, f"Hi! This is message {update_id}"))
+            posted_at[(token, chat_id, update_id)] = None
+        jobs.append((token, url, updates))
+
+    started = time.perf_counter()
+    for token, url, updates in jobs:
+        for update in updates:
+            posted_at[(token, update["message"]["chat"]["id"], update["update_id"])] = time.perf_counter()
+    codes = await asyncio.gather(*(post_updates(url, updates) for _, url, updates in jobs))
+    ingest = time.perf_counter() - started
+
+    expected = len(posted_at)
+    while True:
+        replies = [s for s in telegram.sent if s[2] == "sendMessage"]
+        if len(replies) >= expected or time.perf_counter() - started > 60:
+            break
+        await asyncio.sleep(0.05)
+
+    latencies = []
+    for sent_at, token, _, params in replies:
+        reply_to = json.loads(params.get("reply_parameters") or "{}").get("message_id") or params.get("reply_to_message_id")
+        key = (token, int(params["chat_id"]), int(reply_to or 0))
+        if posted_at.get(key):
+            latencies.append(sent_at - posted_at[key])
+
+    total = time.perf_counter() - started
+    accepted = sum(code == 200 for batch in codes for code in batch)
+    print(f"  Updates accepted:     {accepted}/{expected} in {ingest:.2f}s ({expected / ingest:.0f}/s)")
+    print(f"  Replies sent:         {len(replies)}/{expected} in {total:.2f}s")
+    if latencies:
+        latencies.sort()
+        print(f"  Update -> reply p50:  {statistics.median(latencies):.3f}s")
+        print(f"  Update -> reply p95:  {latencies[int(len(latencies) * 0.95) - 1]:.3f}s")
+    print("=" * 70)
+
+    server.should_exit = True
+    await serving
+    await telegram.stop()
+    await llm.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
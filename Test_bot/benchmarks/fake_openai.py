@@ -0,0 +1,194 @@
+# fake_openai.py
+# Minimal local stand-in for the OpenAI chat completions endpoint.
+# Used by the benchmarks so they run offline with a fixed, known latency.
+# Requests with "stream": true get server-sent events: the first token after
+# `delay`, then one word every `token_delay` seconds. Set `status_fn` to make
+# some requests fail (e.g. 429 with a Retry-After header).
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class FakeOpenAIServer:
+    """Tiny HTTP/1.1 server answering POST /v1/chat/completions after `delay` seconds"""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.5, reply="Sounds good! How much is it?", token_delay=0.05):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.token_delay = token_delay
+        self.reply = reply
+        self.reply_fn = None  # optional callable(request_body) -> reply text
+        self.status_fn = None  # optional callable(request_number) -> HTTP status (200 = normal reply)
+        self.retry_after = 0.1
+        self.requests = 0
+        self._recent_prompts = deque(maxlen=256)  # for the simulated prefix cache
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self):
+        """Run the server on its own event loop so blocking clients can call it"""
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self.start())
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop_thread(self):
+        async def shutdown():
+            await self.stop()
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._loop.stop()
+
+        if self._loop:
+            asyncio.run_coroutine_threadsafe(shutdown(), self._loop)
+            self._thread.join(timeout=5)
+
+    def cached_tokens(self, prompt):
+        """Simulate OpenAI prefix caching: longest prefix shared with a recent
+        prompt, in 128-token blocks, only for prompts of 1024+ tokens (~4 chars/token)"""
+        shared = max((len(os.path.commonprefix([prompt, seen])) for seen in self._recent_prompts), default=0)
+        self._recent_prompts.append(prompt)
+        if len(prompt) // 4 < 1024:
+            return 0
+        return (shared // 4) // 128 * 128
+
+    def completion_payload(self, body):
+        text = self.reply_fn(body) if self.reply_fn else self.reply
+        prompt = "".join(f"<{m.get('role')}>{m.get('content') or ''}" for m in body.get("messages", []))
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        return {
+            "id": f"chatcmpl-fake-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "prompt_tokens_details": {"cached_tokens": min(self.cached_tokens(prompt), prompt_chars // 4)},
+                "completion_tokens": len(text) // 4,
+                "total_tokens": (prompt_chars + len(text)) // 4
+            }
+        }
+
+    def stream_chunks(self, body):
+        """Chunk payloads for a streamed completion (one word per chunk)"""
+        payload = self.completion_payload(body)
+        text = payload["choices"][0]["message"]["content"]
+        base = {k: payload[k] for k in ("id", "created", "model")}
+        base["object"] = "chat.completion.chunk"
+
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            piece = word if i == 0 else " " + word
+            delta = {"role": "assistant", "content": piece} if i == 0 else {"content": piece}
+            yield dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+        yield dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield dict(base, choices=[], usage=payload["usage"])
+
+    async def _write_stream(self, writer, body):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        for i, chunk in enumerate(self.stream_chunks(body)):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            event = f"data: {json.dumps(chunk)}\n\n".encode()
+            writer.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+            await writer.drain()
+        done = b"data: [DONE]\n\n"
+        writer.write(f"{len(done):X}\r\n".encode() + done + b"\r\n0\r\n\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+                body = json.loads(raw or b"{}")
+                self.requests += 1
+
+                await asyncio.sleep(self.delay)
+
+                status = self.status_fn(self.requests) if self.status_fn else 200
+                if status != 200:
+                    data = json.dumps({"error": {"message": f"fake {status}", "type": "fake_error", "code": None}}).encode()
+                    writer.write(
+                        f"HTTP/1.1 {status} Error\r\n".encode()
+                        + b"Content-Type: application/json\r\n"
+                        + f"Retry-After: {self.retry_after}\r\n".encode()
+                        + f"Content-Length: {len(data)}\r\n\r\n".encode()
+                        + data
+                    )
+                    await writer.drain()
+                    continue
+
+                if body.get("stream"):
+                    await self._write_stream(writer, body)
+                    continue
+
+                data = json.dumps(self.completion_payload(body)).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(data)}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        except asyncio.CancelledError:
+            # stop_thread() cancels idle keep-alive connections; finishing normally keeps
+            # asyncio's stream callback from logging the cancellation as an error
+            pass
+        finally:
+            writer.close()
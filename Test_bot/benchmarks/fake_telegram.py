@@ -0,0 +1,162 @@
+# fake_telegram.py
+# Minimal local stand-in for the Telegram Bot API, plus an update poster.
+#
+# FakeTelegramServer answers the Bot API calls the customer bots make
+# (getMe, sendMessage, editMessageText, setWebhook, deleteWebhook, getUpdates)
+# and records every sent/edited message with a timestamp. Point the bots at it
+# with TELEGRAM_API_URL=<server.base_url>. make_update() / post_updates()
+# build Telegram updates and POST them to a webhook, like Telegram would.
+# Set `status_fn` to make some calls fail (e.g. 429 with parameters.retry_after).
+
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+import httpx
+
+
+class FakeTelegramServer:
+    """Tiny HTTP/1.1 server answering POST /bot<token>/<method>"""
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.sent = []      # (time, token, method, params)
+        self.calls = 0
+        self.webhooks = {}  # token -> url
+        self.status_fn = None  # optional callable(call_number) -> HTTP status (200 = normal reply)
+        self.retry_after = 1
+        self._message_id = 1000
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _message(self, params):
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": int(params.get("message_id", self._message_id)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "Bot", "username": "fake_bot"},
+            "text": params.get("text", "")
+        }
+
+    def api_result(self, token, method, params):
+        if method == "getMe":
+            bot_id = int(token.split(":")[0]) if token.split(":")[0].isdigit() else 1
+            return {"id": bot_id, "is_bot": True, "first_name": "Fake", "username": f"fake_{bot_id}_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method in ("sendMessage", "editMessageText"):
+            self.sent.append((time.perf_counter(), token, method, params))
+            return self._message(params)
+        if method == "setWebhook":
+            self.webhooks[token] = params.get("url")
+            return True
+        if method == "deleteWebhook":
+            self.webhooks.pop(token, None)
+            return True
+        if method == "getUpdates":
+            return []
+        return True
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                path = request_line.decode("latin-1").split(" ")[1]
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+                if "json" in headers.get("content-type", ""):
+                    params = json.loads(raw or b"{}")
+                else:
+                    params = {k: v[0] for k, v in parse_qs(raw.decode()).items()}
+
+                # /bot<token>/<method>
+                token, _, method = path[len("/bot"):].partition("/")
+                self.calls += 1
+                if method == "getUpdates":
+                    await asyncio.sleep(0.5)
+                elif self.delay:
+                    await asyncio.sleep(self.delay)
+
+                status = self.status_fn(self.calls) if self.status_fn else 200
+                if status != 200:
+                    error = {"ok": False, "error_code": status, "description": f"Fake error {status}"}
+                    if status == 429:
+                        error["description"] = f"Too Many Requests: retry after {self.retry_after}"
+                        error["parameters"] = {"retry_after": self.retry_after}
+                    data = json.dumps(error).encode()
+                    writer.write(
+                        f"HTTP/1.1 {status} Error\r\n".encode()
+                        + b"Content-Type: application/json\r\n"
+                        + f"Content-Length: {len(data)}\r\n\r\n".encode()
+                        + data
+                    )
+                    await writer.drain()
+                    continue
+
+                data = json.dumps({"ok": True, "result": self.api_result(token, method, params)}).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: application/json\r\n"
+                    + f"Content-Length: {len(data)}\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+
+def make_update(update_id, chat_id, text, username="raihantapader", message_id=None):
+    """A Telegram Update (private text message) as Telegram would POST it"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": message_id or update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "username": username},
+            "from": {"id": chat_id, "is_bot": False, "first_name": username, "username": username},
+            "text": text
+        }
+    }
+
+
+async def post_updates(url, updates, secret=None, concurrency=50):
+    """POST updates to a webhook url; returns the status codes"""
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        async def post(update):
+            async with semaphore:
+                response = await client.post(url, json=update, headers=headers)
+                return response.status_code
+
+        return await asyncio.gather(*(post(update) for update in updates))
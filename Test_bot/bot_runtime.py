@@ -0,0 +1,212 @@
+# bot_runtime.py
+# Run every customer bot persona inside ONE asyncio process
+#
+# final_bot1.py ... final_bot5.py only differ in token, BOT_NAME, ROOM_ID and
+# persona (system prompt, product pool, greeting). Instead of one interpreter
+# per bot, this runtime loads a private copy of the persona module for each
+# row of the config table and runs all Applications on one event loop.
+# They share one Telegram HTTP pool, one Mongo client (storage.py), one LLM
+# client (llm_client.py) and one active test cache (active_test.py).
+#
+# Usage:
+#   python bot_runtime.py                      # built-in BOT_TABLE below
+#   BOT_CONFIG=bots.json python bot_runtime.py # JSON list of rows
+#   python bot_runtime.py --webhook            # webhook mode (see bot_webhook.py)
+#
+# A row: {"persona": "final_bot1", "token_env": "TELEGRAM_BOT_1_TOKEN",
+#         "name": "🤖 Bot_1- Ted", "room_id": 1}
+# ("token" may be given directly instead of "token_env")
+
+import asyncio
+import importlib.util
+import json
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+from telegram.request import HTTPXRequest
+
+import llm_client
+from active_test import get_active_test_cache
+from message_log import get_message_log
+from storage import get_store
+
+if sys.platform == 'win32' and (sys.stdout.encoding or '').lower() != 'utf-8':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "64"))
+
+# Bot API base url override, e.g. http://127.0.0.1:8081/bot (fake Telegram server)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL") or None
+
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+BOT_TABLE = [
+    {"persona": "final_bot1", "token_env": "TELEGRAM_BOT_1_TOKEN",
+     "name": os.getenv("CUSTOMER_1_BOT_USERNAME", "🤖 Bot_1- Ted"), "room_id": 1},
+    {"persona": "final_bot2", "token_env": "TELEGRAM_BOT_2_TOKEN",
+     "name": os.getenv("CUSTOMER_2_BOT_USERNAME", "🤖 Bot_2 - James"), "room_id": 2},
+    {"persona": "final_bot3", "token_env": "TELEGRAM_BOT_3_TOKEN",
+     "name": os.getenv("CUSTOMER_3_BOT_USERNAME", "🤖 Bot_3 - Charlie"), "room_id": 3},
+    {"persona": "final_bot4", "token_env": "TELEGRAM_BOT_4_TOKEN",
+     "name": os.getenv("CUSTOMER_4_BOT_USERNAME", "🤖 Bot_4- Jayson"), "room_id": 4},
+    {"persona": "final_bot5", "token_env": "TELEGRAM_BOT_5_TOKEN",
+     "name": os.getenv("CUSTOMER_5_BOT_USERNAME", "🤖 Bot_5- Peter"), "room_id": 5},
+]
+
+
+def load_config():
+    """Return the bot table (BOT_CONFIG json file if set, else BOT_TABLE)"""
+    path = os.getenv("BOT_CONFIG")
+    if not path:
+        return BOT_TABLE
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def resolve_token(row):
+    return row.get("token") or os.getenv(row.get("token_env", ""))
+
+
+def load_persona(row):
+    """Load a private copy of the persona module so each row keeps its own state"""
+    module_name = f"{row['persona']}__room{row['room_id']}"
+    path = os.path.join(BASE_DIR, f"{row['persona']}.py")
+
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    module.BOT_NAME = row.get("name", module.BOT_NAME)
+    module.ROOM_ID = row["room_id"]
+    return module
+
+
+def build_applications(rows, request):
+    """Build one Application per config row, all sharing `request`"""
+    applications = []
+    for row in rows:
+        token = resolve_token(row)
+        if not token:
+            print(f"  ⚠️  {row.get('name', row['persona'])}: token not found, skipped")
+            continue
+
+        module = load_persona(row)
+        application = module.build_application(token=token, request=request, base_url=TELEGRAM_API_URL)
+        applications.append({"row": row, "module": module, "application": application, "token": token})
+    return applications
+
+
+async def start_applications(bots, polling=True):
+    """Initialize and start every Application (webhook mode: no long polling)"""
+    for bot in bots:
+        application = bot["application"]
+        await application.initialize()
+        await application.start()
+        if polling:
+            await application.updater.start_polling(drop_pending_updates=True, poll_interval=1)
+        print(f"  ✅ {bot['module'].BOT_NAME} (room {bot['row']['room_id']})")
+
+
+async def stop_applications(bots):
+    for bot in bots:
+        application = bot["application"]
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            print(f"  ⚠️  Error stopping {bot['module'].BOT_NAME}: {e}")
+
+
+async def start_runtime(rows, polling=True):
+    """Build and start every bot plus the shared watchers; returns the bot list"""
+    # One connection pool for every bot's outgoing Bot API calls
+    # (long polling keeps its own per-bot getUpdates connection)
+    request = HTTPXRequest(connection_pool_size=TELEGRAM_POOL_SIZE)
+    bots = build_applications(rows, request)
+
+    if not bots:
+        print("[ERROR] No bots configured with a token!")
+        return bots
+
+    await get_store().ensure_indexes()
+    get_active_test_cache().start_watcher()
+    await get_message_log().recover()
+
+    print("\n🤖 Starting customer bots...")
+    await start_applications(bots, polling=polling)
+    return bots
+
+
+async def stop_runtime(bots):
+    print("\n⏹️  Stopping all bots...")
+    await stop_applications(bots)
+    await get_active_test_cache().stop_watcher()
+    await get_message_log().close()
+    await llm_client.close()
+    if llm_client.LLM_USAGE_LOG:
+        print(f"[LLM] Usage: {llm_client.usage_stats()}")
+    print("✅ All bots stopped")
+
+
+async def run(rows):
+    started_at = time.perf_counter()
+
+    bots = await start_runtime(rows)
+    if not bots:
+        return
+
+    print("\n" + "="*70)
+    print(f"✅ {len(bots)}/{len(rows)} BOTS RUNNING IN ONE PROCESS".center(70))
+    print("="*70)
+    print(f"⏱️  Startup time: {time.perf_counter() - started_at:.1f}s")
+    print("Press Ctrl+C to stop\n")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows: Ctrl+C cancels the main task instead
+
+    try:
+        await stop_event.wait()
+    finally:
+        await stop_runtime(bots)
+
+
+def main():
+    if not llm_client.OPENAI_API_KEY:
+        print("[ERROR] OPENAI_API_KEY not found!")
+        return
+
+    print("="*70)
+    print("CUSTOMER BOTS RUNTIME".center(70))
+    print("="*70)
+
+    if BOT_MODE == "webhook" or "--webhook" in sys.argv:
+        import bot_webhook
+        bot_webhook.serve()
+        return
+
+    try:
+        asyncio.run(run(load_config()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# bot_webhook.py
+# Webhook ingestion for every customer bot on one ASGI server
+#
+# Long polling keeps one getUpdates loop (and connection) per bot and adds up
+# to poll_interval of latency per update. In webhook mode Telegram POSTs each
+# update to /webhook/<key> on this FastAPI app and it goes straight onto that
+# bot's Application.update_queue. The bots themselves are the same
+# Applications bot_runtime.py builds - only the updater is not started.
+#
+# Usage:
+#   WEBHOOK_URL=https://bots.example.com python bot_runtime.py --webhook
+#   python bot_webhook.py                      # same thing
+#
+# <key> is a short hash of the bot token (the token never appears in a URL).
+# With WEBHOOK_URL set, each bot registers its webhook on startup; set
+# WEBHOOK_SECRET to have Telegram send (and this app check) a secret header.
+
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from telegram import Update
+
+import bot_runtime
+
+WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").rstrip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+
+bots_by_key = {}
+stats = {"updates": 0, "rejected": 0, "started_at": None}
+
+
+def webhook_key(token):
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+async def register_webhooks(bots):
+    for bot in bots:
+        url = f"{WEBHOOK_URL}/webhook/{webhook_key(bot['token'])}"
+        await bot["application"].bot.set_webhook(
+            url=url,
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=True,
+            allowed_updates=Update.ALL_TYPES
+        )
+        print(f"  🔗 {bot['module'].BOT_NAME} -> {url}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    bots = await bot_runtime.start_runtime(bot_runtime.load_config(), polling=False)
+    bots_by_key.clear()
+    bots_by_key.update({webhook_key(bot["token"]): bot for bot in bots})
+    stats["started_at"] = time.time()
+
+    if WEBHOOK_URL:
+        await register_webhooks(bots)
+    else:
+        print("⚠️  WEBHOOK_URL not set - webhooks not registered with Telegram")
+
+    print(f"✅ {len(bots)} bot(s) receiving updates on /webhook/<key>\n")
+    try:
+        yield
+    finally:
+        await bot_runtime.stop_runtime(bots)
+
+
+app = FastAPI(
+    title="Customer Bots Webhook",
+    description="Receives Telegram updates for every customer bot",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+
+@app.post("/webhook/{key}")
+async def telegram_webhook(key: str, request: Request):
+    """Queue one Telegram update for the bot behind `key`"""
+    bot = bots_by_key.get(key)
+    if bot is None:
+        stats["rejected"] += 1
+        raise HTTPException(status_code=404, detail="Unknown bot")
+
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        stats["rejected"] += 1
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    application = bot["application"]
+    update = Update.de_json(await request.json(), application.bot)
+    await application.update_queue.put(update)
+    stats["updates"] += 1
+    return {"ok": True}
+
+
+@app.get("/webhook/status")
+async def webhook_status():
+    """Bots served by this process and their pending update counts"""
+    return {
+        "updates": stats["updates"],
+        "rejected": stats["rejected"],
+        "uptime_seconds": round(time.time() - stats["started_at"], 1) if stats["started_at"] else 0,
+        "bots": [
+            {
+                "name": bot["module"].BOT_NAME,
+                "room_id": bot["row"]["room_id"],
+                "key": key,
+                "pending_updates": bot["application"].update_queue.qsize()
+            }
+            for key, bot in bots_by_key.items()
+        ]
+    }
+
+
+def serve(host=WEBHOOK_HOST, port=WEBHOOK_PORT):
+    print(f"🌐 Webhook server on http://{host}:{port}/webhook/<key>")
+    uvicorn.run(app, host=host, port=port)
+
+
+if __name__ == "__main__":
+    serve()
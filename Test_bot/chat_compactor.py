@@ -0,0 +1,219 @@
+# chat_compactor.py
+# Resumable duplicate compaction for telegram_chats
+#
+# telegram_chat.py used to run cleanup_database() before connecting: two
+# $group aggregations over the whole of telegram_chats, so the monitor took
+# longer to start the more history it had. Duplicates are now refused at
+# write time instead (db_schema.py):
+#
+#   chat_message_unique   (chat_id, message_id) for rows with a message_id
+#   content_hash_unique   content_hash = sha1 of chat_id / role / name / text,
+#                         for legacy rows written before message_id existed
+#
+# What is left is removing the duplicates already stored, so those indexes
+# can be built. compact() walks the collection in _id order, COMPACT_BATCH_SIZE
+# rows at a time: a row whose key was already seen (earlier batches are
+# checked with one indexed query per batch) is deleted, the first one is kept
+# - as cleanup_database did - and legacy rows get their content_hash. The
+# position is saved in schema_info after every batch, so an interrupted run
+# resumes where it stopped. Once done, the superseded indexes are dropped
+# and ensure_indexes() builds the unique ones.
+#
+# Usage:
+#   python chat_compactor.py            # compact (or resume)
+#   python chat_compactor.py --status   # progress of the last run
+#   python chat_compactor.py --reset    # start again from the beginning
+#
+# The monitor can run it in the background with TELEGRAM_COMPACT=1.
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+COMPACT_BATCH_SIZE = int(os.getenv("COMPACT_BATCH_SIZE", "1000"))
+COMPACT_PAUSE = float(os.getenv("COMPACT_PAUSE", "0.05"))  # seconds between batches (live database)
+PROGRESS_INTERVAL = 5
+
+STATE_ID = "telegram_chats_compaction"
+CONTENT_FIELDS = ("chat_id", "role", "name", "text")
+# the old sparse index from cleanup_database, and the non-unique fallbacks db_schema
+# creates while duplicates still exist
+SUPERSEDED_INDEXES = ("unique_message_idx", "chat_message", "content_hash")
+
+FIELDS = {"chat_id": 1, "message_id": 1, "content_hash": 1, "role": 1, "name": 1, "text": 1}
+
+
+def content_hash(doc):
+    """Stable hash of the fields that identify a message without a message_id"""
+    key = json.dumps([doc.get(field) for field in CONTENT_FIELDS], default=str, ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def dedup_key(doc):
+    if "message_id" in doc:
+        return ("message", doc.get("chat_id"), doc["message_id"])
+    return ("content", doc.get("content_hash") or content_hash(doc))
+
+
+def _earlier_keys(collection, batch):
+    """Keys of the batch that already belong to a row before it (one indexed query)"""
+    message_ids = defaultdict(set)
+    hashes = set()
+    for doc in batch:
+        key = dedup_key(doc)
+        if key[0] == "message":
+            message_ids[key[1]].add(key[2])
+        else:
+            hashes.add(key[1])
+
+    clauses = [{"chat_id": chat_id, "message_id": {"$in": list(ids)}} for chat_id, ids in message_ids.items()]
+    if hashes:
+        clauses.append({"content_hash": {"$in": list(hashes)}})
+    if not clauses:
+        return set()
+
+    # Rows before the batch are compacted already, legacy ones carry their content_hash
+    query = {"_id": {"$lt": batch[0]["_id"]}, "$or": clauses}
+    return {dedup_key(doc) for doc in collection.find(query, {"chat_id": 1, "message_id": 1, "content_hash": 1})}
+
+
+def compact_batch(collection, batch):
+    """Delete the duplicates in one _id-ordered batch; returns how many were removed"""
+    seen = _earlier_keys(collection, batch)
+    duplicates = []
+    hashes = []
+    for doc in batch:
+        key = dedup_key(doc)
+        if key in seen:
+            duplicates.append(doc["_id"])
+            continue
+        seen.add(key)
+        if key[0] == "content" and "content_hash" not in doc:
+            hashes.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"content_hash": key[1]}}))
+
+    if duplicates:
+        collection.delete_many({"_id": {"$in": duplicates}})
+    if hashes:
+        collection.bulk_write(hashes, ordered=False)
+    return len(duplicates)
+
+
+def load_state(db):
+    from db_schema import INFO_COLLECTION
+    return db[INFO_COLLECTION].find_one({"_id": STATE_ID}) or {}
+
+
+def _save_state(db, fields):
+    from db_schema import INFO_COLLECTION
+    fields = {key: value for key, value in fields.items() if key != "_id"}
+    db[INFO_COLLECTION].update_one({"_id": STATE_ID}, {"$set": dict(fields, updated_at=datetime.now())}, upsert=True)
+
+
+def finish(db):
+    """Drop the superseded indexes and build the unique ones"""
+    from db_schema import clear_compaction_pending, ensure_indexes
+
+    clear_compaction_pending(db)
+
+    collection = db["telegram_chats"]
+    existing = collection.index_information()
+    for name in SUPERSEDED_INDEXES:
+        if name in existing:
+            collection.drop_index(name)
+            print(f"[COMPACT] Dropped index {name}")
+    ensure_indexes(db, force=True)
+
+
+def compact(db, batch_size=COMPACT_BATCH_SIZE, reset=False, stop=None, pause=COMPACT_PAUSE):
+    """Compact telegram_chats (resuming a previous run); `stop` is a threading.Event"""
+    collection = db["telegram_chats"]
+    stop = stop or threading.Event()
+    state = {} if reset else load_state(db)
+
+    if state.get("done"):
+        print(f"[COMPACT] ✅ telegram_chats already compacted ({state.get('finished_at'):%Y-%m-%d %H:%M}) - "
+              f"use --reset to run again")
+        return state
+    if state.get("last_id"):
+        print(f"[COMPACT] Resuming after {state['scanned']} row(s), {state['removed']} duplicate(s) removed so far")
+    else:
+        state = {"last_id": None, "scanned": 0, "removed": 0, "done": False, "started_at": datetime.now()}
+        _save_state(db, state)
+
+    total = collection.estimated_document_count()
+    started = time.monotonic()
+    scanned_before = state["scanned"]
+    last_report = started
+
+    while not stop.is_set():
+        query = {"_id": {"$gt": state["last_id"]}} if state["last_id"] else {}
+        batch = list(collection.find(query, FIELDS).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        state["removed"] += compact_batch(collection, batch)
+        state["scanned"] += len(batch)
+        state["last_id"] = batch[-1]["_id"]
+        _save_state(db, state)
+
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            rate = (state["scanned"] - scanned_before) / (now - started)
+            print(f"[COMPACT] {state['scanned']}/~{total} rows ({min(state['scanned'] / max(total, 1), 1):.0%}), "
+                  f"{state['removed']} duplicate(s) removed, {rate:.0f} rows/s")
+        if pause:
+            stop.wait(pause)
+
+    if stop.is_set():
+        print(f"[COMPACT] ⏸️ Stopped after {state['scanned']} row(s) - the next run resumes from here")
+        return state
+
+    state.update(done=True, finished_at=datetime.now())
+    _save_state(db, state)
+    print(f"[COMPACT] ✅ Scanned {state['scanned']} row(s), removed {state['removed']} duplicate(s) "
+          f"in {time.monotonic() - started:.1f}s")
+    finish(db)
+    return state
+
+
+def print_status(db):
+    state = load_state(db)
+    if not state:
+        print("[COMPACT] Never run")
+    elif state.get("done"):
+        print(f"[COMPACT] ✅ Done at {state['finished_at']:%Y-%m-%d %H:%M}: "
+              f"{state['scanned']} row(s) scanned, {state['removed']} duplicate(s) removed")
+    else:
+        print(f"[COMPACT] In progress (last update {state['updated_at']:%Y-%m-%d %H:%M}): "
+              f"{state['scanned']} row(s) scanned, {state['removed']} duplicate(s) removed")
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    uri = os.getenv("DB_URI") or os.getenv("MONGODB_URI")
+    db = MongoClient(uri)[os.getenv("MONGODB_DB", "Raihan")]
+
+    if "--status" in sys.argv:
+        print_status(db)
+        return
+
+    try:
+        compact(db, reset="--reset" in sys.argv, pause=0)
+    except KeyboardInterrupt:
+        # Every finished batch is saved; the interrupted one is simply redone
+        print("\n[COMPACT] Interrupted - run again to resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# context_window.py
+# Token-budgeted prompt window for the customer bots
+#
+# gpt_customer_response used to send the whole history on every turn, so cost
+# and latency grew with the length of a salesperson test. build_context() now
+# sends the system prompt, a rolling summary of older turns and only the most
+# recent turns that fit in CONTEXT_TOKEN_BUDGET. Once more than
+# CONTEXT_KEEP_TURNS exchanges have piled up, summarise() folds the oldest ones
+# into conv['summary'] (one cheap LLM call, run in the background) and drops
+# them from the in-memory history.
+
+import asyncio
+import os
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "8"))
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "6"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo")
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "150"))
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "You summarise a conversation between a SALESPERSON and a CUSTOMER. "
+    "Merge the previous summary with the new lines into one short paragraph "
+    "(max 80 words), written from the customer's point of view. Keep what the "
+    "customer wants, prices, objections and anything already agreed. "
+    "Reply with the summary only."
+)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding file unavailable offline
+    _encoding = None
+
+
+def count_tokens(text):
+    """Token count of a string (tiktoken if available, else ~4 chars/token)"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def message_tokens(message):
+    return count_tokens(message.get('content')) + MESSAGE_OVERHEAD
+
+
+def split_history(messages):
+    """Split a message list into (leading system messages, dialogue turns)"""
+    head = 0
+    while head < len(messages) and messages[head]['role'] == 'system':
+        head += 1
+    return messages[:head], messages[head:]
+
+
+def build_context(conv, budget=CONTEXT_TOKEN_BUDGET, extra=None):
+    """Return the messages to send: system prompt, summary, recent turns, extra"""
+    system, turns = split_history(conv['messages'])
+    extra = list(extra or [])
+
+    head = list(system)
+    if conv.get('summary'):
+        head.append({
+            "role": "system",
+            "content": f"Summary of the conversation so far: {conv['summary']}"
+        })
+
+    used = sum(message_tokens(m) for m in head) + sum(message_tokens(m) for m in extra)
+
+    # Walk back from the newest turn; the latest salesperson line always goes in
+    recent = []
+    for message in reversed(turns):
+        cost = message_tokens(message)
+        if recent and used + cost > budget:
+            break
+        recent.append(message)
+        used += cost
+    recent.reverse()
+
+    return head + recent + extra
+
+
+def needs_summary(conv, keep_turns=CONTEXT_KEEP_TURNS, batch_turns=SUMMARY_BATCH_TURNS):
+    """True once the dialogue is batch_turns exchanges past the keep window"""
+    _, turns = split_history(conv['messages'])
+    return len(turns) >= (keep_turns + batch_turns) * 2
+
+
+def _fallback_summary(previous, lines):
+    """Extractive summary used when the LLM call fails"""
+    parts = [previous] if previous else []
+    parts += [line[:120] for line in lines]
+    return " | ".join(parts)[-1200:]
+
+
+async def summarise(conv, complete, keep_turns=CONTEXT_KEEP_TURNS):
+    """Fold every turn older than the last keep_turns exchanges into conv['summary']
+
+    `complete` is an awaitable chat completion (llm_client.chat_completion).
+    """
+    _, turns = split_history(conv['messages'])
+    old = turns[:max(0, len(turns) - keep_turns * 2)]
+    if not old:
+        return conv.get('summary')
+
+    lines = [
+        f"{'SALESPERSON' if m['role'] == 'user' else 'CUSTOMER'}: {m['content']}"
+        for m in old
+    ]
+    previous = conv.get('summary') or ""
+
+    try:
+        response = await complete(
+            model=SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Previous summary: {previous or '(none)'}\n\nNew lines:\n" + "\n".join(lines)}
+            ],
+            temperature=0.2,
+            max_tokens=SUMMARY_MAX_TOKENS
+        )
+        summary = response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"[WARNING] Summary failed, using extract: {type(e).__name__}: {e}")
+        summary = _fallback_summary(previous, lines)
+
+    # New turns may have been appended while we waited - only drop the ones we folded
+    folded = {id(m) for m in old}
+    conv['messages'][:] = [m for m in conv['messages'] if id(m) not in folded]
+    conv['summary'] = summary
+    return summary
+
+
+def schedule_summary(conv, complete):
+    """Start summarise() in the background if it is due and not already running"""
+    task = conv.get('summary_task')
+    if (task and not task.done()) or not needs_summary(conv):
+        return None
+
+    conv['summary_task'] = asyncio.create_task(summarise(conv, complete))
+    return conv['summary_task']
@@ -0,0 +1,252 @@
+# conversation_stats.py
+# Materialised per-test statistics (the conversation_stats collection)
+#
+# /api/stats, /api/stats/{test_id} and /api/conversations used to recompute
+# message counts, duration and average response time from raw chat_bot rows
+# on every call. conversation_stats keeps one rollup document per
+# conversation_id instead:
+#
+#   total_messages, <role>_messages      counters
+#   start_time, end_time                 first / last message timestamp
+#   response_ms_sum, response_count      running reply-gap total (a gap is
+#                                        counted when the speaker changes)
+#   last_role, last_timestamp            the newest message, so the next
+#                                        write can measure its gap
+#
+# Updates are incremental and atomic: each batch of new messages is folded
+# per conversation in Python (Rollup) and merged with one pipeline
+# update_one(upsert=True). CONVERSATION_STATS selects who does it:
+#
+#   inline (default)  MessageStore updates the rollup after each write
+#   watch             a worker follows chat_bot inserts (change stream) -
+#                     use this when other processes write chat_bot directly
+#   off               nothing is maintained
+#
+# Messages arriving out of timestamp order (several writers) are counted, but
+# their reply gap is approximate; --rebuild recomputes everything exactly.
+#
+# Usage:
+#   python conversation_stats.py --rebuild   # recompute from chat_bot
+#   python conversation_stats.py --watch     # change-stream worker (replica set)
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+CONVERSATION_STATS = os.getenv("CONVERSATION_STATS", "inline").lower()
+STATS_COLLECTION = "conversation_stats"
+ROLES = ("customer", "salesperson")
+
+# schema_info document recording the last rebuild and the watcher resume token
+STATE_ID = "conversation_stats"
+
+WATCH_BATCH_SIZE = 200
+
+
+class Rollup:
+    """Running stats of one conversation, folded from messages in timestamp order"""
+
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+        self.total = 0
+        self.role_counts = {}
+        self.first_role = None
+        self.first_timestamp = None
+        self.last_role = None
+        self.last_timestamp = None
+        self.response_ms_sum = 0.0
+        self.response_count = 0
+
+    def add(self, role, timestamp):
+        # MongoDB keeps milliseconds; match what a rebuild reads back
+        timestamp = timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+        self.total += 1
+        self.role_counts[role] = self.role_counts.get(role, 0) + 1
+        if self.first_timestamp is None:
+            self.first_role, self.first_timestamp = role, timestamp
+        elif role != self.last_role and timestamp > self.last_timestamp:
+            self.response_ms_sum += (timestamp - self.last_timestamp) / timedelta(milliseconds=1)
+            self.response_count += 1
+        self.last_role, self.last_timestamp = role, timestamp
+
+    def document(self):
+        """A complete conversation_stats document (for a rebuild)"""
+        doc = {
+            "_id": self.conversation_id,
+            "conversation_id": self.conversation_id,
+            "total_messages": self.total,
+            "start_time": self.first_timestamp,
+            "end_time": self.last_timestamp,
+            "response_ms_sum": self.response_ms_sum,
+            "response_count": self.response_count,
+            "last_role": self.last_role,
+            "last_timestamp": self.last_timestamp,
+            "updated_at": datetime.now()
+        }
+        for role in ROLES:
+            doc[f"{role}_messages"] = 0
+        for role, count in self.role_counts.items():
+            doc[f"{role}_messages"] = count
+        return doc
+
+    def update(self):
+        """Pipeline update merging this batch into the stored document.
+        Every expression in the single $set stage sees the stored (old) values."""
+        stored_last = {"$ifNull": ["$last_timestamp", None]}
+        # gap between the stored newest message and the first one of this batch
+        joins = {"$and": [
+            {"$ne": [stored_last, None]},
+            {"$ne": ["$last_role", {"$literal": self.first_role}]},
+            {"$gt": [self.first_timestamp, stored_last]}
+        ]}
+        in_order = {"$or": [{"$eq": [stored_last, None]}, {"$gte": [self.last_timestamp, stored_last]}]}
+
+        fields = {
+            "conversation_id": {"$literal": self.conversation_id},
+            "total_messages": {"$add": [{"$ifNull": ["$total_messages", 0]}, self.total]},
+            "start_time": {"$min": ["$start_time", self.first_timestamp]},
+            "end_time": {"$max": ["$end_time", self.last_timestamp]},
+            "response_ms_sum": {"$add": [
+                {"$ifNull": ["$response_ms_sum", 0]},
+                self.response_ms_sum,
+                {"$cond": [joins, {"$subtract": [self.first_timestamp, stored_last]}, 0]}
+            ]},
+            "response_count": {"$add": [
+                {"$ifNull": ["$response_count", 0]},
+                self.response_count,
+                {"$cond": [joins, 1, 0]}
+            ]},
+            "last_role": {"$cond": [in_order, {"$literal": self.last_role}, "$last_role"]},
+            "last_timestamp": {"$cond": [in_order, self.last_timestamp, "$last_timestamp"]},
+            "updated_at": datetime.now()
+        }
+        for role, count in self.role_counts.items():
+            field = f"{role}_messages"
+            fields[field] = {"$add": [{"$ifNull": [f"${field}", 0]}, count]}
+        return [{"$set": fields}]
+
+
+def rollups(messages):
+    """Fold chat_bot documents into one Rollup per conversation_id"""
+    by_conversation = {}
+    for message in sorted(messages, key=lambda m: m["timestamp"]):
+        conversation_id = message.get("conversation_id")
+        if conversation_id is None:
+            continue
+        rollup = by_conversation.get(conversation_id)
+        if rollup is None:
+            rollup = by_conversation[conversation_id] = Rollup(conversation_id)
+        rollup.add(message.get("role"), message["timestamp"])
+    return by_conversation
+
+
+async def apply_async(collection, messages):
+    """Merge new messages into the rollup (motor / storage.py collection)"""
+    for conversation_id, rollup in rollups(messages).items():
+        await collection.update_one({"_id": conversation_id}, rollup.update(), upsert=True)
+
+
+def apply(collection, messages):
+    """Merge new messages into the rollup (pymongo collection)"""
+    for conversation_id, rollup in rollups(messages).items():
+        collection.update_one({"_id": conversation_id}, rollup.update(), upsert=True)
+
+
+def rebuild(db):
+    """Recompute every rollup document from chat_bot (streams, one pass)"""
+    from db_schema import INFO_COLLECTION
+
+    # MongoDB stores milliseconds - truncate so documents written below never look older
+    started = datetime.now()
+    started = started.replace(microsecond=started.microsecond // 1000 * 1000)
+    stats = db[STATS_COLLECTION]
+    conversations = 0
+    rollup = None
+
+    def save(rollup):
+        stats.replace_one({"_id": rollup.conversation_id}, rollup.document(), upsert=True)
+
+    cursor = db["chat_bot"].find(
+        {"conversation_id": {"$ne": None}},
+        {"conversation_id": 1, "role": 1, "timestamp": 1, "_id": 0}
+    ).sort([("conversation_id", 1), ("timestamp", 1)])
+
+    for message in cursor:
+        if rollup is None or message["conversation_id"] != rollup.conversation_id:
+            if rollup:
+                save(rollup)
+                conversations += 1
+            rollup = Rollup(message["conversation_id"])
+        rollup.add(message.get("role"), message["timestamp"])
+    if rollup:
+        save(rollup)
+        conversations += 1
+
+    # Conversations whose messages are gone (not rewritten above)
+    removed = stats.delete_many({"updated_at": {"$lt": started}}).deleted_count
+    db[INFO_COLLECTION].update_one({"_id": STATE_ID}, {"$set": {"rebuilt_at": datetime.now()}}, upsert=True)
+    print(f"[STATS] ✅ Rebuilt {conversations} conversation(s), removed {removed} stale, "
+          f"in {(datetime.now() - started).total_seconds():.1f}s")
+    return conversations
+
+
+def ensure_rollup(db):
+    """Build the rollup once if it has never been built (API startup)"""
+    from db_schema import INFO_COLLECTION
+
+    state = db[INFO_COLLECTION].find_one({"_id": STATE_ID}) or {}
+    if state.get("rebuilt_at"):
+        return False
+    print("[STATS] conversation_stats has never been built - rebuilding from chat_bot")
+    rebuild(db)
+    return True
+
+
+def watch(db):
+    """Follow chat_bot inserts and keep the rollup current (needs a replica set)"""
+    from db_schema import INFO_COLLECTION
+
+    state = db[INFO_COLLECTION].find_one({"_id": STATE_ID}) or {}
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    print("[STATS] Watching chat_bot inserts" + (" (resuming)" if state.get("resume_token") else ""))
+
+    with db["chat_bot"].watch(pipeline, resume_after=state.get("resume_token")) as stream:
+        while stream.alive:
+            batch = []
+            change = stream.try_next()
+            while change is not None:
+                batch.append(change["fullDocument"])
+                if len(batch) >= WATCH_BATCH_SIZE:
+                    break
+                change = stream.try_next()
+            if not batch:
+                time.sleep(0.2)
+                continue
+
+            apply(db[STATS_COLLECTION], batch)
+            db[INFO_COLLECTION].update_one(
+                {"_id": STATE_ID}, {"$set": {"resume_token": stream.resume_token}}, upsert=True
+            )
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    uri = os.getenv("DB_URI") or os.getenv("MONGODB_URI")
+    db = MongoClient(uri)[os.getenv("MONGODB_DB", "Raihan")]
+
+    if "--rebuild" in sys.argv:
+        rebuild(db)
+    elif "--watch" in sys.argv:
+        if CONVERSATION_STATS == "inline":
+            print("⚠️  CONVERSATION_STATS=inline - the bots update the rollup too; set it to 'watch' everywhere")
+        watch(db)
+    else:
+        print("Usage: python conversation_stats.py --rebuild | --watch")
+
+
+if __name__ == "__main__":
+    main()
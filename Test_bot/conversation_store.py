@@ -0,0 +1,134 @@
+# conversation_store.py
+# Bounded in-memory conversation histories for the customer bots
+#
+# conversation_histories used to be a plain dict that kept every chat (and its
+# full message list) forever. ConversationStore keeps at most CONV_MAX_CHATS
+# chats (least recently used are evicted), drops chats idle for longer than
+# CONV_TTL seconds (swept on every get/put - the idle ones sit at the front,
+# so a sweep stops at the first live chat) and caps each history at
+# CONV_MAX_TURNS exchanges after the system prompt. An evicted chat is rebuilt lazily from `chat_bot` the next
+# time it is used (see rehydrate), with the same product (see stable_choice).
+
+import os
+import random
+import time
+from collections import OrderedDict
+
+CONV_MAX_CHATS = int(os.getenv("CONV_MAX_CHATS", "1000"))
+CONV_TTL = float(os.getenv("CONV_TTL", str(6 * 3600)))
+CONV_MAX_TURNS = int(os.getenv("CONV_MAX_TURNS", "30"))
+
+# chat_bot role -> OpenAI role, from the customer bot's point of view
+ROLE_MAP = {"salesperson": "user", "customer": "assistant"}
+
+
+def stable_choice(pool, *key):
+    """random.choice that always picks the same item for the same key (in every process)"""
+    return random.Random(":".join(str(part) for part in key)).choice(pool)
+
+
+class ConversationStore:
+    """LRU + TTL map of chat_id -> conversation dict"""
+
+    def __init__(self, max_chats=CONV_MAX_CHATS, ttl=CONV_TTL, max_turns=CONV_MAX_TURNS):
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._items = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self.rehydrations = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, chat_id):
+        return self.get(chat_id, touch=False) is not None
+
+    def get(self, chat_id, touch=True):
+        """Return the conversation for chat_id, or None if absent/expired"""
+        self.sweep()
+        conv = self._items.get(chat_id)
+        if conv is None:
+            return None
+
+        now = time.monotonic()
+        if now - conv['last_used'] > self.ttl:
+            del self._items[chat_id]
+            self.expirations += 1
+            return None
+
+        if touch:
+            conv['last_used'] = now
+            self._items.move_to_end(chat_id)
+        return conv
+
+    def put(self, chat_id, conv):
+        """Store a conversation, evicting the least recently used if full"""
+        self.sweep()
+        conv['last_used'] = time.monotonic()
+        self._items[chat_id] = conv
+        self._items.move_to_end(chat_id)
+
+        while len(self._items) > self.max_chats:
+            self._items.popitem(last=False)
+            self.evictions += 1
+        return conv
+
+    def pop(self, chat_id):
+        return self._items.pop(chat_id, None)
+
+    def sweep(self):
+        """Drop every expired chat (cheap: oldest entries are at the front)"""
+        now = time.monotonic()
+        removed = 0
+        while self._items:
+            chat_id, conv = next(iter(self._items.items()))
+            if now - conv['last_used'] <= self.ttl:
+                break
+            del self._items[chat_id]
+            removed += 1
+        self.expirations += removed
+        return removed
+
+    def trim(self, conv):
+        """Keep the leading system prompt(s) plus the last max_turns exchanges"""
+        messages = conv['messages']
+        head = 0
+        while head < len(messages) and messages[head]['role'] == 'system':
+            head += 1
+
+        limit = self.max_turns * 2
+        if len(messages) - head > limit:
+            del messages[head:len(messages) - limit]
+        return conv
+
+    def append(self, conv, role, content):
+        """Append a message and keep the history bounded"""
+        conv['messages'].append({"role": role, "content": content})
+        self.trim(conv)
+
+    async def rehydrate(self, store, chat_id, test_id, room_id=None):
+        """Rebuild the recent message list of an evicted chat from chat_bot (this bot's room only)"""
+        try:
+            docs = await store.get_recent_chat_messages(test_id, chat_id, limit=self.max_turns * 2, room_id=room_id)
+        except Exception as e:
+            print(f"[WARNING] Could not rehydrate chat {chat_id}: {e}")
+            return []
+
+        messages = [
+            {"role": ROLE_MAP[doc['role']], "content": doc['text']}
+            for doc in docs if doc.get('role') in ROLE_MAP and doc.get('text')
+        ]
+        if messages:
+            self.rehydrations += 1
+        return messages
+
+    def stats(self):
+        return {
+            "chats": len(self._items),
+            "max_chats": self.max_chats,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rehydrations": self.rehydrations
+        }
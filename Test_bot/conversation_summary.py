@@ -0,0 +1,322 @@
+# conversation_summary.py
+# Server-side per-conversation stats for the dashboard APIs
+#
+# /api/conversations used to walk every evaluation_scores document and, for
+# each one, run three count_documents, two sorted find_one and then load the
+# whole conversation again to measure response times - 6+ round-trips per
+# test. conversations_pipeline() does it in one aggregation: each score
+# document $lookups its chat_bot messages (conversation_timestamp index),
+# $setWindowFields pairs every message with the one before it, and a $group
+# reduces them to counts, first/last timestamp and the response-time gaps.
+# stats_pipeline() does the same for /api/stats, one row per conversation_id
+# listed in the conversation_stats rollup (conversation_stats.py). Both take
+# filters and a keyset page (pagination.py) and sort/page the candidate rows
+# BEFORE touching chat_bot, so a page costs its own rows' messages only.
+#
+# Unless a message-level filter (room_id, date range) is given, the stats
+# come from the rollup itself - one _id lookup per row rather than a pass
+# over its messages. Each row also looks up its newest chat_bot message
+# (conversation_timestamp index); a row whose rollup is missing or ends
+# before it is flagged "stale" and with_fresh_stats() recomputes it from
+# chat_bot - a writer that bypasses MessageStore, or CONVERSATION_STATS=watch
+# with no worker running, costs accuracy nowhere, only speed.
+#
+# Needs MongoDB 5.0+ ($setWindowFields, $lookup with localField + pipeline).
+
+from conversation_stats import STATS_COLLECTION, rollups
+from pagination import keyset_stages
+
+SCORE_FIELDS = {"test_id": 1, "score": 1, "english_level": 1, "assessment": 1}
+
+# Highest score first; test_id breaks ties so keyset cursors are unique
+SCORE_SORT = [("score_numeric", -1), ("test_id", 1)]
+
+# '43.2/100' -> 43.2 on the server (0 when missing or unparsable), so the sort and
+# score-band filters run in MongoDB
+SCORE_NUMERIC = {
+    "$convert": {
+        "input": {"$arrayElemAt": [{"$split": [{"$toString": {"$ifNull": ["$score", "0"]}}, "/"]}, 0]},
+        "to": "double",
+        "onError": 0,
+        "onNull": 0
+    }
+}
+
+
+# conversation_stats document -> the same fields message_stats() produces
+ROLLUP_STATS = {
+    "_id": 0,
+    "total_messages": 1,
+    "customer_messages": {"$ifNull": ["$customer_messages", 0]},
+    "salesperson_messages": {"$ifNull": ["$salesperson_messages", 0]},
+    "start_time": 1,
+    "end_time": 1,
+    "avg_response_ms": {"$cond": [
+        {"$gt": ["$response_count", 0]},
+        {"$divide": ["$response_ms_sum", "$response_count"]},
+        None
+    ]}
+}
+
+
+def _freshness_stages():
+    """Flag rows whose rollup stats are missing or older than their newest message;
+    rows with no message at all are dropped"""
+    return [
+        {"$lookup": {
+            "from": "chat_bot",
+            "localField": "test_id",
+            "foreignField": "conversation_id",
+            "pipeline": [{"$sort": {"timestamp": -1}}, {"$limit": 1}, {"$project": {"_id": 0, "timestamp": 1}}],
+            "as": "newest"
+        }},
+        {"$unwind": "$newest"},
+        {"$set": {"stale": {"$not": [{"$gte": ["$stats.end_time", "$newest.timestamp"]}]}}},
+        {"$unset": "newest"}
+    ]
+
+
+def _reply_gap_ms(max_gap_seconds=None):
+    """Milliseconds since the previous message when the speaker changed, else null"""
+    gap = {"$subtract": ["$timestamp", "$prev_timestamp"]}
+    conditions = [
+        {"$ne": ["$prev_timestamp", None]},
+        {"$ne": ["$role", "$prev_role"]},
+        {"$gt": ["$timestamp", "$prev_timestamp"]}
+    ]
+    if max_gap_seconds:
+        conditions.append({"$lt": [gap, max_gap_seconds * 1000]})
+    return {"$cond": [{"$and": conditions}, gap, None]}
+
+
+def message_stats(group_by=None, roles=("customer", "salesperson"), max_gap_seconds=None):
+    """$setWindowFields + $group stages reducing messages to counts, first/last
+    timestamp and average reply gap (one row per `group_by` value)"""
+    window = {
+        "sortBy": {"timestamp": 1},
+        "output": {
+            "prev_role": {"$shift": {"output": "$role", "by": -1}},
+            "prev_timestamp": {"$shift": {"output": "$timestamp", "by": -1}}
+        }
+    }
+    if group_by:
+        window["partitionBy"] = group_by
+
+    group = {
+        "_id": group_by,
+        "total_messages": {"$sum": 1},
+        "start_time": {"$min": "$timestamp"},
+        "end_time": {"$max": "$timestamp"},
+        # $avg skips the nulls, so only speaker changes are averaged
+        "avg_response_ms": {"$avg": _reply_gap_ms(max_gap_seconds)}
+    }
+    for role in roles:
+        group[f"{role}_messages"] = {"$sum": {"$cond": [{"$eq": ["$role", role]}, 1, 0]}}
+
+    return [{"$setWindowFields": window}, {"$group": group}]
+
+
+def conversations_pipeline(match=None, message_match=None, sort=None, after=None, limit=None):
+    """Aggregation on evaluation_scores: one row per evaluated test that has messages.
+
+    match         - filter on the score documents (test_id, score_numeric, ...)
+    message_match - filter on the chat_bot messages counted (room_id, timestamp, ...)
+    sort/after/limit - keyset page (see pagination.py); the $lookup only runs
+                       for the rows that make it onto the page
+    """
+    stages = [
+        {"$match": {"test_id": {"$nin": [None, ""]}}},
+        {"$project": SCORE_FIELDS},
+        {"$addFields": {"score_numeric": SCORE_NUMERIC}}
+    ]
+    if match:
+        stages.append({"$match": match})
+    if sort:
+        stages += keyset_stages(sort, after)
+
+    if message_match:
+        stages += [
+            {"$lookup": {"from": "chat_bot", "localField": "test_id", "foreignField": "conversation_id",
+                         "pipeline": [{"$match": message_match}] + message_stats(), "as": "stats"}},
+            # No messages -> empty stats -> dropped, like the old "continue"
+            {"$unwind": "$stats"}
+        ]
+    else:
+        stages += [
+            {"$lookup": {"from": STATS_COLLECTION, "localField": "test_id", "foreignField": "_id",
+                         "pipeline": [{"$project": ROLLUP_STATS}], "as": "stats"}},
+            {"$set": {"stats": {"$arrayElemAt": ["$stats", 0]}}}
+        ] + _freshness_stages()
+    if limit:
+        stages.append({"$limit": limit + 1})
+    return stages
+
+
+def _evaluation_join():
+    """Attach the evaluation_scores fields to {test_id, stats} rows"""
+    return [
+        {"$lookup": {
+            "from": "evaluation_scores",
+            "localField": "test_id",
+            "foreignField": "test_id",
+            "pipeline": [{"$project": {"_id": 0, "score": 1, "english_level": 1, "assessment": 1}}],
+            "as": "evaluation"
+        }},
+        {"$replaceWith": {"$mergeObjects": [
+            {"$arrayElemAt": ["$evaluation", 0]},
+            {"test_id": "$test_id", "stats": "$stats"}
+        ]}},
+        {"$addFields": {"score_numeric": SCORE_NUMERIC}}
+    ]
+
+
+def stats_pipeline(match=None, message_match=None, sort=SCORE_SORT, after=None, limit=None):
+    """Aggregation on conversation_stats: one row per conversation_id (evaluated or
+    not) joined with its evaluation_scores document.
+
+    Without message_match the stats are the rollup's (rows it is behind on are
+    flagged stale - run them through with_fresh_stats). With it (room_id, timestamp,
+    ...) they are recomputed from the matching chat_bot messages by a $lookup that
+    only runs for the rows that make it onto the page; conversations with no
+    matching message are dropped.
+    """
+    if message_match:
+        stages = [{"$project": {"_id": 0, "test_id": "$_id"}}]
+    else:
+        stages = [{"$project": {"_id": 0, "test_id": "$_id", "stats": ROLLUP_STATS}}]
+    stages += _evaluation_join()
+    if match:
+        stages.append({"$match": match})
+    stages += keyset_stages(sort, after)
+
+    if message_match:
+        stages += [
+            {"$lookup": {
+                "from": "chat_bot",
+                "localField": "test_id",
+                "foreignField": "conversation_id",
+                "pipeline": [{"$match": message_match}] + message_stats(),
+                "as": "stats"
+            }},
+            {"$unwind": "$stats"}
+        ]
+    else:
+        stages += _freshness_stages()
+    if limit:
+        stages.append({"$limit": limit + 1})
+    return stages
+
+
+def aggregate_stats(db, match=None, message_match=None, after=None, limit=None, **kwargs):
+    """Run the /api/stats aggregation (a page of conversation_stats rows)"""
+    pipeline = stats_pipeline(match, message_match, after=after, limit=limit)
+    return db[STATS_COLLECTION].aggregate(pipeline, **kwargs)
+
+
+def _rollup_stats(rollup):
+    """conversation_stats document -> the same fields message_stats() produces"""
+    response_count = rollup.get("response_count", 0)
+    return {
+        "total_messages": rollup.get("total_messages", 0),
+        "customer_messages": rollup.get("customer_messages", 0),
+        "salesperson_messages": rollup.get("salesperson_messages", 0),
+        "start_time": rollup.get("start_time"),
+        "end_time": rollup.get("end_time"),
+        "avg_response_ms": rollup["response_ms_sum"] / response_count if response_count else None
+    }
+
+
+def fresh_stats(db, test_ids):
+    """Exact stats from the chat_bot messages of `test_ids` (rollup missing or behind)"""
+    messages = db["chat_bot"].find(
+        {"conversation_id": {"$in": list(test_ids)}},
+        {"_id": 0, "conversation_id": 1, "role": 1, "timestamp": 1}
+    )
+    return {test_id: _rollup_stats(rollup.document()) for test_id, rollup in rollups(messages).items()}
+
+
+def with_fresh_stats(db, docs):
+    """Yield aggregation rows, recomputing the stats of the ones flagged stale"""
+    for doc in docs:
+        if doc.pop("stale", False):
+            stats = fresh_stats(db, [doc["test_id"]]).get(doc["test_id"])
+            if stats is None:
+                continue  # its messages were deleted meanwhile
+            doc["stats"] = stats
+        yield doc
+
+
+def get_stats(db, test_id):
+    """stats_row-shaped dict for one test (three indexed lookups), or None.
+    Falls back to the chat_bot messages when the rollup is missing or behind."""
+    newest = db["chat_bot"].find_one({"conversation_id": test_id}, {"timestamp": 1}, sort=[("timestamp", -1)])
+    if not newest:
+        return None
+    # The rollup keeps milliseconds, like MongoDB
+    newest_at = newest["timestamp"].replace(microsecond=newest["timestamp"].microsecond // 1000 * 1000)
+    rollup = db[STATS_COLLECTION].find_one({"_id": test_id})
+    if rollup and rollup.get("end_time") and rollup["end_time"] >= newest_at:
+        stats = _rollup_stats(rollup)
+    else:
+        stats = fresh_stats(db, [test_id]).get(test_id)
+        if stats is None:
+            return None
+    evaluation = db["evaluation_scores"].find_one({"test_id": test_id}) or {}
+    return stats_row({**evaluation, "test_id": test_id, "stats": stats})
+
+
+def format_test_duration(start_time, end_time):
+    """'1 Hr 2 Min 3 Sec' between the first and last message"""
+    if not start_time or not end_time:
+        return "N/A"
+    total_seconds = int((end_time - start_time).total_seconds())
+    hours = total_seconds // 3600
+    total_seconds %= 3600
+    minutes = total_seconds // 60
+    seconds = total_seconds % 60
+    return f"{hours} Hr {minutes} Min {seconds} Sec"
+
+
+def format_response_time(avg_seconds):
+    """Average response time as '12.3 sec' / '4.5 min' / '1.2 hr'"""
+    if avg_seconds is None:
+        return "N/A"
+    if avg_seconds < 60:
+        return f"{avg_seconds:.1f} sec"
+    elif avg_seconds < 3600:
+        return f"{avg_seconds / 60:.1f} min"
+    else:
+        return f"{avg_seconds / 3600:.1f} hr"
+
+
+def conversation_row(doc):
+    """Shape one aggregation result like the /api/conversations entries"""
+    stats = doc["stats"]
+    avg_ms = stats.get("avg_response_ms")
+    return {
+        "test_id": doc["test_id"],
+        "response_time": format_response_time(avg_ms / 1000 if avg_ms is not None else None),
+        "score": doc.get("score", "N/A"),
+        "english_level": doc.get("english_level", "N/A"),
+        "level_description": doc.get("assessment", "N/A"),
+        "total_messages": stats["total_messages"],
+        "customer_messages": stats["customer_messages"],
+        "salesperson_messages": stats["salesperson_messages"],
+        "test_duration": format_test_duration(stats.get("start_time"), stats.get("end_time")),
+        "start_time": stats.get("start_time"),
+        "end_time": stats.get("end_time")
+    }
+
+
+def stats_row(doc):
+    """Shape one stats_pipeline result like the /api/stats entries"""
+    row = conversation_row(doc)
+    duration = row.pop("test_duration")
+    row["duration"] = None if duration == "N/A" else duration
+    return row
+
+
+def summarise_conversations(scores_collection, **kwargs):
+    """Run conversations_pipeline and return the formatted rows"""
+    docs = scores_collection.aggregate(conversations_pipeline(**kwargs))
+    return [conversation_row(doc) for doc in with_fresh_stats(scores_collection.database, docs)]
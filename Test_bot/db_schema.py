@@ -0,0 +1,275 @@
+# db_schema.py
+# Index bootstrap for the shared MongoDB collections
+#
+# The bots, the dashboards and the evaluator all filter chat_bot by
+# conversation_id / role / room_id and sort by timestamp, look up
+# evaluation_scores by test_id and take the newest active test from
+# active_test_ids. Without indexes every one of those is a collection scan
+# that gets slower as history grows. INDEXES declares one index per query
+# shape; ensure_indexes() (pymongo) / ensure_indexes_async() (motor) create
+# them at startup - both carry out the same _bootstrap() steps. Bump
+# SCHEMA_VERSION when INDEXES changes - processes skip the bootstrap once the
+# database records the current version.
+#
+# The telegram_chats / telegram_friends indexes back the keyset pages of
+# telegram_chat_api.py (see pagination.py). telegram_friends.chat_id is unique
+# so the Telethon monitor can never create the same friend twice (person_ids
+# come from the counter in sequences.py). The two partial unique indexes on
+# telegram_chats refuse duplicate messages at write time; chat_compactor.py
+# removes the ones stored before they existed. While such duplicates exist
+# those two are created non-unique and recorded as pending compaction, so
+# later starts skip the (failing, full-collection) unique builds until
+# chat_compactor.finish() clears the marker and builds them.
+#
+# Usage:
+#   python db_schema.py            # create indexes (DB_URI or MONGODB_URI)
+#   python db_schema.py --check    # explain the query shapes, print COLLSCANs
+
+import os
+import sys
+from datetime import datetime
+
+SCHEMA_VERSION = 6
+
+INDEXES = {
+    "chat_bot": [
+        # find({conversation_id}).sort(timestamp), count_documents, first/last message
+        ([("conversation_id", 1), ("timestamp", 1)], {"name": "conversation_timestamp"}),
+        # evaluator: salesperson messages of a test; role counts in the dashboards
+        ([("conversation_id", 1), ("role", 1), ("timestamp", 1)], {"name": "conversation_role_timestamp"}),
+        # evaluator checkpoint: salesperson messages of a test stored after (stored_at, _id)
+        ([("conversation_id", 1), ("role", 1), ("stored_at", 1), ("_id", 1)], {"name": "conversation_role_stored_at"}),
+        # /api/messages/{room_id}/{conversation_id}
+        ([("room_id", 1), ("conversation_id", 1), ("timestamp", 1)], {"name": "room_conversation_timestamp"}),
+        # bots rehydrating an evicted chat of their own room (storage.get_recent_chat_messages)
+        ([("room_id", 1), ("conversation_id", 1), ("chat_id", 1), ("timestamp", 1)],
+         {"name": "room_conversation_chat_timestamp"}),
+    ],
+    "evaluation_scores": [
+        ([("test_id", 1)], {"name": "test_id_unique", "unique": True}),
+    ],
+    "active_test_ids": [
+        # find_one({status: "active"}, sort created_at desc)
+        ([("status", 1), ("created_at", -1)], {"name": "status_created_at"}),
+    ],
+    "telegram_chats": [
+        # /api/conversations pages (timestamp, _id keyset)
+        ([("timestamp", 1), ("_id", 1)], {"name": "timestamp_id"}),
+        # per-person messages and the /api/friends stats lookup
+        ([("person_id", 1), ("timestamp", 1)], {"name": "person_timestamp"}),
+        # one row per Telegram message (the monitor's batched inserts skip duplicates)
+        ([("chat_id", 1), ("message_id", 1)], {"name": "chat_message_unique", "unique": True,
+                                               "partialFilterExpression": {"message_id": {"$exists": True}}}),
+        # legacy rows without message_id, keyed by chat_compactor.content_hash
+        ([("content_hash", 1)], {"name": "content_hash_unique", "unique": True,
+                                 "partialFilterExpression": {"content_hash": {"$exists": True}}}),
+    ],
+    "telegram_friends": [
+        # /api/friends pages (person_id, _id keyset)
+        ([("person_id", 1), ("_id", 1)], {"name": "person_id_id"}),
+        # telegram_chat.py friend lookup; one friend per chat
+        ([("chat_id", 1)], {"name": "chat_id_unique", "unique": True}),
+    ],
+}
+
+# Indexes replaced by one above - dropped by the bootstrap (missing ones are ignored)
+DROPPED_INDEXES = {
+    "chat_bot": ["conversation_chat_timestamp"],  # now room_conversation_chat_timestamp
+}
+
+# (collection, filter, sort) - representative queries for --check
+QUERY_SHAPES = [
+    ("chat_bot", {"conversation_id": "T"}, [("timestamp", 1)]),
+    ("chat_bot", {"conversation_id": "T", "role": "salesperson"}, [("timestamp", 1)]),
+    ("chat_bot", {"conversation_id": "T", "role": "salesperson", "stored_at": {"$gt": datetime(2000, 1, 1)}},
+     [("stored_at", 1), ("_id", 1)]),
+    ("chat_bot", {"room_id": 1, "conversation_id": "T"}, [("timestamp", 1)]),
+    ("chat_bot", {"room_id": 1, "conversation_id": "T", "chat_id": 1}, [("timestamp", -1)]),
+    ("evaluation_scores", {"test_id": "T"}, None),
+    ("active_test_ids", {"status": "active"}, [("created_at", -1)]),
+    ("telegram_chats", {}, [("timestamp", 1), ("_id", 1)]),
+    ("telegram_chats", {"person_id": 1}, [("timestamp", 1)]),
+    ("telegram_chats", {"chat_id": 1, "message_id": 1}, None),
+    ("telegram_chats", {"content_hash": "H"}, None),
+    ("telegram_friends", {}, [("person_id", 1), ("_id", 1)]),
+    ("telegram_friends", {"chat_id": 1}, None),
+]
+
+INFO_COLLECTION = "schema_info"
+
+# Unique indexes that wait for chat_compactor.py when duplicates are stored
+COMPACTED_INDEXES = {("telegram_chats", "chat_message_unique"), ("telegram_chats", "content_hash_unique")}
+PENDING_ID = "compaction_pending"
+
+
+def _pending(info_doc):
+    return set((info_doc or {}).get("indexes", []))
+
+
+def _awaits_compaction(collection_name, options, error):
+    return (collection_name, options["name"]) in COMPACTED_INDEXES and "duplicate key" in str(error).lower()
+
+
+def _mark_pending(names):
+    return {"$addToSet": {"indexes": {"$each": names}}, "$set": {"since": datetime.now()}}
+
+
+def compaction_pending(db):
+    """Unique indexes waiting for chat_compactor.py (pymongo db)"""
+    return sorted(_pending(db[INFO_COLLECTION].find_one({"_id": PENDING_ID})))
+
+
+def clear_compaction_pending(db):
+    """Called by chat_compactor.finish() once the duplicates are gone"""
+    db[INFO_COLLECTION].delete_one({"_id": PENDING_ID})
+
+
+def _is_current(info_doc, force):
+    return not force and info_doc and info_doc.get("version", 0) >= SCHEMA_VERSION
+
+
+def _mark_current():
+    return {"$set": {"version": SCHEMA_VERSION, "applied_at": datetime.now()}}
+
+
+def _call(collection_name, method, *args, **kwargs):
+    return collection_name, method, args, kwargs
+
+
+def _bootstrap(force):
+    """The whole bootstrap as a sequence of collection calls: yields _call()s, is
+    sent each result (or thrown its error) and returns the names ensured.
+    ensure_indexes / ensure_indexes_async only carry out the calls."""
+    if _is_current((yield _call(INFO_COLLECTION, "find_one", {"_id": "indexes"})), force):
+        return []
+
+    pending = _pending((yield _call(INFO_COLLECTION, "find_one", {"_id": PENDING_ID})))
+    created = []
+    newly_pending = []
+    complete = True
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            if (collection_name, options["name"]) in COMPACTED_INDEXES and options["name"] in pending:
+                continue  # non-unique until chat_compactor.py has removed the duplicates
+            try:
+                created.append((yield _call(collection_name, "create_index", keys, **options)))
+            except Exception as e:
+                fallback = _fallback(collection_name, keys, options, e)
+                if _awaits_compaction(collection_name, options, e):
+                    newly_pending.append(options["name"])
+                else:
+                    complete = False
+                if fallback:
+                    created.append((yield _call(collection_name, "create_index", keys, **fallback)))
+    if newly_pending:
+        yield _call(INFO_COLLECTION, "update_one", {"_id": PENDING_ID}, _mark_pending(newly_pending), upsert=True)
+        print(f"[SCHEMA]    {', '.join(newly_pending)}: pending compaction - run chat_compactor.py")
+    for collection_name, names in DROPPED_INDEXES.items():
+        for name in names:
+            try:
+                yield _call(collection_name, "drop_index", name)
+            except Exception:
+                pass  # already gone
+
+    # Only record the version when every index is exactly as declared (retry next start)
+    if complete:
+        yield _call(INFO_COLLECTION, "update_one", {"_id": "indexes"}, _mark_current(), upsert=True)
+    print(f"[SCHEMA] {'✅' if complete else '⚠️ '} Indexes at version {SCHEMA_VERSION} ({len(created)} ensured)")
+    return created
+
+
+def ensure_indexes(db, force=False):
+    """Create every index in INDEXES on a pymongo database; returns the names ensured"""
+    steps = _bootstrap(force)
+    resume, value = steps.send, None
+    while True:
+        try:
+            collection_name, method, args, kwargs = resume(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            value, resume = getattr(db[collection_name], method)(*args, **kwargs), steps.send
+        except Exception as e:
+            value, resume = e, steps.throw
+
+
+async def ensure_indexes_async(db, force=False):
+    """Same as ensure_indexes for a motor database"""
+    steps = _bootstrap(force)
+    resume, value = steps.send, None
+    while True:
+        try:
+            collection_name, method, args, kwargs = resume(value)
+        except StopIteration as done:
+            return done.value
+        try:
+            value, resume = await getattr(db[collection_name], method)(*args, **kwargs), steps.send
+        except Exception as e:
+            value, resume = e, steps.throw
+
+
+def _fallback(collection_name, keys, options, error):
+    """A unique index that fails on existing duplicates is created non-unique instead"""
+    print(f"[SCHEMA] ⚠️  {collection_name}.{options['name']}: {error}")
+    if options.get("unique") and "duplicate key" in str(error).lower():
+        print(f"[SCHEMA]    Existing duplicate {keys[0][0]} values - creating a non-unique index for now")
+        return {"name": options["name"].replace("_unique", ""), "unique": False}
+    return None
+
+
+def _plan_stages(plan):
+    """Yield every stage name of an explain() plan tree"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        yield from _plan_stages(plan.get(key))
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def check_query_plans(db, shapes=QUERY_SHAPES):
+    """Explain each query shape (pymongo db) and print the ones doing a collection scan"""
+    scans = []
+    for collection_name, query, sort in shapes:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explain = cursor.explain()
+        except Exception as e:
+            print(f"[SCHEMA] Could not explain {collection_name} {query}: {e}")
+            continue
+
+        stages = list(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {})))
+        label = f"{collection_name} {query}" + (f" sort {sort}" if sort else "")
+        if "COLLSCAN" in stages:
+            scans.append(label)
+            print(f"  ❌ COLLSCAN  {label}")
+        elif "SORT" in stages:
+            print(f"  ⚠️  in-memory SORT  {label}")
+        else:
+            print(f"  ✅ {' <- '.join(stages)}  {label}")
+    return scans
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    uri = os.getenv("DB_URI") or os.getenv("MONGODB_URI")
+    db = MongoClient(uri)[os.getenv("MONGODB_DB", "Raihan")]
+
+    if "--check" in sys.argv:
+        print("Query plans:")
+        scans = check_query_plans(db)
+        print(f"\n{len(scans)} collection scan(s)")
+        sys.exit(1 if scans else 0)
+
+    ensure_indexes(db, force="--force" in sys.argv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# evaluation_checkpoint.py
+# Incremental English evaluation: score only what is new since the last run
+#
+# The evaluator runs every EVALUATION_INTERVAL seconds and used to re-read and
+# re-score every salesperson message of the test each time, so a test's cost
+# grew quadratically. Each evaluation_scores document now carries a
+# checkpoint:
+#
+#   checkpoint: {
+#       last_message_id, last_stored_at   newest message already scored
+#       last_timestamp                    newest message timestamp (test end time)
+#       score_sum, score_count            running total -> average score
+#       distribution                      excellent / good / medium / poor
+#       start_time                        first salesperson message
+#       prompt_version                    scores are only reused for the same prompt
+#   }
+#
+# A run fetches the messages stored after (last_stored_at, last_message_id),
+# scores them, folds them into the checkpoint and updates the document in
+# place. The update is conditional on the checkpoint it started from, so two
+# overlapping runs can never count the same messages twice.
+#
+# The checkpoint follows stored_at - set by the writer when the message
+# reaches chat_bot (storage.MessageStore, final_bot.py) - not the timestamp,
+# which message_log.py sets when the message is queued: a spilled message
+# replayed by recover(), or a batch whose write kept failing, lands after
+# newer ones and would fall behind a timestamp checkpoint. Messages written
+# before stored_at existed are ordered by their timestamp. Messages stored
+# less than EVAL_SETTLE_SECONDS ago are left for the next run, for writers on
+# machines whose clocks disagree slightly.
+
+import os
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+EVAL_SETTLE_SECONDS = float(os.getenv("EVAL_SETTLE_SECONDS", "5"))
+
+BANDS = ("excellent", "good", "medium", "poor")
+
+
+def score_band(score):
+    if score >= 70:
+        return "excellent"
+    elif score >= 50:
+        return "good"
+    elif score >= 30:
+        return "medium"
+    return "poor"
+
+
+def usable_checkpoint(record, prompt_version):
+    """The stored checkpoint if it can be continued, else None (score from scratch)"""
+    checkpoint = (record or {}).get("checkpoint")
+    if not checkpoint or checkpoint.get("prompt_version") != prompt_version:
+        return None
+    return checkpoint
+
+
+def stored_at(doc):
+    """When a message reached chat_bot (its timestamp if written before stored_at existed)"""
+    return doc.get("stored_at") or doc.get("timestamp")
+
+
+def _after(last, last_id):
+    """Messages stored after (last, last_id) - legacy ones compared by timestamp"""
+    return [
+        {"stored_at": {"$gt": last}},
+        {"stored_at": last, "_id": {"$gt": last_id}},
+        {"stored_at": {"$exists": False}, "timestamp": {"$gt": last}},
+        {"stored_at": {"$exists": False}, "timestamp": last, "_id": {"$gt": last_id}}
+    ]
+
+
+def fetch_new_messages(collection, test_id, checkpoint=None, settle_seconds=EVAL_SETTLE_SECONDS):
+    """Salesperson messages stored after the checkpoint, in storage order.
+
+    Returns (messages with text, newest document seen) - the newest document
+    may have empty text, but the checkpoint still moves past it.
+    """
+    settled = datetime.now() - timedelta(seconds=settle_seconds)
+    conditions = [{"$or": [
+        {"stored_at": {"$lt": settled}},
+        {"stored_at": {"$exists": False}, "timestamp": {"$lt": settled}}
+    ]}]
+    if checkpoint:
+        # Checkpoints saved before stored_at existed only have last_timestamp
+        last = checkpoint.get("last_stored_at") or checkpoint["last_timestamp"]
+        conditions.append({"$or": _after(last, checkpoint["last_message_id"])})
+    query = {"conversation_id": test_id, "role": "salesperson", "$and": conditions}
+
+    docs = list(collection.find(query, {"text": 1, "timestamp": 1, "stored_at": 1}))
+    docs.sort(key=lambda doc: (stored_at(doc), doc["_id"]))
+    messages = [
+        {"_id": doc["_id"], "text": doc["text"], "timestamp": doc.get("timestamp"), "stored_at": stored_at(doc)}
+        for doc in docs
+        if doc.get("text", "").strip()
+    ]
+    return messages, (docs[-1] if docs else None)
+
+
+def scored_prefix(messages, scores, newest):
+    """Cut the batch before the first message that could not be scored (None),
+    so the checkpoint stops there and the next run retries it"""
+    if None not in scores:
+        return messages, scores, newest
+    cut = scores.index(None)
+    print(f"[EVAL] ⚠️  {len(scores) - cut} message(s) could not be scored - retrying them next run")
+    newest = messages[cut - 1] if cut else None
+    return messages[:cut], scores[:cut], newest
+
+
+def advance(checkpoint, messages, scores, newest, prompt_version):
+    """New checkpoint = old one (or an empty one) + the freshly scored messages"""
+    checkpoint = dict(checkpoint or {
+        "score_sum": 0,
+        "score_count": 0,
+        "distribution": {band: 0 for band in BANDS}
+    })
+    distribution = dict(checkpoint["distribution"])
+    for score in scores:
+        distribution[score_band(score)] += 1
+
+    # Storage order is not timestamp order (replayed messages), so keep the extremes
+    scored = [m["timestamp"] for m in messages if m.get("timestamp")]
+    starts = scored + [checkpoint["start_time"]] if checkpoint.get("start_time") else scored
+    ends = scored + [t for t in (checkpoint.get("last_timestamp"), newest.get("timestamp")) if t]
+
+    checkpoint.update({
+        "score_sum": checkpoint["score_sum"] + sum(scores),
+        "score_count": checkpoint["score_count"] + len(scores),
+        "distribution": distribution,
+        "start_time": min(starts, default=None),
+        "last_message_id": newest["_id"],
+        "last_stored_at": stored_at(newest),
+        "last_timestamp": max(ends, default=None),
+        "prompt_version": prompt_version,
+        "updated_at": datetime.now()
+    })
+    return checkpoint
+
+
+def save(scores_collection, test_id, record, fields, new_scores, resumed):
+    """Write the result in place - only if the stored checkpoint is still the one
+    this run started from. Returns False when another run got there first."""
+    stored = (record or {}).get("checkpoint")
+    query = {"test_id": test_id}
+    if stored:
+        query["checkpoint.last_message_id"] = stored["last_message_id"]
+    else:
+        query["checkpoint"] = {"$exists": False}
+
+    if resumed:
+        update = {"$set": fields, "$push": {"individual_scores": {"$each": new_scores}}}
+    else:
+        update = {"$set": dict(fields, individual_scores=new_scores)}
+
+    try:
+        result = scores_collection.update_one(query, update, upsert=record is None)
+    except DuplicateKeyError:
+        return False
+    return bool(result.matched_count or result.upserted_id)
@@ -0,0 +1,299 @@
+# evaluation_engine.py
+# Concurrent, cached scoring of salesperson messages
+#
+# The evaluators (english_level.py, test_english_level.py) used to score
+# messages one blocking OpenAI call at a time and re-score every message of
+# the test on every run. EvaluationEngine scores a list of texts concurrently
+# through an AsyncOpenAI client (at most EVAL_MAX_PARALLEL calls in flight),
+# retries rate limits / timeouts / 5xx with exponential backoff (honouring
+# Retry-After), and caches each score under a hash of
+# (prompt version, model, message text):
+#
+#   - in memory, for the life of the process
+#   - in the evaluation_cache collection, when one is given, so the next run
+#     only pays for messages it has not seen
+#
+# A message that still fails after EVAL_MAX_RETRIES gets FALLBACK_SCORE for
+# this run (as before; pass fallback=None to get None instead) but is not
+# cached, so the next run tries it again.
+#
+# Batch mode (EVAL_BATCH_SIZE > 1) sends up to that many numbered messages in
+# one request and parses a JSON array of scores, so the long rubric is paid
+# once per batch instead of once per message. A reply that is not an array of
+# the right length falls back to scoring that batch one message at a time.
+# benchmarks/bench_batch_scoring.py compares cost and agreement of both modes.
+#
+#   engine = EvaluationEngine("english_level", SYSTEM_PROMPT, USER_TEMPLATE,
+#                             cache_collection=db["evaluation_cache"])
+#   scores = engine.score_sync(texts)        # from sync code
+#   scores = await engine.score(texts)       # from async code
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import random
+import re
+from datetime import datetime
+
+import openai
+from openai import AsyncOpenAI
+
+from llm_client import OPENAI_BASE_URL, record_usage
+from prompts import register_prompt
+
+EVAL_MODEL = os.getenv("EVAL_MODEL", "gpt-3.5-turbo")
+EVAL_MAX_PARALLEL = int(os.getenv("EVAL_MAX_PARALLEL", "8"))
+EVAL_MAX_RETRIES = int(os.getenv("EVAL_MAX_RETRIES", "4"))
+EVAL_RETRY_BASE = float(os.getenv("EVAL_RETRY_BASE", "1.0"))
+EVAL_RETRY_MAX = float(os.getenv("EVAL_RETRY_MAX", "30"))
+EVAL_TIMEOUT = float(os.getenv("EVAL_TIMEOUT", "30"))
+EVAL_BATCH_SIZE = int(os.getenv("EVAL_BATCH_SIZE", "1"))  # 1 = one request per message
+
+FALLBACK_SCORE = 50
+
+BATCH_TEMPLATE = (
+    "Evaluate each of these {count} salesperson messages on its own, using the rubric above.\n\n"
+    "{numbered}\n\n"
+    "Respond with ONLY a JSON array of {count} scores (0-100), one per message, in the same order. "
+    "Example for 3 messages: [72, 58, 85]"
+)
+
+# Completion tokens allowed per message in a batch reply ("100, " is ~2 tokens)
+BATCH_TOKENS_PER_MESSAGE = 4
+
+# Counters of the score() call running in the current task (see _count)
+_call_stats = contextvars.ContextVar("eval_call_stats", default=None)
+
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def parse_score(result):
+    """First integer in the reply, clamped to 0-100 (None if there is none)"""
+    score_match = re.search(r'\d+', result or "")
+    if not score_match:
+        return None
+    return max(0, min(100, int(score_match.group())))
+
+
+def parse_scores(result, count):
+    """JSON array of `count` numbers in the reply, clamped to 0-100 (None if there is none)"""
+    array_match = re.search(r'\[[^\[\]]*\]', result or "")
+    if not array_match:
+        return None
+    try:
+        values = json.loads(array_match.group())
+    except ValueError:
+        return None
+    if len(values) != count or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    return [max(0, min(100, round(v))) for v in values]
+
+
+def number_messages(texts):
+    """'1. "..."' lines for BATCH_TEMPLATE (JSON-quoted, so quotes/newlines stay inside)"""
+    return "\n".join(f"{i}. {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts, 1))
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait (Retry-After header), if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class EvaluationEngine:
+    """Scores texts 0-100 with one system prompt, concurrently and cached"""
+
+    def __init__(self, name, system_prompt, user_template, model=EVAL_MODEL, api_key=None,
+                 cache_collection=None, max_parallel=EVAL_MAX_PARALLEL, max_retries=EVAL_MAX_RETRIES,
+                 max_tokens=10, batch_size=EVAL_BATCH_SIZE, batch_template=BATCH_TEMPLATE):
+        self.prompt = register_prompt(name, system_prompt)
+        self.user_template = user_template
+        self.model = model
+        self.api_key = api_key or os.getenv("aluraagency_OPEPNAI_API_KEY")
+        self.cache_collection = cache_collection
+        self.max_parallel = max_parallel
+        self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        self.batch_size = max(1, batch_size)
+        self.batch_template = batch_template
+        self._memory = {}
+        self._client = None
+        self._semaphore = None
+        self.stats = {"scored": 0, "cache_hits": 0, "api_calls": 0, "retries": 0, "failures": 0,
+                      "batches": 0, "batch_fallbacks": 0}
+        self.last_run = dict(self.stats)  # the same counters for the latest score() call
+
+    def cache_key(self, text):
+        raw = f"{self.prompt.version}\x00{self.model}\x00{text}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _get_client(self):
+        if self._client is None:
+            # Retries are handled here (with Retry-After), not inside the SDK
+            self._client = AsyncOpenAI(api_key=self.api_key, base_url=OPENAI_BASE_URL,
+                                       timeout=EVAL_TIMEOUT, max_retries=0)
+        return self._client
+
+    def _get_semaphore(self):
+        # One limit for every score() call on this engine's event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+        return self._semaphore
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        self._semaphore = None
+
+    def _count(self, name, n=1):
+        self.stats[name] += n
+        call = _call_stats.get()
+        if call is not None:
+            call[name] += n
+
+    # ---- cache ------------------------------------------------------------
+
+    def _cached(self, keys):
+        found = {k: self._memory[k] for k in keys if k in self._memory}
+        missing = [k for k in keys if k not in found]
+        if missing and self.cache_collection is not None:
+            try:
+                for doc in self.cache_collection.find({"_id": {"$in": missing}}, {"score": 1}):
+                    found[doc["_id"]] = self._memory[doc["_id"]] = doc["score"]
+            except Exception as e:
+                print(f"[EVAL] ⚠️  Score cache unavailable: {e}")
+        return found
+
+    def _store(self, scored):
+        self._memory.update(scored)
+        if not scored or self.cache_collection is None:
+            return
+        now = datetime.now()
+        docs = [
+            {"_id": key, "score": score, "prompt_version": self.prompt.version, "model": self.model, "created_at": now}
+            for key, score in scored.items()
+        ]
+        try:
+            self.cache_collection.insert_many(docs, ordered=False)
+        except Exception as e:
+            # Another run may have cached some of them first - that's fine
+            if "duplicate key" not in str(e).lower() and "E11000" not in str(e):
+                print(f"[EVAL] ⚠️  Could not store scores in cache: {e}")
+
+    # ---- scoring ----------------------------------------------------------
+
+    async def _complete(self, content, max_tokens, semaphore):
+        """Reply text for one user message under the rubric; None if every attempt failed"""
+        messages = [self.prompt.message, {"role": "user", "content": content}]
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with semaphore:
+                    self._count("api_calls")
+                    response = await self._get_client().chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        temperature=0.0
+                    )
+                record_usage(response, self.model)
+                return (response.choices[0].message.content or "").strip()
+            except RETRYABLE as e:
+                if attempt == self.max_retries:
+                    print(f"[ERROR] Failed to evaluate message after {attempt + 1} attempts: {e}")
+                    return None
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(EVAL_RETRY_BASE * 2 ** attempt, EVAL_RETRY_MAX) * random.uniform(0.5, 1.0)
+                self._count("retries")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                print(f"[ERROR] Failed to evaluate message: {str(e)}")
+                return None
+
+    async def _evaluate(self, text, semaphore):
+        """Score one text; None if it could not be scored"""
+        result = await self._complete(self.user_template.format(text=text), self.max_tokens, semaphore)
+        if result is None:
+            return None
+        score = parse_score(result)
+        if score is None:
+            print(f"[WARNING] Could not parse score from: {result}")
+        return score
+
+    async def _evaluate_batch(self, texts, semaphore):
+        """Scores for several texts from one request (None where one could not be scored).
+        An unparsable reply is retried one message per request."""
+        if len(texts) == 1:
+            return [await self._evaluate(texts[0], semaphore)]
+        self._count("batches")
+        content = self.batch_template.format(count=len(texts), numbered=number_messages(texts))
+        max_tokens = self.max_tokens + BATCH_TOKENS_PER_MESSAGE * len(texts)
+        result = await self._complete(content, max_tokens, semaphore)
+        if result is None:
+            return [None] * len(texts)
+        scores = parse_scores(result, len(texts))
+        if scores is None:
+            self._count("batch_fallbacks")
+            print(f"[WARNING] Could not parse {len(texts)} scores from: {result[:80]!r} - scoring one by one")
+            return await asyncio.gather(*(self._evaluate(text, semaphore) for text in texts))
+        return scores
+
+    async def score(self, texts, fallback=FALLBACK_SCORE, run_stats=None):
+        """Scores for `texts`, in order (`fallback` where evaluation failed).
+
+        The counters of this call go to `run_stats` (a dict) when given - unlike
+        last_run, that stays right when several score() calls run at once.
+        """
+        call = dict.fromkeys(self.stats, 0)
+        token = _call_stats.set(call)
+        try:
+            return await self._score(texts, fallback)
+        finally:
+            _call_stats.reset(token)
+            self.last_run = call
+            if run_stats is not None:
+                run_stats.update(call)
+
+    async def _score(self, texts, fallback):
+        keys = [self.cache_key(text) for text in texts]
+        # pymongo is blocking - keep the other evaluations on this loop running
+        known = await asyncio.to_thread(self._cached, set(keys))
+        self._count("cache_hits", sum(1 for k in keys if k in known))
+
+        # Each distinct uncached text is evaluated once
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in known:
+                pending.setdefault(key, text)
+
+        if pending:
+            semaphore = self._get_semaphore()
+            todo = list(pending.values())
+            batches = [todo[i:i + self.batch_size] for i in range(0, len(todo), self.batch_size)]
+            results = await asyncio.gather(*(self._evaluate_batch(batch, semaphore) for batch in batches))
+            results = [score for batch in results for score in batch]
+            scored = {key: score for key, score in zip(pending, results) if score is not None}
+            self._count("failures", len(pending) - len(scored))
+            await asyncio.to_thread(self._store, scored)
+            known.update(scored)
+
+        self._count("scored", len(texts))
+        return [known.get(key, fallback) for key in keys]
+
+    def score_sync(self, texts, fallback=FALLBACK_SCORE):
+        """score() for sync callers (runs its own event loop)"""
+        async def run():
+            try:
+                return await self.score(texts, fallback)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run())
@@ -0,0 +1,219 @@
+# evaluation_worker.py
+# Long-lived English evaluation worker
+#
+# test_main.py used to start a new Python interpreter for test_english_level.py
+# every EVALUATION_INTERVAL seconds - each run re-imported openai/pymongo,
+# reconnected to MongoDB and built a new OpenAI client before scoring anything,
+# and only ever looked at the latest test. EvaluationWorker stays up instead:
+#
+#   - one event loop, one MongoClient and one OpenAI client for its lifetime
+#   - timer: every EVALUATION_INTERVAL seconds it evaluates every active test
+#   - trigger: with EVAL_TRIGGER=watch (default) it also follows chat_bot
+#     inserts (change stream) and evaluates a test EVAL_SETTLE_SECONDS after a
+#     new salesperson message - while the stream is unavailable (standalone
+#     MongoDB has none, a replica set may fail over) the timer carries on alone
+#     and the stream is re-opened with backoff, up to EVAL_WATCH_RETRY_MAX
+#   - up to EVAL_MAX_TESTS tests are evaluated at once (they share the
+#     engine's EVAL_MAX_PARALLEL request limit)
+#
+# Each evaluation is incremental (evaluation_checkpoint.py), so extra
+# triggers are cheap. Importable API:
+#
+#   worker = EvaluationWorker()
+#   worker.start_in_thread()            # from sync code (test_main.py)
+#   await worker.run()                  # from async code
+#   await worker.evaluate(["TEST_1"])   # evaluate now
+#   worker.notify("TEST_1")             # queue a test (any thread)
+#   worker.stop()
+#
+# Usage:
+#   python evaluation_worker.py          # run the worker
+#   python evaluation_worker.py --once   # evaluate the active tests once
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from active_test import ACTIVE_QUERY, ACTIVE_SORT
+from evaluation_checkpoint import EVAL_SETTLE_SECONDS
+
+EVALUATION_INTERVAL = float(os.getenv("EVALUATION_INTERVAL", "60"))
+EVAL_TRIGGER = os.getenv("EVAL_TRIGGER", "watch").lower()  # watch | timer
+EVAL_MAX_TESTS = int(os.getenv("EVAL_MAX_TESTS", "4"))
+EVAL_WATCH_RETRY_MAX = float(os.getenv("EVAL_WATCH_RETRY_MAX", "300"))
+
+MESSAGE_PIPELINE = [{"$match": {"operationType": "insert", "fullDocument.role": "salesperson"}}]
+
+
+class EvaluationWorker:
+    """Evaluates active tests on a timer and when new salesperson messages arrive"""
+
+    def __init__(self, interval=EVALUATION_INTERVAL, trigger=EVAL_TRIGGER, max_tests=EVAL_MAX_TESTS):
+        # Imported here so importing the worker is cheap and the evaluator
+        # (MongoDB + OpenAI setup) is only built once, by the worker
+        import test_english_level
+
+        self.english = test_english_level
+        self.engine = test_english_level.evaluator
+        self.interval = interval
+        self.trigger = trigger
+        self.max_tests = max_tests
+        self._pending = {}  # test_id -> monotonic time of the first new message
+        self._loop = None
+        self._wake = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"runs": 0, "evaluated": 0, "failed": 0, "api_calls": 0, "cache_hits": 0, "triggered": 0}
+
+    def active_test_ids(self):
+        docs = self.english.test_collection.find(ACTIVE_QUERY, {"test_id": 1}).sort(ACTIVE_SORT)
+        return [doc["test_id"] for doc in docs if doc.get("test_id")]
+
+    async def evaluate(self, test_ids):
+        """Evaluate several tests at once; {test_id: result or None}"""
+        test_ids = list(dict.fromkeys(test_ids))
+        if not test_ids:
+            return {}
+        limit = asyncio.Semaphore(self.max_tests)
+        engine = self.engine
+        before = dict(engine.stats)
+
+        async def one(test_id):
+            async with limit:
+                try:
+                    return await self.english.analyze_salesperson_async(test_id)
+                except Exception as e:
+                    self.stats["failed"] += 1
+                    print(f"[EVAL] ❌ {test_id}: {e}")
+                    return None
+
+        started = time.perf_counter()
+        results = dict(zip(test_ids, await asyncio.gather(*(one(t) for t in test_ids))))
+        api_calls = engine.stats["api_calls"] - before["api_calls"]
+        cache_hits = engine.stats["cache_hits"] - before["cache_hits"]
+        self.stats["runs"] += 1
+        self.stats["evaluated"] += len(test_ids)
+        self.stats["api_calls"] += api_calls
+        self.stats["cache_hits"] += cache_hits
+        print(f"[EVAL] {datetime.now():%H:%M:%S} evaluated {len(test_ids)} test(s) in "
+              f"{time.perf_counter() - started:.1f}s ({api_calls} API calls, {cache_hits} from cache)")
+        return results
+
+    # ---- triggers ---------------------------------------------------------
+
+    def notify(self, test_id):
+        """Queue `test_id` for evaluation once its new messages have settled (thread-safe)"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._mark, test_id)
+
+    def _mark(self, test_id):
+        self.stats["triggered"] += 1
+        self._pending.setdefault(test_id, time.monotonic())
+        self._wake.set()
+
+    def _watch_messages(self):
+        """Change stream on chat_bot (daemon thread) -> notify(); re-opened with backoff"""
+        delay = 1.0
+        failing = False
+        while not self._stop.is_set():
+            try:
+                with self.english.conversation_collection.watch(MESSAGE_PIPELINE) as stream:
+                    print("📡 Evaluation trigger: change stream on chat_bot")
+                    delay, failing = 1.0, False
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is None:
+                            self._stop.wait(0.5)
+                            continue
+                        test_id = change["fullDocument"].get("conversation_id")
+                        if test_id:
+                            self.notify(test_id)
+            except Exception as e:
+                if not failing:
+                    print(f"📡 Evaluation trigger: timer only, every {self.interval:.0f}s, until the change "
+                          f"stream is back ({type(e).__name__}: {e})")
+                failing = True
+            self._stop.wait(delay)
+            delay = min(delay * 2, EVAL_WATCH_RETRY_MAX)
+
+    def _due(self):
+        """Queued tests whose newest message is past the settle window"""
+        now = time.monotonic()
+        due = [t for t, seen in self._pending.items() if now - seen >= EVAL_SETTLE_SECONDS]
+        for test_id in due:
+            del self._pending[test_id]
+        return due
+
+    # ---- main loop --------------------------------------------------------
+
+    async def run(self):
+        """Evaluate now, then on every timer tick / trigger until stop()"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self.trigger == "watch":
+            threading.Thread(target=self._watch_messages, daemon=True).start()
+
+        next_tick = 0.0
+        try:
+            while not self._stop.is_set():
+                due = self._due()
+                if time.monotonic() >= next_tick:
+                    next_tick = time.monotonic() + self.interval
+                    try:
+                        due += await asyncio.to_thread(self.active_test_ids)
+                    except Exception as e:
+                        print(f"[EVAL] ❌ Could not list active tests: {e}")
+                if due:
+                    await self.evaluate(due)
+
+                self._wake.clear()
+                timeout = min(1.0, max(0.0, next_tick - time.monotonic()))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.engine.aclose()
+
+    def start_in_thread(self):
+        """Run the worker on its own event loop in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def main():
+    worker = EvaluationWorker()
+    if "--once" in sys.argv:
+        async def once():
+            try:
+                await worker.evaluate(worker.active_test_ids())
+            finally:
+                await worker.engine.aclose()
+
+        asyncio.run(once())
+        return
+
+    print(f"[EVAL] Worker started: every {worker.interval:.0f}s, trigger={worker.trigger}, "
+          f"up to {worker.max_tests} tests at once")
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        print(f"\n[EVAL] Stopped - {worker.stats}")
+
+
+if __name__ == "__main__":
+    main()
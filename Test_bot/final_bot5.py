@@ -1,17 +1,23 @@
 import os
-from openai import OpenAI
+from llm_client import chat_completion, completion_text
+from storage import get_store
+from active_test import get_active_test_cache
+from message_log import get_message_log
+from conversation_store import ConversationStore, stable_choice
+from context_window import build_context, schedule_summary
+from prompts import register_prompt, system_messages
+from batch_replies import generate_in_order
+from streaming import STREAM_REPLIES, PhraseGuard, StreamingReply
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, filters
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import random
 import sys
 import asyncio
 from collections import defaultdict
 import pytz
 
-if sys.platform == 'win32':
+if sys.platform == 'win32' and (sys.stdout.encoding or '').lower() != 'utf-8':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
@@ -23,21 +29,17 @@ OPENAI_API_KEY = os.getenv("aluraagency_OPEPNAI_API_KEY")
 BOT_NAME = os.getenv("CUSTOMER_5_BOT_USERNAME", "🤖 Bot_5- Peter")
 ROOM_ID = 5  # Fixed room ID for this bot
 
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-# MongoDB connection
-MongoDB_Url = os.getenv("MONGODB_URI")
-mongo_client = MongoClient(MongoDB_Url)
-db = mongo_client['Raihan']
-test_collection = db['active_test_ids']
-chat_collection = db['chat_bot']
+# MongoDB connection (async, shared - see storage.py)
+store = get_store()
+active_tests = get_active_test_cache()  # cached + watched, see active_test.py
+message_log = get_message_log()  # buffered chat_bot writes, see message_log.py
 
 # Bangladesh timezone
 #BD_TZ = pytz.timezone('Asia/Dhaka')
 
 VA_bot = "@raihantapader"
 
-conversation_histories = {}
+conversation_histories = ConversationStore()  # bounded LRU/TTL, see conversation_store.py
 
 # Message queue for batch processing
 message_queue = defaultdict(list)  # {chat_id: [messages]}
@@ -230,62 +232,55 @@ YOU ARE PETER - THE EFFICIENT, NO-NONSENSE NEW SUBSCRIBER WHO WANTS CLEAR INFO!
 Strictly maintain: You give reply individually all messages based on the creator's messages and the context of the conversation.
 """
 
-def get_latest_test_id():
-    """Get the most recent active test_id from database"""
+PERSONA_PROMPT = register_prompt("final_bot5", SYSTEM_PROMPT)
+
+async def get_latest_test_id(refresh=False):
+    """Get the most recent active test_id (served from the in-process cache)"""
     try:
-        latest_test = test_collection.find_one(
-            {"status": "active"},
-            sort=[("created_at", -1)]
-        )
-        
-        if latest_test:
-            test_id = latest_test['test_id']
-            print(f"✅ Retrieved latest Test ID from database: {test_id}")
-            return test_id
-        else:
-            print("⚠️  No active test_id found in database. Using default.")
-            return "default"
+        return await active_tests.get(refresh=refresh)
     except Exception as e:
         print(f"❌ Error retrieving test_id: {e}")
         return "default"
 
 
-def insert_message(conversation_id: str, role: str, text: str, chat_id: int, bot_name: str):
-    """Insert message into database"""
-    #bd_time = datetime.now(BD_TZ)
-    
-    message = {
-        "conversation_id": conversation_id,
-        "room_id": ROOM_ID,
-        "bot": bot_name,
-        "role": role,
-        "text": text,
-        "chat_id": chat_id,
-        "timestamp": datetime.now()
-    }
-    
-    result = chat_collection.insert_one(message)
-    print(f"[DB] Saved {role} message at {datetime.now().strftime('%H:%M:%S')} (ID: {result.inserted_id})")
-    return result.inserted_id
+async def insert_message(conversation_id: str, role: str, text: str, chat_id: int, bot_name: str):
+    """Queue message for the database (batched write-behind)"""
+    inserted_id = await message_log.add(
+        conversation_id=conversation_id,
+        role=role,
+        text=text,
+        chat_id=chat_id,
+        bot_name=bot_name,
+        room_id=ROOM_ID
+    )
+    print(f"[DB] Saved {role} message at {datetime.now().strftime('%H:%M:%S')} (ID: {inserted_id})")
+    return inserted_id
 
 
-def get_or_create_conversation_history(chat_id, test_id):
+async def get_or_create_conversation_history(chat_id, test_id):
     """Get or create conversation history for a specific chat"""
-    if chat_id not in conversation_histories:
-        selected_product = random.choice(PRODUCT_POOL)
+    conv_history = conversation_histories.get(chat_id)
+    if conv_history is None:
+        # Same product for the same chat and test, so a rehydrated chat keeps it
+        selected_product = stable_choice(PRODUCT_POOL, ROOM_ID, test_id, chat_id)
         
-        conversation_system_prompt = SYSTEM_PROMPT + f"\n\nYou are interested in buying: {selected_product}"
+        # Constant persona prompt first, product line last (prompt-cache friendly)
+        system = system_messages(PERSONA_PROMPT, selected_product)
         
-        conversation_histories[chat_id] = {
-            'messages': [{"role": "system", "content": conversation_system_prompt}],
+        # Restore recent turns if this chat was evicted from memory
+        previous_messages = await conversation_histories.rehydrate(store, chat_id, test_id, room_id=ROOM_ID)
+        
+        conv_history = conversation_histories.put(chat_id, {
+            'messages': system + previous_messages,
             'product': selected_product,
+            'prompt_version': PERSONA_PROMPT.version,
             'created_at': datetime.now().isoformat(),
             'test_id': test_id
-        }
+        })
         
         print(f"[INFO] New conversation: chat_id={chat_id}, test_id={test_id}, product={selected_product}")
     
-    return conversation_histories[chat_id]
+    return conv_history
 
 # def get_or_create_conversation_history(chat_id, test_id):
 #     """Get or create conversation history for a specific chat"""
@@ -315,7 +310,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.message.chat.id
     
     # Get latest test_id from database
-    test_id = get_latest_test_id()
+    test_id = await get_latest_test_id(refresh=True)
     
     print(f"\n{'='*70}")
     print(f"🤖 {BOT_NAME} STARTED")
@@ -325,7 +320,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"{'='*70}\n")
 
     # Get or create conversation history
-    conv_history = get_or_create_conversation_history(chat_id, test_id)
+    conv_history = await get_or_create_conversation_history(chat_id, test_id)
     product = conv_history['product']
     
     # Generate initial customer greeting
@@ -339,7 +334,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         Now generate a similar brief, professional question (maximum 20 words)."""
         
-        response = client.chat.completions.create(
+        response = await chat_completion(
             model="gpt-3.5-turbo",
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
@@ -367,9 +362,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "role": "assistant",
         "content": initial_message
     })
+    conversation_histories.trim(conv_history)
     
     # Save to database
-    insert_message(
+    await insert_message(
         conversation_id=test_id,
         role="customer",
         text=initial_message,
@@ -379,71 +375,84 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def process_batch_responses(chat_id, context: ContextTypes.DEFAULT_TYPE):
-    """Wait 15 seconds, then process ALL queued messages and send replies together"""
+    """Wait RESPONSE_DELAY seconds, then answer ALL queued messages concurrently, in order"""
     
     print(f"\n[TIMER] Waiting {RESPONSE_DELAY} seconds before processing batch...")
     await asyncio.sleep(RESPONSE_DELAY)
     
+    # From here on the batch runs to the end; a new message starts a new timer
+    if processing_timers.get(chat_id) is asyncio.current_task():
+        del processing_timers[chat_id]
+    
     # Get all queued messages for this chat
-    queued_messages = message_queue[chat_id].copy()
-    message_queue[chat_id].clear()  # Clear the queue
+    queued_messages = message_queue.pop(chat_id, [])  # Take and clear the queue
     
     if not queued_messages:
         print(f"[BATCH] No messages to process for chat {chat_id}")
         return
     
-    print(f"\n[BATCH] Processing {len(queued_messages)} message(s) for chat {chat_id}")
+    total = len(queued_messages)
+    print(f"\n[BATCH] Processing {total} message(s) for chat {chat_id}")
     
-    # Generate responses for ALL messages
-    responses = []
-    for idx, queued_item in enumerate(queued_messages, 1):
-        salesperson_message = queued_item['message']
-        test_id = queued_item['test_id']
-        
-        print(f"[BATCH {idx}/{len(queued_messages)}] Processing: {salesperson_message}")
-        
-        # Generate customer response
-        response = await gpt_customer_response(salesperson_message, chat_id)
-        
-        print(f"[BATCH {idx}/{len(queued_messages)}] Generated: {response}")
+    conv_history = await get_or_create_conversation_history(chat_id, await get_latest_test_id())
+    
+    # Streaming mode: placeholders go out first, in queue order, then fill in as tokens arrive
+    streams = {}
+    if STREAM_REPLIES:
+        for queued_item in queued_messages:
+            stream = StreamingReply(context.bot, chat_id, reply_to_message_id=queued_item['message_id'])
+            await stream.start()
+            streams[queued_item['message_id']] = stream
+    
+    async def generate(queued_item):
+        print(f"[BATCH] Processing: {queued_item['message']}")
+        stream = streams.get(queued_item['message_id'])
+        # The replies run concurrently, so each sees the earlier lines of the burst but not their replies
+        earlier = [item['message'] for item in queued_messages[:queued_messages.index(queued_item)]]
+        try:
+            return await generate_customer_reply(
+                conv_history, queued_item['message'],
+                on_text=stream.update if stream else None,
+                earlier=earlier
+            ), True
+        except Exception as e:
+            print(f"[ERROR] {type(e).__name__}: {e}")
+            return f"Sorry, something went wrong. Error: {type(e).__name__}: {e}", False
+    
+    async def send(idx, queued_item, result):
+        response, ok = result
+        print(f"[BATCH {idx}/{total}] Generated: {response}")
         
-        responses.append({
-            'text': response,
-            'test_id': test_id
-        })
+        # Replies are recorded and sent in queue order, as soon as each one is ready
+        if ok:
+            record_exchange(conv_history, queued_item['message'], response)
         
         # Save customer response to database
-        insert_message(
-            conversation_id=test_id,
+        await insert_message(
+            conversation_id=queued_item['test_id'],
             role="customer",
             text=response,
             chat_id=chat_id,
             bot_name=BOT_NAME
         )
-    
-    # Send ALL responses at once (no delay between them)
-    print(f"\n[SENDING] Sending {len(responses)} response(s) now...")
-    for idx, response_data in enumerate(responses, 1):
+        
         try:
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=response_data['text'],
-                reply_to_message_id=queued_messages[idx-1]['message_id']  # Add reply_to_message_id for sequence
-            )
-            print(f"[SENT {idx}/{len(responses)}] Reply sent")
-            
-            # Small delay to maintain message order (0.5 seconds)
-            if idx < len(responses):
-                await asyncio.sleep(0.5)
-                
+            stream = streams.get(queued_item['message_id'])
+            if stream:
+                await stream.finish(response)
+            else:
+                await context.bot.send_message(
+                    chat_id=chat_id,
+                    text=response,
+                    reply_to_message_id=queued_item['message_id']  # Add reply_to_message_id for sequence
+                )
+            print(f"[SENT {idx}/{total}] Reply sent")
         except Exception as e:
             print(f"[ERROR] Failed to send message {idx}: {e}")
     
-    print(f"[BATCH] Complete! Sent {len(responses)} replies.\n")
+    await generate_in_order(queued_messages, generate, on_ready=send)
     
-    # Clear timer
-    if chat_id in processing_timers:
-        del processing_timers[chat_id]
+    print(f"[BATCH] Complete! Sent {total} replies.\n")
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -453,10 +462,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     username = update.message.from_user.username if update.message.from_user.username else "unknown"
     
     # Get the most recent test_id
-    test_id = get_latest_test_id()
+    test_id = await get_latest_test_id()
     
     # Retrieve or create conversation history
-    conv_history = get_or_create_conversation_history(chat_id, test_id)
+    conv_history = await get_or_create_conversation_history(chat_id, test_id)
     
     # Determine role
     if username == VA_bot.lstrip('@'):
@@ -468,7 +477,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"[CUSTOMER] {user_message}")
     
     # Save incoming salesperson message to database immediately
-    insert_message(
+    await insert_message(
         conversation_id=test_id,
         role=bot_role,
         text=user_message,
@@ -501,75 +510,97 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"[TIMER] Started 15-second countdown...")
 
 
-async def gpt_customer_response(salesperson_message, chat_id):
-    """Generate customer response using GPT"""
-    conv_history = get_or_create_conversation_history(chat_id, get_latest_test_id())
+async def generate_customer_reply(conv_history, salesperson_message, on_text=None, earlier=()):
+    """Generate one customer reply (the history is only read, see record_exchange)
+
+    With on_text the reply is streamed: `await on_text(text_so_far)` per token.
+    `earlier` are the salesperson messages queued before this one in the same
+    batch - not in the history yet, but the model needs them ("and the price?").
+    """
+    salesperson_turns = [{"role": "user", "content": message} for message in earlier]
+    salesperson_turns.append({"role": "user", "content": salesperson_message})
     
-    # Add salesperson message to conversation history
-    conv_history['messages'].append({
-        "role": "user",
-        "content": salesperson_message
-    })
+    # Phrases that mean the model is acting as salesperson
+    salesperson_phrases = [
+        "how can i help you",
+        "what are you looking for",
+        "let me show you",
+        "welcome to our store",
+        "can i assist you",
+        "what brings you in today",
+        "are you looking for anything specific",
+        "how may i help",
+        "what can i do for you"
+    ]
     
-    try:
-        response = client.chat.completions.create(
+    # A streamed first attempt never shows a salesperson phrase (see PhraseGuard)
+    guard = PhraseGuard(on_text, salesperson_phrases) if on_text else None
+    
+    customer_response = await completion_text(
+        on_text=guard,
+        model="ft:gpt-3.5-turbo-0125:personal:your-fine-tuned-model-name:Cvi4Yd6v",
+        messages=build_context(conv_history, extra=salesperson_turns),
+        temperature=0.85,
+        max_tokens=50,
+        top_p=0.92,
+        frequency_penalty=0.5,
+        presence_penalty=0.5,
+        stop=["Salesperson:", "Sales person:", "Agent:", "SALESPERSON:"]
+    )
+    
+    customer_response = customer_response.strip()
+    
+    # SAFETY CHECK: Detect if model is acting as salesperson
+    response_lower = customer_response.lower()
+    
+    if any(phrase in response_lower for phrase in salesperson_phrases):
+        print("[WARNING] Detected salesperson behavior, regenerating response...")
+
+        # One-off reinforcement for this retry only (not kept in the history)
+        reminder = {
+            "role": "system",
+            "content": f"CRITICAL REMINDER: YOU ARE THE CUSTOMER, NOT THE SALESPERSON. You came here to buy {conv_history['product']}. Express what YOU need or ask questions about the product YOU want to buy. Do NOT offer help or ask what the salesperson is looking for!"
+        }
+
+        # Regenerate response to ensure customer behavior
+        customer_response = await completion_text(
+            on_text=on_text,
             model="ft:gpt-3.5-turbo-0125:personal:your-fine-tuned-model-name:Cvi4Yd6v",
-            messages=conv_history['messages'],
+            messages=build_context(conv_history, extra=salesperson_turns + [reminder]),
             temperature=0.85,
-            max_tokens=50,
+            max_tokens=150,
             top_p=0.92,
             frequency_penalty=0.5,
             presence_penalty=0.5,
             stop=["Salesperson:", "Sales person:", "Agent:", "SALESPERSON:"]
         )
-        
-        customer_response = response.choices[0].message.content.strip()
-        
-        
-        # SAFETY CHECK: Detect if model is acting as salesperson
-        salesperson_phrases = [
-            "how can i help you",
-            "what are you looking for",
-            "let me show you",
-            "welcome to our store",
-            "can i assist you",
-            "what brings you in today",
-            "are you looking for anything specific",
-            "how may i help",
-            "what can i do for you"
-        ]
-        
-        response_lower = customer_response.lower()
-        
-        if any(phrase in response_lower for phrase in salesperson_phrases):
-            print("[WARNING] Detected salesperson behavior, regenerating response...")
-
-            # Add reinforcement to force the correct customer behavior
-            conv_history['messages'].append({
-                "role": "system",
-                "content": f"CRITICAL REMINDER: YOU ARE THE CUSTOMER, NOT THE SALESPERSON. You came here to buy {conv_history['product']}. Express what YOU need or ask questions about the product YOU want to buy. Do NOT offer help or ask what the salesperson is looking for!"
-            })
-
-            # Regenerate response to ensure customer behavior
-            response = client.chat.completions.create(
-                model="ft:gpt-3.5-turbo-0125:personal:your-fine-tuned-model-name:Cvi4Yd6v",
-                messages=conv_history['messages'],
-                temperature=0.85,
-                max_tokens=150,
-                top_p=0.92,
-                frequency_penalty=0.5,
-                presence_penalty=0.5,
-                stop=["Salesperson:", "Sales person:", "Agent:", "SALESPERSON:"]
-            )
-
-            customer_response = response.choices[0].message.content.strip()
 
-        
-        # Add customer response to history
-        conv_history['messages'].append({
-            "role": "assistant",
-            "content": customer_response
-        })
+        customer_response = customer_response.strip()
+    
+    return customer_response
+
+
+def record_exchange(conv_history, salesperson_message, customer_response):
+    """Add a salesperson message and its customer reply to the history"""
+    conv_history['messages'].append({
+        "role": "user",
+        "content": salesperson_message
+    })
+    conv_history['messages'].append({
+        "role": "assistant",
+        "content": customer_response
+    })
+    conversation_histories.trim(conv_history)
+    schedule_summary(conv_history, chat_completion)
+
+
+async def gpt_customer_response(salesperson_message, chat_id):
+    """Generate customer response using GPT"""
+    conv_history = await get_or_create_conversation_history(chat_id, await get_latest_test_id())
+    
+    try:
+        customer_response = await generate_customer_reply(conv_history, salesperson_message)
+        record_exchange(conv_history, salesperson_message, customer_response)
         
         return customer_response
         
@@ -579,6 +610,32 @@ async def gpt_customer_response(salesperson_message, chat_id):
         return error_msg
 
 
+async def post_init(application):
+    """Create indexes and start background watchers once the event loop is running"""
+    await store.ensure_indexes()
+    active_tests.start_watcher()
+    await message_log.recover()
+
+
+async def post_shutdown(application):
+    """Write out any buffered messages before exiting"""
+    await message_log.close()
+
+
+def build_application(token=None, request=None, base_url=None):
+    """Build this bot's Application (also used by bot_runtime.py)"""
+    builder = ApplicationBuilder().token(token or TELEGRAM_BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    if request is not None:
+        builder = builder.request(request)
+    if base_url:
+        builder = builder.base_url(base_url)
+
+    application = builder.build()
+    application.add_handler(CommandHandler('start', start))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    return application
+
+
 def main():
     if not TELEGRAM_BOT_TOKEN:
         print("[ERROR] TELEGRAM_BOT_TOKEN not found!")
@@ -588,10 +645,7 @@ def main():
         print("[ERROR] OPENAI_API_KEY not found!")
         return
     
-    _bot_application = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
-    
-    _bot_application.add_handler(CommandHandler('start', start))
-    _bot_application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
+    _bot_application = build_application()
     
     print("="*70)
     print(f"{BOT_NAME} IS RUNNING".center(70))
@@ -0,0 +1,121 @@
+# llm_client.py
+# Shared async OpenAI client for all customer bots
+#
+# The bots run inside python-telegram-bot's asyncio loop, so every completion
+# must be awaited instead of blocking the loop with the sync client.
+# One AsyncOpenAI instance (and one httpx connection pool) is shared by every
+# handler - and by every bot when they run in the same process.
+
+import os
+import httpx
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv("aluraagency_OPEPNAI_API_KEY")
+
+# Set OPENAI_BASE_URL to point the bots at a local fake server (benchmarks)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# Measurement mode: LLM_USAGE_LOG=1 prints prompt / cached prompt tokens per call
+LLM_USAGE_LOG = os.getenv("LLM_USAGE_LOG", "0").lower() in ("1", "true", "yes")
+
+usage_totals = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+_http_client = None
+_client = None
+
+
+def get_client() -> AsyncOpenAI:
+    """Return the shared AsyncOpenAI client (created on first use)"""
+    global _http_client, _client
+
+    if _client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0)
+        )
+        _client = AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            http_client=_http_client
+        )
+
+    return _client
+
+
+def record_usage(response, model=None):
+    """Add a completion's token usage to usage_totals (and log it in measurement mode)"""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+
+    details = getattr(usage, "prompt_tokens_details", None)
+    prompt_tokens = usage.prompt_tokens or 0
+    cached_tokens = (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    usage_totals["calls"] += 1
+    usage_totals["prompt_tokens"] += prompt_tokens
+    usage_totals["cached_tokens"] += cached_tokens
+    usage_totals["completion_tokens"] += usage.completion_tokens or 0
+
+    if LLM_USAGE_LOG:
+        ratio = cached_tokens / prompt_tokens if prompt_tokens else 0
+        print(f"[LLM] {model or response.model}: prompt={prompt_tokens} cached={cached_tokens} ({ratio:.0%}) completion={usage.completion_tokens}")
+
+
+def usage_stats():
+    """Totals since start, with the overall cached-prompt ratio"""
+    stats = dict(usage_totals)
+    stats["cached_ratio"] = round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0
+    return stats
+
+
+async def chat_completion(**kwargs):
+    """Await a chat completion without blocking the event loop"""
+    response = await get_client().chat.completions.create(**kwargs)
+    record_usage(response, kwargs.get("model"))
+    return response
+
+
+async def completion_text(on_text=None, **kwargs):
+    """Return the reply text of a chat completion
+
+    With on_text the completion is streamed and `await on_text(text_so_far)`
+    is called as tokens arrive (see streaming.py).
+    """
+    if on_text is None:
+        response = await chat_completion(**kwargs)
+        return response.choices[0].message.content
+
+    stream = await get_client().chat.completions.create(
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs
+    )
+    parts = []
+    async for chunk in stream:
+        if chunk.usage:
+            record_usage(chunk, kwargs.get("model"))
+        if chunk.choices and chunk.choices[0].delta.content:
+            parts.append(chunk.choices[0].delta.content)
+            await on_text("".join(parts))
+    return "".join(parts)
+
+
+async def close():
+    """Close the shared connection pool (call on shutdown)"""
+    global _http_client, _client
+
+    if _client is not None:
+        await _client.close()
+    _http_client = None
+    _client = None
@@ -0,0 +1,231 @@
+# message_log.py
+# Write-behind logger for chat_bot messages
+#
+# Every bot message used to be its own insert_one round-trip. MessageLog
+# buffers messages and writes them with insert_many, either once
+# WRITE_BATCH_SIZE messages are waiting or WRITE_FLUSH_INTERVAL seconds after
+# the first one was queued - whichever comes first.
+#
+# Durability: each message gets its _id up front and is appended to a local
+# spill file (JSON lines) before add() returns. After a successful flush the
+# file is rewritten with whatever is still pending. On startup recover()
+# re-queues anything a crashed process left in the file; replays are
+# idempotent because duplicate _ids are ignored. Both files live next to this
+# module, so recovery does not depend on the directory the bot started in.
+#
+# A batch whose write fails is retried with backoff at most WRITE_RETRIES
+# times, then moved to the dead-letter file (chat_bot_failed_<script>.jsonl)
+# so later messages are not stuck behind it. Documents MongoDB rejects
+# outright (validation, size) go there straight away.
+#
+# Read-your-writes: MessageStore awaits flush() before reading chat_bot in
+# this process. Other processes (the evaluator) see a message at most
+# WRITE_FLUSH_INTERVAL seconds late; its timestamp is when it was queued,
+# stored_at (set by MessageStore) when it was actually written.
+#
+# CHAT_WRITE_BEHIND=0 turns buffering off (plain insert_one per message).
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId, json_util
+
+from storage import MessageStore, get_store
+
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "1").lower() not in ("0", "false", "no")
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "200"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.25"))
+WRITE_RETRY_MAX = float(os.getenv("WRITE_RETRY_MAX", "10"))
+WRITE_RETRIES = int(os.getenv("WRITE_RETRIES", "5"))
+
+# One spill file per entry script, so a restarted process finds its own leftovers
+_here = os.path.dirname(os.path.abspath(__file__))
+_script = os.path.splitext(os.path.basename(sys.argv[0] or "bot"))[0] or "bot"
+WRITE_SPILL_FILE = os.path.join(_here, os.getenv("WRITE_SPILL_FILE", f"chat_bot_spill_{_script}.jsonl"))
+WRITE_DEAD_LETTER_FILE = os.path.join(_here, os.getenv("WRITE_DEAD_LETTER_FILE", f"chat_bot_failed_{_script}.jsonl"))
+
+DUPLICATE_KEY = 11000
+
+
+def _rejected(error):
+    """{index: error} of the documents a bulk write refused (duplicate _ids are
+    fine - already written), or None if the whole write failed"""
+    details = getattr(error, "details", None) or {}
+    write_errors = details.get("writeErrors") or []
+    if not write_errors or details.get("writeConcernErrors"):
+        return None
+    return {e["index"]: e.get("errmsg") or f"code {e.get('code')}"
+            for e in write_errors if e.get("code") != DUPLICATE_KEY}
+
+
+class MessageLog:
+    """Buffered, crash-safe writer for chat_bot documents"""
+
+    def __init__(self, store: MessageStore, enabled=CHAT_WRITE_BEHIND, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, spill_path=WRITE_SPILL_FILE, max_retries=WRITE_RETRIES,
+                 dead_letter_path=WRITE_DEAD_LETTER_FILE):
+        self.store = store
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.dead_letter_path = dead_letter_path
+        self._pending = []
+        self._spill = None
+        self._timer = None
+        self._size_flush = None
+        self._lock = asyncio.Lock()
+        self._failures = 0
+        self.written = 0
+        self.batches = 0
+        self.recovered = 0
+        self.dead_lettered = 0
+
+        if enabled:
+            store.write_barrier = self.flush
+
+    async def add(self, conversation_id: str, role: str, text: str, chat_id: int, bot_name: str, room_id=None):
+        """Queue one message and return its _id (written within flush_interval)"""
+        if not self.enabled:
+            return await self.store.insert_message(conversation_id, role, text, chat_id, bot_name, room_id)
+
+        message = MessageStore.build_message(conversation_id, role, text, chat_id, bot_name, room_id)
+        message["_id"] = ObjectId()
+        self._append_spill([message])
+        self._pending.append(message)
+
+        if len(self._pending) >= self.batch_size:
+            if self._size_flush is None or self._size_flush.done():
+                self._size_flush = asyncio.create_task(self.flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later(self.flush_interval))
+        return message["_id"]
+
+    async def _flush_later(self, delay):
+        await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far (in order); safe to call any time"""
+        async with self._lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                failed = 0
+                try:
+                    await self.store.insert_messages(batch, ordered=False)
+                except Exception as e:
+                    rejected = _rejected(e)
+                    if rejected is None:
+                        self._failures += 1
+                        if self._failures <= self.max_retries:
+                            delay = min(self.flush_interval * 2 ** self._failures, WRITE_RETRY_MAX)
+                            print(f"[DB] ⚠️  Batch write failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                            self._timer = asyncio.create_task(self._flush_later(delay))
+                            return False
+                        # Move on - a batch that keeps failing must not hold back every later message
+                        print(f"[DB] ❌ Batch write failed {self._failures} times ({type(e).__name__}: {e}) - "
+                              f"{len(batch)} message(s) saved to {self.dead_letter_path}")
+                        self._dead_letter(batch, [f"{type(e).__name__}: {e}"] * len(batch))
+                        failed = len(batch)
+                    elif rejected:
+                        print(f"[DB] ❌ MongoDB rejected {len(rejected)} message(s), saved to {self.dead_letter_path}: "
+                              f"{next(iter(rejected.values()))}")
+                        self._dead_letter([batch[i] for i in rejected], list(rejected.values()))
+                        failed = len(rejected)
+
+                del self._pending[:len(batch)]
+                self._failures = 0
+                self.written += len(batch) - failed
+                self.batches += 1
+
+            self._rewrite_spill()
+            return True
+
+    async def recover(self):
+        """Re-queue and write messages left in the spill file by a crashed run"""
+        if not self.enabled or not os.path.exists(self.spill_path):
+            return 0
+
+        leftovers = []
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    leftovers.append(json_util.loads(line))
+                except ValueError:
+                    pass  # torn last line from a crash mid-write
+
+        queued = {m["_id"] for m in self._pending}
+        leftovers = [m for m in leftovers if m["_id"] not in queued]
+        if leftovers:
+            print(f"[DB] Recovering {len(leftovers)} unsaved message(s) from {self.spill_path}")
+            self._pending[:0] = leftovers
+            self.recovered += len(leftovers)
+            await self.flush()
+        return len(leftovers)
+
+    async def close(self):
+        """Flush what is left and close the spill file"""
+        if self._timer and not self._timer.done():
+            self._timer.cancel()
+        if self._pending:
+            await self.flush()
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    def _open_spill(self):
+        if self._spill is None:
+            self._spill = open(self.spill_path, "a", encoding="utf-8")
+        return self._spill
+
+    def _append_spill(self, messages):
+        spill = self._open_spill()
+        for message in messages:
+            spill.write(json_util.dumps(message) + "\n")
+        spill.flush()
+
+    def _dead_letter(self, messages, errors):
+        """Append messages that could not be written to the dead-letter file"""
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for message, error in zip(messages, errors):
+                f.write(json_util.dumps({"message": message, "error": error, "failed_at": datetime.now()}) + "\n")
+        self.dead_lettered += len(messages)
+
+    def _rewrite_spill(self):
+        """Keep only still-pending messages in the spill file (temp file + os.replace,
+        so a crash leaves either the old or the new file, never an empty one)"""
+        if self._spill:
+            self._spill.close()  # reopened in append mode by the next add()
+            self._spill = None
+        temp_path = self.spill_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for message in self._pending:
+                f.write(json_util.dumps(message) + "\n")
+        os.replace(temp_path, self.spill_path)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "recovered": self.recovered,
+            "dead_lettered": self.dead_lettered
+        }
+
+
+_message_log = None
+
+
+def get_message_log() -> MessageLog:
+    """Return the process-wide MessageLog (created on first use)"""
+    global _message_log
+    if _message_log is None:
+        _message_log = MessageLog(get_store())
+    return _message_log
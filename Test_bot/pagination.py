@@ -0,0 +1,108 @@
+# pagination.py
+# Keyset pagination and NDJSON streaming for the dashboard list endpoints
+#
+# The list endpoints used to build their whole result in memory and return it
+# in one JSON body. Now each page is one indexed range query:
+#
+#   GET /api/...?limit=100                 -> {..., "next_cursor": "eyJ..."}
+#   GET /api/...?limit=100&after=eyJ...    -> the next 100 rows
+#   GET /api/...?format=ndjson             -> every matching row, one JSON
+#                                             object per line, streamed from
+#                                             a server-side cursor
+#
+# A cursor is the sort key of the last row served (base64 of extended JSON),
+# so pages stay stable while new rows are written - unlike skip/offset, which
+# also gets slower the deeper you page.
+
+import base64
+import json
+import os
+
+from bson import json_util
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+DEFAULT_PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Query(...) pattern for the format parameter
+FORMATS = "^(json|ndjson)$"
+
+
+def encode_cursor(doc, sort):
+    """Opaque cursor holding the sort key values of `doc`"""
+    values = [doc.get(field) for field, _ in sort]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    """Sort key values from a cursor made by encode_cursor (400 if it is not one)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def after_filter(sort, values):
+    """Match rows that sort strictly after `values` - e.g. for [(ts, 1), (_id, 1)]:
+    ts > v0  OR  (ts == v0 AND _id > v1)"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        clause[field] = {"$gt" if direction == 1 else "$lt": values[i]}
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def keyset_stages(sort, after=None, limit=None):
+    """$sort / $match-after / $limit stages for an aggregation page"""
+    stages = [{"$sort": dict(sort)}]
+    if after:
+        stages.append({"$match": after_filter(sort, decode_cursor(after, sort))})
+    if limit:
+        stages.append({"$limit": limit + 1})
+    return stages
+
+
+def take_page(docs, sort, limit):
+    """Split limit + 1 fetched docs into (page, next_cursor or None)"""
+    docs = list(docs)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        return docs, encode_cursor(docs[-1], sort)
+    return docs, None
+
+
+def date_range(date_from=None, date_to=None):
+    """{$gte, $lt} condition for a timestamp field, or None when unbounded"""
+    condition = {}
+    if date_from:
+        condition["$gte"] = date_from
+    if date_to:
+        condition["$lt"] = date_to
+    return condition or None
+
+
+def score_band(min_score=None, max_score=None):
+    """{$gte, $lte} condition for a numeric score, or None when unbounded"""
+    condition = {}
+    if min_score is not None:
+        condition["$gte"] = min_score
+    if max_score is not None:
+        condition["$lte"] = max_score
+    return condition or None
+
+
+def ndjson_response(rows):
+    """Stream rows as newline-delimited JSON (same encoding as the JSON endpoints)"""
+    def lines():
+        for row in rows:
+            yield json.dumps(jsonable_encoder(row)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -0,0 +1,35 @@
+# sequences.py
+# Atomic integer sequences backed by one counter document each
+#
+# telegram_chat.py used to number new friends with
+# find_one(sort=[("person_id", -1)]) + 1: a sort over telegram_friends on
+# every new friend, and two friends writing in at the same moment (or two
+# monitor processes) could both get the same person_id. A counter document
+#
+#   counters: {_id: "person_id", seq: 41}
+#
+# is bumped with find_one_and_update($inc, upsert) instead - one round-trip
+# on the _id index, and MongoDB never hands out the same value twice.
+#
+#   seed_sequence(db, "person_id", highest_existing_id)   # once, at startup
+#   person_id = next_sequence(db, "person_id")
+
+from pymongo import ReturnDocument
+
+COUNTERS_COLLECTION = "counters"
+
+
+def seed_sequence(db, name, value):
+    """Make sure the next value of `name` is above `value` (idempotent, never moves it back)"""
+    db[COUNTERS_COLLECTION].update_one({"_id": name}, {"$max": {"seq": value}}, upsert=True)
+
+
+def next_sequence(db, name):
+    """Allocate the next value of `name` (1 for a new sequence)"""
+    counter = db[COUNTERS_COLLECTION].find_one_and_update(
+        {"_id": name},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter["seq"]
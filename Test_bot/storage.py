@@ -0,0 +1,248 @@
+# storage.py
+# Async MongoDB persistence shared by the customer bots
+#
+# Keeps the existing `chat_bot` / `active_test_ids` document schema but exposes
+# awaitable methods, so database round-trips no longer block the Telegram
+# event loop. Set CHAT_STORAGE=memory to run against an in-memory backend
+# (mongomock) with no MongoDB server - handy for local testing and benchmarks.
+# Every write also folds into the conversation_stats rollup (conversation_stats.py).
+
+import os
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo.errors import BulkWriteError, OperationFailure
+
+import conversation_stats
+
+load_dotenv()
+
+MongoDB_Url = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("MONGODB_DB", "Raihan")
+CHAT_STORAGE = os.getenv("CHAT_STORAGE", "mongo")
+
+
+class MotorBackend:
+    """Real MongoDB through motor (one client per process)"""
+
+    def __init__(self, uri=MongoDB_Url, db_name=DB_NAME):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        self.client = AsyncIOMotorClient(uri)
+        self.db = self.client[db_name]
+
+    def collection(self, name):
+        return self.db[name]
+
+    def close(self):
+        self.client.close()
+
+
+class _AsyncCursor:
+    """Motor-like cursor over a sync mongomock cursor"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def skip(self, count):
+        self._cursor = self._cursor.skip(count)
+        return self
+
+    def limit(self, count):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        items = list(self._cursor)
+        return items if length is None else items[:length]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self._cursor:
+            yield item
+
+
+class _AsyncCollection:
+    """Wrap a sync mongomock collection so every call can be awaited like motor"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def aggregate(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.aggregate(*args, **kwargs))
+
+    def watch(self, *args, **kwargs):
+        # What a standalone mongod answers, so callers take their usual polling fallback
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+
+class MemoryBackend:
+    """In-memory backend for offline runs (requires mongomock)"""
+
+    def __init__(self, db_name=DB_NAME):
+        import mongomock
+        self.client = mongomock.MongoClient()
+        self.db = self.client[db_name]
+
+    def collection(self, name):
+        return _AsyncCollection(self.db[name])
+
+    def close(self):
+        self.client.close()
+
+
+class MessageStore:
+    """Awaitable access to chat_bot and active_test_ids"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.chat_collection = backend.collection('chat_bot')
+        self.test_collection = backend.collection('active_test_ids')
+        self.stats_collection = backend.collection(conversation_stats.STATS_COLLECTION)
+        self.track_stats = conversation_stats.CONVERSATION_STATS == "inline"
+        # Awaited before chat_bot reads so buffered writes are visible (see message_log.py)
+        self.write_barrier = None
+
+    @staticmethod
+    def build_message(conversation_id: str, role: str, text: str, chat_id: int, bot_name: str, room_id=None):
+        """Build a chat_bot document (same schema the bots always wrote)"""
+        message = {"conversation_id": conversation_id}
+        if room_id is not None:
+            message["room_id"] = room_id
+        message.update({
+            "bot": bot_name,
+            "role": role,
+            "text": text,
+            "chat_id": chat_id,
+            "timestamp": datetime.now()
+        })
+        return message
+
+    async def insert_message(self, conversation_id: str, role: str, text: str, chat_id: int, bot_name: str, room_id=None):
+        """Insert one message and return its _id"""
+        message = self.build_message(conversation_id, role, text, chat_id, bot_name, room_id)
+        message["stored_at"] = datetime.now()
+        result = await self.chat_collection.insert_one(message)
+        await self._update_stats([message])
+        return result.inserted_id
+
+    async def insert_messages(self, messages: list, ordered=True):
+        """Batch-write already built message documents in one round-trip"""
+        if not messages:
+            return []
+        # When the write happened (timestamp is when the message was queued) - the evaluator's checkpoint
+        stored_at = datetime.now()
+        for message in messages:
+            message["stored_at"] = stored_at
+        try:
+            result = await self.chat_collection.insert_many(messages, ordered=ordered)
+        except BulkWriteError as e:
+            # Roll up only what was written (replayed duplicates are already counted)
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            if ordered:
+                written = messages[:e.details.get("nInserted", 0)]
+            else:
+                written = [m for i, m in enumerate(messages) if i not in failed]
+            await self._update_stats(written)
+            raise
+        await self._update_stats(messages)
+        return result.inserted_ids
+
+    async def _update_stats(self, messages):
+        """Fold new messages into conversation_stats; a failure only logs (--rebuild fixes it)"""
+        if not self.track_stats or not messages:
+            return
+        try:
+            await conversation_stats.apply_async(self.stats_collection, messages)
+        except Exception as e:
+            print(f"[STATS] ⚠️  Could not update conversation_stats: {type(e).__name__}: {e}")
+
+    async def ensure_indexes(self):
+        """Create the shared indexes (see db_schema.py); never fails startup"""
+        import db_schema
+        try:
+            if isinstance(self.backend, MotorBackend):
+                return await db_schema.ensure_indexes_async(self.backend.db)
+            return db_schema.ensure_indexes(self.backend.db)
+        except Exception as e:
+            print(f"[SCHEMA] ⚠️  Could not ensure indexes: {type(e).__name__}: {e}")
+            return []
+
+    async def _sync_writes(self):
+        if self.write_barrier is not None:
+            await self.write_barrier()
+
+    async def find_latest_test(self):
+        """Return the newest active test document (or None)"""
+        return await self.test_collection.find_one(
+            {"status": "active"},
+            sort=[("created_at", -1)]
+        )
+
+    async def get_latest_test_id(self, default="default"):
+        """Return the newest active test_id, or `default` if there is none"""
+        latest_test = await self.find_latest_test()
+        return latest_test['test_id'] if latest_test else default
+
+    async def get_messages(self, conversation_id: str, role: str = None, room_id: int = None):
+        """Return messages for a conversation sorted by timestamp"""
+        await self._sync_writes()
+        query = {"conversation_id": conversation_id}
+        if role:
+            query["role"] = role
+        if room_id is not None:
+            query["room_id"] = room_id
+        return await self.chat_collection.find(query).sort("timestamp", 1).to_list(length=None)
+
+    async def get_recent_chat_messages(self, conversation_id: str, chat_id: int, limit: int = 60, room_id: int = None):
+        """Return the last `limit` messages of one chat (of one bot's room), oldest first"""
+        await self._sync_writes()
+        # The salesperson's chat_id is the same for every bot - room_id keeps personas apart
+        query = {"conversation_id": conversation_id, "chat_id": chat_id}
+        if room_id is not None:
+            query["room_id"] = room_id
+        docs = await self.chat_collection.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
+        docs.reverse()
+        return docs
+
+
+_store = None
+
+
+def create_backend(kind=None):
+    """Create a backend by name: 'mongo' (default) or 'memory'"""
+    kind = (kind or CHAT_STORAGE).lower()
+    if kind == "memory":
+        return MemoryBackend()
+    return MotorBackend()
+
+
+def get_store() -> MessageStore:
+    """Return the process-wide MessageStore (created on first use)"""
+    global _store
+    if _store is None:
+        _store = MessageStore(create_backend())
+    return _store
+
+
+def set_store(store: MessageStore):
+    """Swap the process-wide store (e.g. for an in-memory one)"""
+    global _store
+    _store = store
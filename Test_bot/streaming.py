@@ -0,0 +1,177 @@
+# streaming.py
+# Progressive Telegram replies for streamed LLM completions
+#
+# With STREAM_REPLIES=1 the customer bots send a placeholder right away and
+# edit it as tokens arrive, so the salesperson under test sees the reply start
+# after time-to-first-token instead of after the whole completion. Edits are
+# throttled per chat (Telegram allows roughly one edit per second per chat)
+# and a RetryAfter pauses edits for that chat instead of failing the reply.
+# Several replies of one batch share their chat's slot; it is forgotten when
+# the last of them finishes. If the final edit keeps failing, the full text is
+# sent as a new message. Only the final text is stored (the caller passes it
+# to insert_message).
+#
+# PhraseGuard sits between the completion and update(): text that contains a
+# forbidden phrase (the bots' salesperson-behaviour check) is never shown -
+# the tail that could still grow into one is held back, and on a match the
+# stream stops updating so the caller's regenerated reply replaces it.
+
+import asyncio
+import os
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "0").lower() in ("1", "true", "yes")
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+STREAM_PLACEHOLDER = os.getenv("STREAM_PLACEHOLDER", "...")
+
+# (bot, chat_id) -> earliest time the next edit may go out
+_next_edit = {}
+# (bot, chat_id) -> replies started and not finished yet in that chat
+_active = {}
+
+
+class PhraseGuard:
+    """on_text wrapper that never forwards text containing (or ending in the start of) a phrase"""
+
+    def __init__(self, on_text, phrases):
+        self.on_text = on_text
+        self.phrases = [phrase.lower() for phrase in phrases]
+        self.tripped = False
+
+    def _visible(self, text):
+        """The part of `text` that is safe to show, or None once a phrase appeared"""
+        lower = text.lower()
+        if any(phrase in lower for phrase in self.phrases):
+            return None
+        held = 0
+        for phrase in self.phrases:
+            for size in range(min(len(phrase), len(lower)), held, -1):
+                if lower.endswith(phrase[:size]):
+                    held = size
+                    break
+        return text[:len(text) - held]
+
+    async def __call__(self, text):
+        if self.tripped:
+            return
+        visible = self._visible(text)
+        if visible is None:
+            self.tripped = True
+            return
+        await self.on_text(visible)
+
+
+class StreamingReply:
+    """One Telegram message that grows as the reply streams in"""
+
+    def __init__(self, bot, chat_id, reply_to_message_id=None, interval=STREAM_EDIT_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.reply_to_message_id = reply_to_message_id
+        self.interval = interval
+        self.message = None
+        self.shown = None
+        self.edits = 0
+        self._counted = False
+
+    @property
+    def _key(self):
+        return (id(self.bot), self.chat_id)
+
+    async def start(self, placeholder=STREAM_PLACEHOLDER):
+        """Send the placeholder (if that fails, finish() falls back to a normal send)"""
+        if not self._counted:
+            self._counted = True
+            _active[self._key] = _active.get(self._key, 0) + 1
+        try:
+            self.message = await self.bot.send_message(
+                chat_id=self.chat_id,
+                text=placeholder,
+                reply_to_message_id=self.reply_to_message_id
+            )
+            self.shown = placeholder
+        except Exception as e:
+            print(f"[STREAM] Placeholder failed for chat {self.chat_id}: {e}")
+        return self.message
+
+    async def update(self, text):
+        """Show the partial text if this chat's edit slot is free"""
+        if self.message is None or not text.strip() or text == self.shown:
+            return
+        if time.monotonic() < _next_edit.get(self._key, 0):
+            return
+        await self._edit(text)
+
+    async def finish(self, text):
+        """Show the final text (always sent, regardless of throttling)"""
+        try:
+            if self.message is None:
+                return await self.bot.send_message(
+                    chat_id=self.chat_id,
+                    text=text,
+                    reply_to_message_id=self.reply_to_message_id
+                )
+
+            for _ in range(3):
+                if text == self.shown:
+                    return self.message
+                wait = _next_edit.get(self._key, 0) - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._edit(text)
+            if text == self.shown:
+                return self.message
+            return await self._resend(text)
+        finally:
+            self._release()
+
+    async def _resend(self, text):
+        """The final edit kept failing - send the full text instead of leaving a cut-off reply"""
+        print(f"[STREAM] Final edit failed for message {self.message.message_id}, sending the reply instead")
+        sent = await self.bot.send_message(
+            chat_id=self.chat_id,
+            text=text,
+            reply_to_message_id=self.reply_to_message_id
+        )
+        try:
+            await self.bot.delete_message(chat_id=self.chat_id, message_id=self.message.message_id)
+        except Exception as e:
+            print(f"[STREAM] Could not delete the partial reply: {e}")
+        self.message = sent
+        self.shown = text
+        return sent
+
+    def _release(self):
+        """Forget the chat's edit slot once its last streaming reply is done"""
+        if not self._counted:
+            return
+        self._counted = False
+        remaining = _active.get(self._key, 1) - 1
+        if remaining > 0:
+            _active[self._key] = remaining
+        else:
+            _active.pop(self._key, None)
+            _next_edit.pop(self._key, None)
+
+    async def _edit(self, text):
+        _next_edit[self._key] = time.monotonic() + self.interval
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id,
+                message_id=self.message.message_id,
+                text=text
+            )
+        except RetryAfter as e:
+            retry_after = getattr(e.retry_after, "total_seconds", lambda: e.retry_after)()
+            _next_edit[self._key] = time.monotonic() + retry_after
+            print(f"[STREAM] Rate limited in chat {self.chat_id}, next edit in {retry_after}s")
+            return False
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                print(f"[STREAM] Edit failed: {e}")
+                return False
+        self.shown = text
+        self.edits += 1
+        return True
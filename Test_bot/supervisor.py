@@ -0,0 +1,280 @@
+# supervisor.py
+# Asyncio process supervisor for the bot launchers (main.py, test_main.py)
+#
+# The launchers used to start children with stdout/stderr=PIPE and never read
+# the pipes. The bots print on every message, so once the OS pipe buffer
+# (~64 KB) filled up the child blocked inside print() and the bot silently
+# hung. Restarts came from a fixed 5 s poll loop, so a bot that crashed on
+# startup was restarted every 5 s forever.
+#
+# Supervisor runs each child as an asyncio subprocess and:
+#
+#   - drains stdout and stderr continuously into a rotating log file per
+#     child (SUPERVISOR_LOG_DIR/<name>.log, SUPERVISOR_LOG_MAX_BYTES x
+#     SUPERVISOR_LOG_BACKUPS), each line prefixed with the child's tag;
+#     stderr is echoed to the console too (stdout as well with SUPERVISOR_ECHO=1)
+#   - restarts a child as soon as it exits, after an exponential backoff
+#     (RESTART_BASE_DELAY doubling up to RESTART_MAX_DELAY) that resets once
+#     the child has stayed up for RESTART_STABLE_SECONDS
+#   - keeps uptime, restart count and last exit code per child - status(),
+#     print_status(), and a status table every SUPERVISOR_STATUS_INTERVAL
+#
+#   supervisor = Supervisor()
+#   supervisor.add("Starter Bot", "starter_bot2.py", prefix="[STARTER]")
+#   asyncio.run(supervisor.run())        # until Ctrl+C / stop()
+
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+SUPERVISOR_LOG_DIR = os.getenv("SUPERVISOR_LOG_DIR", "logs")
+SUPERVISOR_LOG_MAX_BYTES = int(os.getenv("SUPERVISOR_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+SUPERVISOR_LOG_BACKUPS = int(os.getenv("SUPERVISOR_LOG_BACKUPS", "3"))
+SUPERVISOR_ECHO = os.getenv("SUPERVISOR_ECHO", "0") == "1"
+SUPERVISOR_STATUS_INTERVAL = float(os.getenv("SUPERVISOR_STATUS_INTERVAL", "300"))  # 0 = off
+
+RESTART_BASE_DELAY = float(os.getenv("RESTART_BASE_DELAY", "1"))
+RESTART_MAX_DELAY = float(os.getenv("RESTART_MAX_DELAY", "60"))
+RESTART_STABLE_SECONDS = float(os.getenv("RESTART_STABLE_SECONDS", "60"))
+
+STOP_TIMEOUT = 5
+STARTUP_CHECK_SECONDS = 0.5
+READ_LIMIT = 1024 * 1024  # longest line read in one piece
+
+
+def _slug(name):
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower() or "child"
+
+
+def format_uptime(seconds):
+    """'1h 02m 03s' style uptime"""
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    return f"{minutes}m {seconds:02d}s"
+
+
+class Child:
+    """One supervised script: its process, log and restart bookkeeping"""
+
+    def __init__(self, name, script, prefix=None, args=(), cwd=None):
+        self.name = name
+        self.script = script
+        self.prefix = prefix or f"[{_slug(name).upper()}]"
+        self.args = list(args)
+        self.cwd = cwd
+        self.process = None
+        self.started_at = None  # monotonic time of the current run
+        self.restarts = 0
+        self.last_exit_code = None
+        self.log = self._make_log()
+
+    def _make_log(self):
+        os.makedirs(SUPERVISOR_LOG_DIR, exist_ok=True)
+        log = logging.getLogger(f"supervisor.{_slug(self.name)}")
+        log.setLevel(logging.INFO)
+        log.propagate = False
+        if not log.handlers:
+            handler = RotatingFileHandler(
+                os.path.join(SUPERVISOR_LOG_DIR, f"{_slug(self.name)}.log"),
+                maxBytes=SUPERVISOR_LOG_MAX_BYTES,
+                backupCount=SUPERVISOR_LOG_BACKUPS,
+                encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            log.addHandler(handler)
+        return log
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def uptime(self):
+        return time.monotonic() - self.started_at if self.running and self.started_at else 0.0
+
+    def status(self):
+        return {
+            "name": self.name,
+            "pid": self.process.pid if self.running else None,
+            "running": self.running,
+            "uptime_seconds": round(self.uptime(), 1),
+            "restarts": self.restarts,
+            "last_exit_code": self.last_exit_code
+        }
+
+
+class Supervisor:
+    """Starts the children, drains their output, restarts them with backoff"""
+
+    def __init__(self, status_interval=SUPERVISOR_STATUS_INTERVAL, echo=SUPERVISOR_ECHO):
+        self.children = []
+        self.status_interval = status_interval
+        self.echo = echo
+        self._tasks = []
+        self._stopping = None
+
+    def add(self, name, script, prefix=None, args=(), cwd=None):
+        child = Child(name, script, prefix, args, cwd)
+        self.children.append(child)
+        return child
+
+    # ---- one child --------------------------------------------------------
+
+    async def _spawn(self, child):
+        env = dict(os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+        child.process = await asyncio.create_subprocess_exec(
+            sys.executable, child.script, *child.args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=child.cwd,
+            env=env,
+            limit=READ_LIMIT
+        )
+        child.started_at = time.monotonic()
+        child.log.info(f"{child.prefix} ---- started (PID {child.process.pid}) ----")
+
+    async def _drain(self, child, stream, is_stderr):
+        """Copy one pipe into the child's log until EOF (so the child never blocks)"""
+        tag = f"{child.prefix}[stderr]" if is_stderr else child.prefix
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                # A line longer than READ_LIMIT - take what is buffered
+                line = await stream.read(READ_LIMIT)
+            if not line:
+                return
+            text = line.decode("utf-8", errors="replace").rstrip()
+            if not text:
+                continue
+            child.log.info(f"{tag} {text}")
+            if is_stderr or self.echo:
+                print(f"{tag} {text}")
+
+    async def _run_once(self, child):
+        """Wait for the current process to exit while draining it; (exit code, seconds up)"""
+        drains = [
+            asyncio.create_task(self._drain(child, child.process.stdout, False)),
+            asyncio.create_task(self._drain(child, child.process.stderr, True))
+        ]
+        code = await child.process.wait()
+        await asyncio.gather(*drains)
+        child.last_exit_code = code
+        ran = time.monotonic() - child.started_at
+        child.log.info(f"{child.prefix} ---- exited with code {code} after {format_uptime(ran)} ----")
+        return code, ran
+
+    async def _supervise(self, child):
+        """Run `child` (already spawned) until stop(), restarting it with exponential backoff"""
+        attempt = 0
+        while True:
+            if child.process is not None:
+                code, ran = await self._run_once(child)
+                if self._stopping.is_set():
+                    return
+                if ran >= RESTART_STABLE_SECONDS:
+                    attempt = 0
+                reason = f"stopped (code: {code}) after {format_uptime(ran)}"
+            else:
+                reason = "could not be started"
+
+            delay = min(RESTART_BASE_DELAY * 2 ** attempt, RESTART_MAX_DELAY)
+            attempt += 1
+            print(f"⚠️  {child.name} {reason} - restarting in {delay:g}s")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+            child.restarts += 1
+            print(f"🔄 Restarting {child.name} (restart #{child.restarts})")
+            try:
+                await self._spawn(child)
+            except Exception as e:
+                child.process = None
+                print(f"  ❌ {child.name}: {e}")
+
+    # ---- all children -----------------------------------------------------
+
+    async def start(self):
+        """Start every child and report which ones came up; returns the children running"""
+        self._stopping = asyncio.Event()
+        for child in self.children:
+            try:
+                await self._spawn(child)
+            except Exception as e:
+                child.process = None
+                print(f"  ❌ {child.name}: {e}")
+            self._tasks.append(asyncio.create_task(self._supervise(child)))
+
+        await asyncio.sleep(STARTUP_CHECK_SECONDS)
+        for child in self.children:
+            if child.running:
+                print(f"  ✅ {child.name} (PID: {child.process.pid}) -> {SUPERVISOR_LOG_DIR}/{_slug(child.name)}.log")
+            else:
+                print(f"  ❌ {child.name} failed to start (see {SUPERVISOR_LOG_DIR}/{_slug(child.name)}.log)")
+        if self.status_interval:
+            self._tasks.append(asyncio.create_task(self._report()))
+        return [child for child in self.children if child.running]
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.status_interval)
+            self.print_status()
+
+    async def wait(self):
+        """Supervise until stop() (or cancellation, e.g. Ctrl+C), then stop the children"""
+        try:
+            await self._stopping.wait()
+        finally:
+            await self.shutdown()
+
+    async def run(self):
+        await self.start()
+        await self.wait()
+
+    def stop(self):
+        """Ask run()/wait() to stop every child (call from the supervisor's loop)"""
+        self._stopping.set()
+
+    async def shutdown(self):
+        self._stopping.set()
+        running = [child for child in self.children if child.running]
+        for child in running:
+            try:
+                child.process.terminate()
+            except ProcessLookupError:
+                pass
+        for child in running:
+            try:
+                await asyncio.wait_for(child.process.wait(), STOP_TIMEOUT)
+                print(f"  ⏹️ Stopped {child.name}")
+            except asyncio.TimeoutError:
+                child.process.kill()
+                await child.process.wait()
+                print(f"  ⏹️ Killed {child.name} (did not stop in {STOP_TIMEOUT}s)")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def status(self):
+        return [child.status() for child in self.children]
+
+    def print_status(self):
+        print(f"\n{'-'*70}")
+        print(f"PROCESS STATUS ({datetime.now().strftime('%H:%M:%S')})".center(70))
+        print(f"{'-'*70}")
+        for child in self.children:
+            state = f"✅ up {format_uptime(child.uptime())}" if child.running else "❌ down"
+            exit_code = "" if child.last_exit_code is None else f", last exit {child.last_exit_code}"
+            print(f"  • {child.name:<24} {state:<18} restarts: {child.restarts}{exit_code}")
+        print(f"{'-'*70}\n")
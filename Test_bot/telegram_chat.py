@@ -10,6 +10,13 @@ from pymongo import MongoClient, errors
 import os
 import sys
 import asyncio
+import threading
+
+import chat_compactor
+from db_schema import compaction_pending, ensure_indexes
+from sequences import next_sequence, seed_sequence
+from telegram_entities import EntityCache, display_name
+from telegram_pipeline import ChatDedup, MessagePipeline
 
 if sys.platform == 'win32':
     import io
@@ -40,14 +47,24 @@ else:
     SESSION_EXISTS = False
 
 MY_USER_ID = None
+MY_NAME = "Unknown"
+
+# Duplicate prevention: recent (chat_id, message_id) pairs, bounded per chat
+recent_messages = ChatDedup()
 
-# Duplicate prevention
-processed_ids = set()
-process_lock = asyncio.Lock()
+# Messages are queued here and written in batches (see telegram_pipeline.py)
+pipeline = MessagePipeline(chat_collection)
 
 # Cache for friend person_ids (chat_id -> person_id)
 friend_cache = {}
 
+# Name / username / bot-filter decision per chat (see telegram_entities.py)
+entities = EntityCache()
+ENTITY_STATS_INTERVAL = float(os.getenv("ENTITY_STATS_INTERVAL", "600"))  # 0 = off
+
+# Remove stored duplicates in the background (chat_compactor.py, resumable)
+TELEGRAM_COMPACT = os.getenv("TELEGRAM_COMPACT", "0") == "1"
+
 
 def get_or_create_person_id(chat_id: int, username: str, friend_name: str) -> int:
     """Get existing person_id or create new one for a friend"""
@@ -72,104 +89,69 @@ def get_or_create_person_id(chat_id: int, username: str, friend_name: str) -> in
                 {"$set": updates}
             )
     else:
-        last_friend = friends_collection.find_one(sort=[("person_id", -1)])
-        person_id = (last_friend["person_id"] + 1) if last_friend else 1
+        # Atomic counter (sequences.py) - never the same person_id twice
+        person_id = next_sequence(db, "person_id")
         
-        friends_collection.insert_one({
-            "person_id": person_id,
-            "username": username or "no_username",
-            "chat_id": chat_id,
-            "name": friend_name or "Unknown",
-            "created_at": datetime.now()
-        })
-        print(f"🆕 New friend added: {friend_name} (@{username or 'no_username'}) → Person {person_id}")
+        try:
+            friends_collection.insert_one({
+                "person_id": person_id,
+                "username": username or "no_username",
+                "chat_id": chat_id,
+                "name": friend_name or "Unknown",
+                "created_at": datetime.now()
+            })
+            print(f"🆕 New friend added: {friend_name} (@{username or 'no_username'}) → Person {person_id}")
+        except errors.DuplicateKeyError:
+            # Added concurrently (unique chat_id index) - use that friend's person_id
+            person_id = friends_collection.find_one({"chat_id": chat_id})["person_id"]
     
     friend_cache[chat_id] = person_id
     return person_id
 
 
-def cleanup_database():
-    """Remove ONLY duplicates, keep all unique messages"""
-    print("\n🧹 Cleaning duplicates...")
-    
-    removed = 0
-    
-    pipeline1 = [
-        {"$match": {"message_id": {"$exists": True}}},
-        {"$group": {
-            "_id": {"message_id": "$message_id", "chat_id": "$chat_id"},
-            "docs": {"$push": "$_id"},
-            "count": {"$sum": 1}
-        }},
-        {"$match": {"count": {"$gt": 1}}}
-    ]
-    
-    for doc in chat_collection.aggregate(pipeline1):
-        ids_to_delete = doc['docs'][1:]
-        result = chat_collection.delete_many({"_id": {"$in": ids_to_delete}})
-        removed += result.deleted_count
-    
-    pipeline2 = [
-        {"$match": {"message_id": {"$exists": False}}},
-        {"$group": {
-            "_id": {
-                "chat_id": "$chat_id",
-                "role": "$role",
-                "name": "$name",
-                "text": "$text"
-            },
-            "docs": {"$push": "$_id"},
-            "count": {"$sum": 1}
-        }},
-        {"$match": {"count": {"$gt": 1}}}
-    ]
-    
-    for doc in chat_collection.aggregate(pipeline2):
-        ids_to_delete = doc['docs'][1:]
-        result = chat_collection.delete_many({"_id": {"$in": ids_to_delete}})
-        removed += result.deleted_count
+def prepare_database():
+    """Indexes and counts only - constant time however long the history is"""
+    # Duplicates are refused by the unique indexes (db_schema.py); the ones stored
+    # before them are removed by chat_compactor.py (TELEGRAM_COMPACT=1 runs it here)
+    print("\n🗄️ Preparing database...")
     
     try:
-        chat_collection.create_index(
-            [("message_id", 1), ("chat_id", 1)],
-            unique=True,
-            sparse=True,
-            name="unique_message_idx"
-        )
-    except errors.OperationFailure:
-        pass
-    
-    total = chat_collection.count_documents({})
-    friends_count = friends_collection.count_documents({})
-    
-    if removed > 0:
-        print(f"   ✅ Removed {removed} duplicates")
-    else:
-        print(f"   ✅ No duplicates found")
+        ensure_indexes(db)
+        if compaction_pending(db) and not TELEGRAM_COMPACT:
+            print("   ⚠️ Stored duplicates pending - run chat_compactor.py (or set TELEGRAM_COMPACT=1)")
+    except Exception as e:
+        print(f"   ⚠️ Could not ensure indexes: {e}")
     
-    print(f"   📊 Total messages: {total}")
-    print(f"   👥 Total friends: {friends_count}\n")
+    print(f"   📊 Total messages: ~{chat_collection.estimated_document_count()}")
+    print(f"   👥 Total friends: {friends_collection.estimated_document_count()}\n")
 
 
 def load_friends_cache():
     """Load existing friends into cache"""
     print("👥 Loading friends...")
+    highest = 0
     for friend in friends_collection.find():
         friend_cache[friend["chat_id"]] = friend["person_id"]
+        highest = max(highest, friend["person_id"])
         print(f"   Person {friend['person_id']}: {friend['name']} (@{friend.get('username', 'no_username')})")
     
+    # Start the person_id counter after the existing friends (no-op once it is ahead)
+    seed_sequence(db, "person_id", highest)
+    
     if not friend_cache:
         print("   No friends yet. They will be added automatically when they message you.")
     print()
 
 
+async def get_person_id(chat_id: int, username: str, friend_name: str) -> int:
+    """get_or_create_person_id without blocking the event loop (cached friends need no DB)"""
+    if chat_id in friend_cache:
+        return friend_cache[chat_id]
+    return await asyncio.to_thread(get_or_create_person_id, chat_id, username, friend_name)
+
+
 async def insert_message(person_id: int, message_id: int, chat_id: int, role: str, name: str, text: str):
-    """Store message in MongoDB with duplicate prevention"""
-    
-    async with process_lock:
-        if message_id in processed_ids:
-            return False
-        processed_ids.add(message_id)
+    """Queue a message for MongoDB (written in batches; duplicates dropped by chat_message_unique)"""
     
     message = {
         "person_id": person_id,
@@ -181,16 +163,21 @@ async def insert_message(person_id: int, message_id: int, chat_id: int, role: st
         "timestamp": datetime.now()
     }
     
-    try:
-        chat_collection.insert_one(message)
-        icon = "📤" if role == "sender" else "📥"
-        print(f"{icon} [Person {person_id}] [{role}] {name}: {text[:50]}{'...' if len(text) > 50 else ''}")
-        return True
-    except errors.DuplicateKeyError:
-        return False
-    except Exception as e:
-        print(f"⚠️ DB Error: {e}")
-        return False
+    await pipeline.submit(message)
+    return True
+
+
+def print_entity_stats():
+    stats = entities.stats()
+    if stats["hits"] or stats["misses"]:
+        print(f"[CACHE] Chats: {stats['entries']} cached, hit rate {stats['hit_rate']:.1%} "
+              f"({stats['hits']} hits / {stats['misses']} misses), {stats['denied']} bot messages skipped")
+
+
+async def report_entity_stats():
+    while True:
+        await asyncio.sleep(ENTITY_STATS_INTERVAL)
+        print_entity_stats()
 
 
 @client.on(events.NewMessage)
@@ -200,7 +187,7 @@ async def handle_new_message(event):
     
     message_id = event.message.id
     
-    if message_id in processed_ids:
+    if recent_messages.seen(event.chat_id, message_id):
         return
     
     text = event.message.text
@@ -211,44 +198,22 @@ async def handle_new_message(event):
     if not event.is_private:
         return
     
-    chat = await event.get_chat()
     chat_id = event.chat_id
     
-    # Skip if it's yourself (saved messages)
-    if chat_id == MY_USER_ID:
+    # Cached per chat: skips yourself (saved messages) and ALL bots
+    # (Telegram's bot flag or a username ending in 'bot')
+    info = await entities.get(event, MY_USER_ID)
+    if not info["allowed"]:
         return
-
-    # BLOCK ALL BOTS - Only allow real people
-  
-    # Check 1: Telegram's bot flag
-    if getattr(chat, 'bot', False):
-        return
-    
-    # Check 2: Username ends with 'bot' (case insensitive)
-    username = getattr(chat, 'username', None)
-    if username and username.lower().endswith(('bot', 'Bot')):
-        return
-    
-    # Get friend's username and name
-    chat_username = getattr(chat, 'username', None)
-    friend_first = getattr(chat, 'first_name', '') or ''
-    friend_last = getattr(chat, 'last_name', '') or ''
-    friend_name = f"{friend_first} {friend_last}".strip() or "Unknown"
     
     # Get or create person_id for this friend (automatic!)
-    person_id = get_or_create_person_id(chat_id, chat_username, friend_name)
+    person_id = await get_person_id(chat_id, info["username"], info["name"])
     
-    sender = await event.get_sender()
-    sender_id = sender.id if sender else 0
-    
-    if sender:
-        first = getattr(sender, 'first_name', '') or ''
-        last = getattr(sender, 'last_name', '') or ''
-        name = f"{first} {last}".strip() or "Unknown"
+    # In a private chat the sender is either the friend or you
+    if event.message.sender_id == MY_USER_ID:
+        role, name = "receiver", MY_NAME
     else:
-        name = "Unknown"
-    
-    role = "receiver" if sender_id == MY_USER_ID else "sender"
+        role, name = "sender", info["name"]
     
     await insert_message(
         person_id=person_id,
@@ -261,7 +226,7 @@ async def handle_new_message(event):
 
 
 async def main():
-    global MY_USER_ID
+    global MY_USER_ID, MY_NAME
     
     print("=" * 50)
     print("TELEGRAM AUTO CHAT MONITOR".center(50))
@@ -279,12 +244,16 @@ async def main():
     
     print("🤖 Bot Filter: ON (All bots blocked)")
     
-    # Run cleanup on startup
-    cleanup_database()
+    # Indexes only - duplicate cleanup is chat_compactor.py's job
+    prepare_database()
     
     # Load existing friends
     load_friends_cache()
     
+    reporter = None
+    compactor = None
+    compact_stop = threading.Event()
+    
     # CONNECT WITHOUT ASKING FOR OTP
     try:
         await client.connect()
@@ -297,6 +266,7 @@ async def main():
         
         me = await client.get_me()
         MY_USER_ID = me.id
+        MY_NAME = display_name(me)
         
         print(f"✅ Logged in: {me.first_name} {me.last_name or ''}")
         print(f"🆔 My ID: {MY_USER_ID}")
@@ -305,12 +275,25 @@ async def main():
         print("=" * 50)
         print("\n📡 Listening for messages from real people...\n")
         
+        pipeline.start()
+        if ENTITY_STATS_INTERVAL:
+            reporter = asyncio.create_task(report_entity_stats())
+        if TELEGRAM_COMPACT:
+            compactor = asyncio.create_task(asyncio.to_thread(chat_compactor.compact, db, stop=compact_stop))
         await client.run_until_disconnected()
         
     except Exception as e:
         print(f"\n❌ Connection Error: {e}")
         print("   Please check your internet connection or run my_session.py again")
         print("=" * 50)
+    finally:
+        if reporter:
+            reporter.cancel()
+        if compactor:
+            # Finishes its current batch and saves its position (resumed next start)
+            compact_stop.set()
+        print_entity_stats()
+        await pipeline.close()
 
 
 if __name__ == '__main__':
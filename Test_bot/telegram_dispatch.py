@@ -0,0 +1,151 @@
+# telegram_dispatch.py
+# Async fan-out of Bot API sendMessage calls (one shared httpx client)
+#
+# api_starterbot's /send_testid route is async but used to call blocking
+# requests.post (no timeout) once per bot in a loop, so one slow Telegram call
+# froze the whole ASGI worker and triggering N bots took N round-trips.
+# TelegramDispatcher sends them concurrently instead:
+#
+#   - one httpx.AsyncClient (connection pool) for the process, with
+#     TELEGRAM_SEND_TIMEOUT per request
+#   - per-token rate limit: at most one send per TELEGRAM_MIN_INTERVAL seconds
+#     for each bot token (Telegram allows ~1 message/s per chat), different
+#     tokens never wait on each other
+#   - 429 waits the retry_after Telegram returns (parameters.retry_after or
+#     the Retry-After header) and retries; timeouts, connection errors and 5xx
+#     retry with exponential backoff; other 4xx (and a URL httpx cannot even
+#     build, e.g. a malformed token) fail at once - only that bot's send fails
+#
+#   dispatcher = get_dispatcher()
+#   results = await dispatcher.fan_out([(token, chat_id, text, "bot_1"), ...])
+#
+# TELEGRAM_API_URL points at another Bot API server (e.g. the benchmarks'
+# fake one), as for bot_runtime.py.
+
+import asyncio
+import os
+import random
+import time
+
+import httpx
+
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL") or "https://api.telegram.org/bot"
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", "10"))
+TELEGRAM_SEND_RETRIES = int(os.getenv("TELEGRAM_SEND_RETRIES", "3"))
+TELEGRAM_MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL", "1.0"))
+TELEGRAM_RETRY_BASE = float(os.getenv("TELEGRAM_RETRY_BASE", "0.5"))
+TELEGRAM_MAX_RETRY_AFTER = float(os.getenv("TELEGRAM_MAX_RETRY_AFTER", "30"))
+
+
+def _retry_after(response):
+    """Seconds Telegram asked us to wait on a 429 (body first, then the header)"""
+    try:
+        seconds = response.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        seconds = None
+    if seconds is None:
+        seconds = response.headers.get("retry-after")
+    try:
+        return float(seconds)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _description(response):
+    try:
+        return response.json().get("description") or response.text
+    except ValueError:
+        return response.text
+
+
+class TelegramDispatcher:
+    """Sends Bot API messages concurrently, rate limited per bot token"""
+
+    def __init__(self, api_url=TELEGRAM_API_URL, timeout=TELEGRAM_SEND_TIMEOUT,
+                 max_retries=TELEGRAM_SEND_RETRIES, min_interval=TELEGRAM_MIN_INTERVAL):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.min_interval = min_interval
+        self._client = None
+        self._locks = {}      # token -> asyncio.Lock (one send at a time per token)
+        self._next_send = {}  # token -> monotonic time the next send may start
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "rate_limited": 0}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.timeout, connect=5.0))
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._locks.clear()
+
+    async def _wait_turn(self, token):
+        delay = self._next_send.get(token, 0.0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_message(self, token, chat_id, text, name=None):
+        """POST sendMessage for one bot; returns (ok, error description or None)"""
+        name = name or token.split(":")[0]
+        url = f"{self.api_url}{token}/sendMessage"
+        lock = self._locks.setdefault(token, asyncio.Lock())
+        error = None
+
+        async with lock:
+            for attempt in range(self.max_retries + 1):
+                await self._wait_turn(token)
+                self._next_send[token] = time.monotonic() + self.min_interval
+                try:
+                    response = await self._get_client().post(url, data={"chat_id": chat_id, "text": text})
+                except httpx.InvalidURL as e:
+                    # Not an HTTPError subclass; retrying the same token cannot help
+                    error = f"{type(e).__name__}: {e}"
+                    break
+                except httpx.HTTPError as e:
+                    error = f"{type(e).__name__}: {e}"
+                    delay = TELEGRAM_RETRY_BASE * 2 ** attempt * random.uniform(0.5, 1.0)
+                else:
+                    if response.status_code == 200:
+                        self.stats["sent"] += 1
+                        return True, None
+                    error = _description(response)
+                    if response.status_code == 429:
+                        self.stats["rate_limited"] += 1
+                        delay = min(_retry_after(response), TELEGRAM_MAX_RETRY_AFTER)
+                    elif response.status_code >= 500:
+                        delay = TELEGRAM_RETRY_BASE * 2 ** attempt * random.uniform(0.5, 1.0)
+                    else:
+                        break
+
+                if attempt == self.max_retries:
+                    break
+                self.stats["retries"] += 1
+                print(f"[TG] ⚠️  {name}: {error} - retrying in {delay:.1f}s")
+                self._next_send[token] = max(self._next_send[token], time.monotonic() + delay)
+
+        self.stats["failed"] += 1
+        return False, error
+
+    async def fan_out(self, sends):
+        """Send [(token, chat_id, text, name), ...] concurrently; [(ok, error), ...] in order.
+        An unexpected error fails its own send only."""
+        results = await asyncio.gather(*(self.send_message(*send) for send in sends), return_exceptions=True)
+        return [
+            (False, f"{type(result).__name__}: {result}") if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+
+_dispatcher = None
+
+
+def get_dispatcher() -> TelegramDispatcher:
+    """Process-wide dispatcher (created on first use)"""
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = TelegramDispatcher()
+    return _dispatcher
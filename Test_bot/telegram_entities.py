@@ -0,0 +1,139 @@
+# telegram_entities.py
+# Per-chat metadata cache for the Telethon monitor (telegram_chat.py)
+#
+# handle_new_message awaited event.get_chat() and event.get_sender() for every
+# message - each one a request to Telegram whenever the entity was not in the
+# session cache - and rebuilt the friend's name and the bot-filter decision
+# every time. EntityCache keeps, per chat_id, what the handler needs:
+#
+#   name, username, is_bot, allowed (+ the reason when a chat is ignored)
+#
+# for ENTITY_CACHE_TTL seconds (names and usernames can change), at most
+# ENTITY_CACHE_SIZE chats (least recently used dropped first). Ignored chats
+# (bots) are cached too, so a chatty bot costs a dict lookup instead of a
+# get_chat(). Concurrent misses for the same chat share one lookup. A failed
+# lookup skips the message (reason "lookup_failed") and is retried next time.
+# Hit/miss counters are exposed through stats().
+#
+#   entities = EntityCache()
+#   info = await entities.get(event, MY_USER_ID)
+#   if not info["allowed"]: return
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "3600"))
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+
+
+def display_name(entity):
+    """'First Last' of a Telethon user (or 'Unknown')"""
+    first = getattr(entity, 'first_name', '') or ''
+    last = getattr(entity, 'last_name', '') or ''
+    return f"{first} {last}".strip() or "Unknown"
+
+
+def describe(chat_id, entity, my_user_id=None):
+    """Everything handle_new_message needs about a private chat, with the bot filter applied"""
+    username = getattr(entity, 'username', None)
+    is_bot = bool(getattr(entity, 'bot', False))
+
+    reason = None
+    if chat_id == my_user_id:
+        reason = "self"          # saved messages
+    elif is_bot:
+        reason = "bot"           # Telegram's bot flag
+    elif username and username.lower().endswith('bot'):
+        reason = "bot_username"  # @something_bot without the flag
+
+    return {
+        "chat_id": chat_id,
+        "name": display_name(entity),
+        "username": username,
+        "is_bot": is_bot,
+        "allowed": reason is None,
+        "reason": reason
+    }
+
+
+class EntityCache:
+    """chat_id -> describe() result, with TTL, LRU bound and hit/miss counters"""
+
+    def __init__(self, ttl=ENTITY_CACHE_TTL, max_size=ENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.denied = 0     # messages dropped from ignored chats
+        self.failures = 0   # get_chat() errors (those messages are skipped)
+        self._entries = OrderedDict()  # chat_id -> (expires_at, info)
+        self._pending = {}             # chat_id -> Future of an in-flight lookup
+
+    def peek(self, chat_id):
+        """Fresh cached info for chat_id, or None (no counters, no lookup)"""
+        entry = self._entries.get(chat_id)
+        if entry is None or time.monotonic() >= entry[0]:
+            return None
+        return entry[1]
+
+    def put(self, chat_id, info):
+        self._entries[chat_id] = (time.monotonic() + self.ttl, info)
+        self._entries.move_to_end(chat_id)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return info
+
+    def invalidate(self, chat_id=None):
+        """Forget one chat (or all) so the next message looks it up again"""
+        if chat_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(chat_id, None)
+
+    async def get(self, event, my_user_id=None):
+        """Info for the chat of a Telethon event; get_chat() only on a miss"""
+        chat_id = event.chat_id
+        info = self.peek(chat_id)
+        if info is not None:
+            self.hits += 1
+            self._entries.move_to_end(chat_id)
+        else:
+            self.misses += 1
+            pending = self._pending.get(chat_id)
+            if pending is None:
+                pending = self._pending[chat_id] = asyncio.ensure_future(self._lookup(event, my_user_id))
+                pending.add_done_callback(lambda _: self._pending.pop(chat_id, None))
+            info = await asyncio.shield(pending)
+
+        if not info["allowed"]:
+            self.denied += 1
+        return info
+
+    async def _lookup(self, event, my_user_id):
+        chat_id = event.chat_id
+        try:
+            entity = await event.get_chat()
+        except Exception as e:
+            print(f"⚠️ Could not load chat {chat_id}: {e}")
+            entity = None
+        if entity is None:
+            # Fail closed - without the entity a bot cannot be told apart. Not
+            # cached, so the next message from this chat retries the lookup.
+            self.failures += 1
+            return {"chat_id": chat_id, "name": "Unknown", "username": None, "is_bot": False,
+                    "allowed": False, "reason": "lookup_failed"}
+        return self.put(chat_id, describe(chat_id, entity, my_user_id))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "denied": self.denied,
+            "failures": self.failures,
+            "ttl": self.ttl
+        }
@@ -0,0 +1,210 @@
+# telegram_pipeline.py
+# Async persistence for the Telethon monitor (telegram_chat.py)
+#
+# handle_new_message runs on Telethon's event loop but used to do a blocking
+# insert_one per message (plus up to three friend lookups), so a burst of
+# private messages stalled the MTProto connection. It also kept every
+# message_id it had ever seen in one unbounded set - and message ids are only
+# unique per chat, so two chats could shadow each other's messages.
+#
+#   ChatDedup        - bounded LRU of recent message ids per chat
+#                      (DEDUP_PER_CHAT ids x DEDUP_MAX_CHATS chats)
+#   MessagePipeline  - in-memory queue drained by one writer task: up to
+#                      TELEGRAM_BATCH_SIZE documents per insert_many
+#                      (ordered=False, in a worker thread), collected for at
+#                      most TELEGRAM_FLUSH_INTERVAL seconds. Duplicates that
+#                      slip past the dedup window are dropped by the
+#                      chat_message_unique (chat_id, message_id) index.
+#                      A document MongoDB rejects (any other write error) and
+#                      a batch that still fails after TELEGRAM_WRITE_RETRIES
+#                      attempts are appended to TELEGRAM_SPILL_FILE (JSON
+#                      lines, with the error) instead of blocking the writer.
+#
+# The handler only enqueues, so it returns in microseconds however slow
+# MongoDB is; the log line is printed once the message is stored.
+
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import datetime
+
+from bson import json_util
+from pymongo.errors import BulkWriteError
+
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "10000"))
+TELEGRAM_BATCH_SIZE = int(os.getenv("TELEGRAM_BATCH_SIZE", "200"))
+TELEGRAM_FLUSH_INTERVAL = float(os.getenv("TELEGRAM_FLUSH_INTERVAL", "0.2"))
+TELEGRAM_RETRY_MAX = float(os.getenv("TELEGRAM_RETRY_MAX", "10"))
+TELEGRAM_WRITE_RETRIES = int(os.getenv("TELEGRAM_WRITE_RETRIES", "5"))
+TELEGRAM_SPILL_FILE = os.getenv("TELEGRAM_SPILL_FILE", "telegram_chats_failed.jsonl")
+DEDUP_PER_CHAT = int(os.getenv("DEDUP_PER_CHAT", "500"))
+DEDUP_MAX_CHATS = int(os.getenv("DEDUP_MAX_CHATS", "5000"))
+
+DUPLICATE_KEY = 11000
+
+
+class ChatDedup:
+    """Recently seen message ids, per chat, with bounded memory"""
+
+    def __init__(self, per_chat=DEDUP_PER_CHAT, max_chats=DEDUP_MAX_CHATS):
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self._chats = OrderedDict()  # chat_id -> OrderedDict(message_id -> None)
+
+    def seen(self, chat_id, message_id):
+        """True if (chat_id, message_id) was already seen; records it otherwise"""
+        ids = self._chats.get(chat_id)
+        if ids is None:
+            ids = self._chats[chat_id] = OrderedDict()
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+
+        if message_id in ids:
+            ids.move_to_end(message_id)
+            return True
+        ids[message_id] = None
+        if len(ids) > self.per_chat:
+            ids.popitem(last=False)
+        return False
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._chats.values())
+
+
+def _log_line(message):
+    text = message["text"]
+    icon = "📤" if message["role"] == "sender" else "📥"
+    return f"{icon} [Person {message['person_id']}] [{message['role']}] {message['name']}: {text[:50]}{'...' if len(text) > 50 else ''}"
+
+
+class MessagePipeline:
+    """Queue + batching writer for telegram_chats documents"""
+
+    def __init__(self, collection, batch_size=TELEGRAM_BATCH_SIZE, flush_interval=TELEGRAM_FLUSH_INTERVAL,
+                 queue_size=TELEGRAM_QUEUE_SIZE, verbose=True, max_retries=TELEGRAM_WRITE_RETRIES,
+                 spill_path=TELEGRAM_SPILL_FILE):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.verbose = verbose
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._writer = None
+        self.stats = {"queued": 0, "written": 0, "duplicates": 0, "batches": 0, "retries": 0, "spilled": 0}
+
+    def start(self):
+        """Start the writer task on the running loop (idempotent)"""
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run())
+        return self._writer
+
+    async def submit(self, message):
+        """Queue one document (waits only if TELEGRAM_QUEUE_SIZE are already waiting)"""
+        self.stats["queued"] += 1
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            await self._queue.put(message)
+
+    async def _collect(self):
+        """Next batch: wait for one document, then up to flush_interval for more"""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _insert(self, batch):
+        """insert_many in a worker thread; returns (duplicate indices, {index: error} of rejected ones)
+
+        With ordered=False every other document is written, so per-document
+        errors are reported, not raised - only batch-level failures raise.
+        """
+        try:
+            self.collection.insert_many(batch, ordered=False)
+            return set(), {}
+        except BulkWriteError as e:
+            if e.details.get("writeConcernErrors"):
+                raise
+            duplicates, rejected = set(), {}
+            for err in e.details.get("writeErrors", []):
+                if err.get("code") == DUPLICATE_KEY:
+                    duplicates.add(err["index"])
+                else:
+                    rejected[err["index"]] = err.get("errmsg") or f"code {err.get('code')}"
+            return duplicates, rejected
+
+    def _spill(self, messages, errors):
+        """Append documents that could not be written to the spill file"""
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for message, error in zip(messages, errors):
+                f.write(json_util.dumps({"message": message, "error": error, "failed_at": datetime.now()}) + "\n")
+        self.stats["spilled"] += len(messages)
+
+    async def _write(self, batch):
+        failures = 0
+        while True:
+            try:
+                duplicates, rejected = await asyncio.to_thread(self._insert, batch)
+                break
+            except Exception as e:
+                failures += 1
+                if failures > self.max_retries:
+                    # Keep draining the queue - a stuck batch must not stall the handlers
+                    print(f"❌ DB Error: {e} - gave up on {len(batch)} message(s), saved to {self.spill_path}")
+                    await asyncio.to_thread(self._spill, batch, [str(e)] * len(batch))
+                    return
+                self.stats["retries"] += 1
+                delay = min(self.flush_interval * 2 ** failures, TELEGRAM_RETRY_MAX)
+                print(f"⚠️ DB Error: {e} - retrying {len(batch)} message(s) in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        if rejected:
+            print(f"❌ MongoDB rejected {len(rejected)} message(s), saved to {self.spill_path}: "
+                  f"{next(iter(rejected.values()))}")
+            await asyncio.to_thread(self._spill, [batch[i] for i in rejected], list(rejected.values()))
+
+        self.stats["batches"] += 1
+        self.stats["written"] += len(batch) - len(duplicates) - len(rejected)
+        self.stats["duplicates"] += len(duplicates)
+        if self.verbose:
+            for i, message in enumerate(batch):
+                if i not in duplicates and i not in rejected:
+                    print(_log_line(message))
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def close(self, timeout=30):
+        """Write everything still queued (up to `timeout` seconds), then stop the writer"""
+        if self._writer is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ {self._queue.qsize()} message(s) not written before shutdown")
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
@@ -1,4 +1,4 @@
-import statistics
+import asyncio
 from pymongo import MongoClient
 from datetime import datetime
 import os
@@ -6,11 +6,14 @@ from dotenv import load_dotenv
 import sys
 import io
 import re
-from openai import OpenAI
 import random
+from active_test import ActiveTestCache
+from db_schema import ensure_indexes
+from evaluation_engine import EvaluationEngine
+import evaluation_checkpoint
 
-# Fix Unicode encoding for Windows console
-if sys.platform == 'win32':
+# Fix Unicode encoding for Windows console (once - test_main.py imports this module)
+if sys.platform == 'win32' and hasattr(sys.stdout, 'buffer') and (sys.stdout.encoding or '').lower() != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
@@ -23,10 +26,11 @@ db = mongo_client['Raihan']  # Database name
 conversation_collection = db['chat_bot']  # Collection for conversations
 scores_collection = db['evaluation_scores']  # Collection to store evaluation scores
 test_collection = db['active_test_ids']  # Collection for active test ids
+cache_collection = db['evaluation_cache']  # Per-message scores keyed by content hash
+active_tests = ActiveTestCache(test_collection)  # cached active test_id lookups
 
 # OpenAI setup
 OPENAI_API_KEY = os.getenv("aluraagency_OPEPNAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 SYSTEM_PROMPT = """
 You are **Dr. Sarah Chen**, PhD in Applied Linguistics with 20+ years specializing in:
@@ -367,71 +371,36 @@ Now evaluate the message below and respond with ONLY the score (0-100):
 """
 
 def get_latest_test_id():
-    """Get the most recent active test_id from database"""
+    """Get the most recent active test_id (served from the in-process cache)"""
     try:
-        latest_test = test_collection.find_one(
-            {"status": "active"},
-            sort=[("created_at", -1)]
-        )
-        
-        if latest_test:
-            test_id = latest_test['test_id']
-            print(f"✅ Retrieved latest Test ID: {test_id}")
-            return test_id
-        else:
-            print("⚠️  No active test_id found. Using default.")
-            return "default"
+        return active_tests.get()
     except Exception as e:
         print(f"❌ Error retrieving test_id: {e}")
         return "default"
 
 
-def get_salesperson_messages(test_id):
-    """Get all salesperson messages for a test_id"""
-    messages = conversation_collection.find(
-        {"conversation_id": test_id, "role": "salesperson"}
-    ).sort("timestamp", 1)
+def get_salesperson_messages(test_id, checkpoint=None):
+    """Get the salesperson messages for a test_id added after `checkpoint`"""
+    message_list, newest = evaluation_checkpoint.fetch_new_messages(conversation_collection, test_id, checkpoint)
+    print(f"📥 Found {'new ' if checkpoint else ''}salesperson messages: {len(message_list)}")
+    return message_list, newest
 
-    message_list = []
-    for msg in messages:
-        if "text" in msg and msg["text"].strip():
-            message_list.append({
-                "text": msg["text"],
-                "timestamp": msg.get("timestamp", "N/A")
-            })
 
-    print(f"📥 Found salesperson messages: {len(message_list)}")
-    return message_list
+USER_TEMPLATE = "Evaluate this salesperson message:\n\n\"{text}\"\n\nRespond with only the score (0-100):"
+
+# Scores messages concurrently and caches them (see evaluation_engine.py)
+evaluator = EvaluationEngine(
+    "test_english_level",
+    SYSTEM_PROMPT,
+    USER_TEMPLATE,
+    api_key=OPENAI_API_KEY,
+    cache_collection=cache_collection
+)
 
 
 def evaluate_message(text):
     """Evaluate a single message and return score 0-100"""
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": f"Evaluate this salesperson message:\n\n\"{text}\"\n\nRespond with only the score (0-100):"}
-            ],
-            max_tokens=10,
-            temperature=0.0
-        )
-        
-        result = response.choices[0].message.content.strip()
-        
-        # Extract number from response
-        score_match = re.search(r'\d+', result)
-        if score_match:
-            score = int(score_match.group())
-            score = max(0, min(100, score))
-            return score
-        else:
-            print(f"⚠️  Could not parse score: {result}")
-            return 50
-            
-    except Exception as e:
-        print(f"❌ Evaluation error: {e}")
-        return 50
+    return evaluator.score_sync([text])[0]
 
 
 def calculate_duration(start_time, end_time):
@@ -457,41 +426,69 @@ def get_english_level(score):
 
 
 def analyze_salesperson(test_id):
-    """Main analysis function"""
+    """Main analysis function - scores only the messages added since the last run"""
+    async def run():
+        try:
+            return await analyze_salesperson_async(test_id)
+        finally:
+            await evaluator.aclose()
+
+    return asyncio.run(run())
+
+
+async def analyze_salesperson_async(test_id):
+    """analyze_salesperson for a running event loop (evaluation_worker.py) -
+    several tests can be evaluated at once and the OpenAI client stays open"""
+    
+    existing = await asyncio.to_thread(scores_collection.find_one, {"test_id": test_id})
+    checkpoint = evaluation_checkpoint.usable_checkpoint(existing, evaluator.prompt.version)
+    resumed = checkpoint is not None
     
-    # Get all messages
-    messages = get_salesperson_messages(test_id)
+    # Get the messages added since the checkpoint (all of them on the first run)
+    messages, newest = await asyncio.to_thread(get_salesperson_messages, test_id, checkpoint)
     
-    if not messages:
+    if newest is None:
+        if checkpoint:
+            print("✅ No new messages since the last evaluation")
+            return existing
         print("❌ No messages found!")
         return None
     
-    # Evaluate each message
-   # print(f"\n🔍 Evaluating {len(messages)} messages...\n")
-    scores = []
-    for i, msg in enumerate(messages, 1):
-        score = evaluate_message(msg["text"])
-        scores.append(score)
-      #  print(f"  Message {i}: {score}/100")
+    # Evaluate the new messages concurrently (already scored ones come from the cache)
+    run_stats = {}
+    new_scores = await evaluator.score([msg["text"] for msg in messages], fallback=None, run_stats=run_stats)
+    print(f"🔍 Scored {len(new_scores)} new messages for {test_id} ({run_stats['cache_hits']} from cache, "
+          f"{run_stats['api_calls']} API calls)")
     
-    # Calculate overall score
-    average_score = round(statistics.mean(scores), 2)
+    messages, new_scores, newest = evaluation_checkpoint.scored_prefix(messages, new_scores, newest)
+    if newest is None:
+        return existing
+    
+    checkpoint = evaluation_checkpoint.advance(checkpoint, messages, new_scores, newest, evaluator.prompt.version)
+    if not checkpoint["score_count"]:
+        print("❌ No messages found!")
+        return None
+    
+    # Overall score from the running total
+    total_messages = checkpoint["score_count"]
+    average_score = round(checkpoint["score_sum"] / total_messages, 2)
     
     # Get English level
     level, description = get_english_level(average_score)
     
     # Calculate duration
-    start_time = messages[0]["timestamp"]
-    end_time = messages[-1]["timestamp"]
+    start_time = checkpoint["start_time"]
+    end_time = checkpoint["last_timestamp"]
     duration = calculate_duration(start_time, end_time)
     
-    # Count score distribution
-    excellent = sum(1 for s in scores if s >= 70)
-    good = sum(1 for s in scores if 50 <= s < 70)
-    medium = sum(1 for s in scores if 30 <= s < 50)
-    poor = sum(1 for s in scores if s < 30)
+    # Score distribution
+    distribution = checkpoint["distribution"]
+    excellent = distribution["excellent"]
+    good = distribution["good"]
+    medium = distribution["medium"]
+    poor = distribution["poor"]
     
-    # Save to database
+    # Save to database (in place; individual_scores is appended to)
     result = {
         "test_id": test_id,
         "score": f"{average_score}/100",
@@ -500,24 +497,19 @@ def analyze_salesperson(test_id):
         "start_time": start_time,
         "end_time": end_time,
         "duration": duration,
-        "total_messages": len(messages),
-        "individual_scores": scores,
-        "score_distribution": {
-            "excellent": excellent,
-            "good": good,
-            "medium": medium,
-            "poor": poor
-        },
-        "evaluation_time": datetime.now()
+        "total_messages": total_messages,
+        "score_distribution": dict(distribution),
+        "evaluation_time": datetime.now(),
+        "checkpoint": checkpoint
     }
     
-    # Update or insert
-    existing = scores_collection.find_one({"test_id": test_id})
-    if existing:
-        scores_collection.update_one({"test_id": test_id}, {"$set": result})
-      #  print("\n✅ Updated existing evaluation")
-    else:
-        scores_collection.insert_one(result)
+    saved = await asyncio.to_thread(
+        evaluation_checkpoint.save, scores_collection, test_id, existing, result, new_scores, resumed
+    )
+    if not saved:
+        print("⚠️  Another evaluation updated this test first - skipping")
+        return None
+    if existing is None:
         print("\n✅ Saved new evaluation")
     
     # Display results
@@ -529,13 +521,13 @@ def analyze_salesperson(test_id):
     print(f"  English Level:  {level}")
     print(f"  Assessment:     {description}")
     print(f"  Duration:       {duration}")
-    print(f"  Total Messages: {len(messages)}")
+    print(f"  Total Messages: {total_messages}")
     
     print(f"\n📈 Score Distribution:")
-    print(f"  🟢 Excellent (70-100):  {excellent} messages ({round(excellent/len(scores)*100, 1)}%)")
-    print(f"  🟡 Good (50-69):        {good} messages ({round(good/len(scores)*100, 1)}%)")
-    print(f"  🟠 Medium (30-49):      {medium} messages ({round(medium/len(scores)*100, 1)}%)")
-    print(f"  🔴 Poor (0-29):         {poor} messages ({round(poor/len(scores)*100, 1)}%)")
+    print(f"  🟢 Excellent (70-100):  {excellent} messages ({round(excellent/total_messages*100, 1)}%)")
+    print(f"  🟡 Good (50-69):        {good} messages ({round(good/total_messages*100, 1)}%)")
+    print(f"  🟠 Medium (30-49):      {medium} messages ({round(medium/total_messages*100, 1)}%)")
+    print(f"  🔴 Poor (0-29):         {poor} messages ({round(poor/total_messages*100, 1)}%)")
     print("\n" + "="*70 + "\n")
     
     return result
@@ -547,6 +539,8 @@ def main():
     print("SALESPERSON ENGLISH EVALUATION SYSTEM".center(70))
     print("="*70 + "\n")
     
+    ensure_indexes(db)
+    
     # Get latest test ID
     test_id = get_latest_test_id()
     
@@ -1,12 +1,13 @@
 # test_main.py - Run Starter Bot + 5 Customer Bots + English Evaluation + Telegram Monitor
 
-import subprocess
+import asyncio
 import sys
 import os
-import time
-import threading
 from datetime import datetime
 
+from evaluation_worker import EvaluationWorker
+from supervisor import SUPERVISOR_LOG_DIR, Supervisor
+
 if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -14,58 +15,53 @@ if sys.platform == 'win32':
 
 # FILE CONFIGURATIONS
 STARTER_BOT_SCRIPT = "starter_bot2.py"
+BOT_RUNTIME_SCRIPT = "bot_runtime.py"  # runs all customer bots in one process
 BOT_FILES = ["final_bot1.py", "final_bot2.py", "final_bot3.py", "final_bot4.py", "final_bot5.py"]
-BOT_NAMES = ["Bot_1-Ted", "Bot_2-James", "Bot_3-Charlie", "Bot_4-Jayson", "Bot_5-Peter"]
 EVALUATION_SCRIPT = "test_english_level.py"
 TELEGRAM_MONITOR_SCRIPT = "telegram_chat.py"
-EVALUATION_INTERVAL = 60
 
 
-def start_process(script_file, script_name):
-    """Generic function to start any script"""
-    try:
-        process = subprocess.Popen(
-        [sys.executable, script_file],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        encoding='utf-8',      # Added
-        errors='replace'       # Added - handles undecodable characters
-    )
-        time.sleep(0.5)
-        if process.poll() is None:
-            print(f"  ✅ {script_name} (PID: {process.pid})")
-            return process
-        print(f"  ❌ {script_name} failed to start")
-        return None
-    except Exception as e:
-        print(f"  ❌ {script_name}: {e}")
-        return None
-
-
-def run_evaluation():
-    """Run the evaluation script"""
+# (name, script, log prefix) - started in this order
+PROCESSES = [
+    ("Starter Bot", STARTER_BOT_SCRIPT, "[STARTER]"),
+    ("Customer Bots Runtime", BOT_RUNTIME_SCRIPT, "[BOTS]"),
+    ("Telegram Monitor", TELEGRAM_MONITOR_SCRIPT, "[TELEGRAM]"),
+]
+
+
+async def run_system(evaluation_worker):
+    """Start the bots under the supervisor and keep them running until Ctrl+C"""
+    supervisor = Supervisor()
+    print("🚀 Steps 1-3: Starting Starter Bot, Customer Bots and Telegram Monitor...")
+    for name, script, prefix in PROCESSES:
+        supervisor.add(name, script, prefix=prefix)
+
+    running = {child.name for child in await supervisor.start()}
+
+    # STEP 4: Start the evaluation worker (evaluates right away, then on new messages / every interval)
+    print("\n📊 Step 4: Starting Evaluation Worker...")
+    evaluation_worker.start_in_thread()
+    print(f"  ✅ Evaluation Worker (in process, trigger: {evaluation_worker.trigger})")
+
+    # SUMMARY
+    print(f"\n{'='*70}")
+    print("SYSTEM STATUS".center(70))
+    print(f"{'='*70}")
+    print(f"  • Starter Bot:      {'✅ Running' if 'Starter Bot' in running else '❌ Failed (retrying)'}")
+    print(f"  • Customer Bots:    {'✅ ' + str(len(BOT_FILES)) + ' bots in one process' if 'Customer Bots Runtime' in running else '❌ Failed (retrying)'}")
+    print(f"  • Telegram Monitor: {'✅ Running' if 'Telegram Monitor' in running else '❌ Failed (retrying)'}")
+    print(f"  • Evaluation:       ✅ Running every {evaluation_worker.interval:.0f}s")
+    print(f"  • Logs:             {SUPERVISOR_LOG_DIR}/ (one rotating file per process)")
+    print(f"{'='*70}")
+    print(f"\n📊 Next evaluation in {evaluation_worker.interval:.0f}s")
+    print(f"{'-'*70}")
+    print("Press Ctrl+C to stop all processes")
+    print(f"{'-'*70}\n")
+
     try:
-        result = subprocess.run(
-            [sys.executable, EVALUATION_SCRIPT],
-            capture_output=True,
-            text=True,
-            timeout=120,
-            encoding='utf-8',
-            errors='replace'
-        )
-        if result.stdout.strip():
-            print(result.stdout)
-    except Exception as e:
-        print(f"⚠️ Evaluation Error: {e}")
-
-
-def evaluation_loop(stop_event):
-    """Periodically run evaluation"""
-    while not stop_event.is_set():
-        time.sleep(EVALUATION_INTERVAL)
-        if stop_event.is_set():
-            break
-        run_evaluation()
+        await supervisor.wait()
+    finally:
+        supervisor.print_status()
 
 
 def main():
@@ -74,7 +70,7 @@ def main():
     print(f"{'='*70}\n")
 
     # CHECK ALL REQUIRED FILES
-    required_files = [STARTER_BOT_SCRIPT] + BOT_FILES + [EVALUATION_SCRIPT, TELEGRAM_MONITOR_SCRIPT]
+    required_files = [STARTER_BOT_SCRIPT, BOT_RUNTIME_SCRIPT] + BOT_FILES + [EVALUATION_SCRIPT, TELEGRAM_MONITOR_SCRIPT]
     missing = [f for f in required_files if not os.path.exists(f)]
     if missing:
         print(f"[ERROR] Missing files: {missing}")
@@ -82,111 +78,21 @@ def main():
     
     print("✅ All required files found\n")
     
-    # Store all processes for cleanup
-    all_processes = []
-    
-    # STEP 1: Start Starter Bot (First)
-    print("🚀 Step 1: Starting Starter Bot...")
-    starter_process = start_process(STARTER_BOT_SCRIPT, "Starter Bot")
-    if starter_process:
-        all_processes.append({'name': 'Starter Bot', 'file': STARTER_BOT_SCRIPT, 'process': starter_process})
-    time.sleep(1)
-
-    # STEP 2: Start Customer Bots (1-5)
-    print("\n🤖 Step 2: Starting Customer Bots...")
-    bot_processes = []
-    for bot_file, bot_name in zip(BOT_FILES, BOT_NAMES):
-        proc = start_process(bot_file, bot_name)
-        if proc:
-            bot_processes.append({'name': bot_name, 'file': bot_file, 'process': proc})
-            all_processes.append({'name': bot_name, 'file': bot_file, 'process': proc})
-        time.sleep(1)
-
-    # STEP 3: Start Telegram Monitor
-    print("\n📡 Step 3: Starting Telegram Monitor...")
-    telegram_process = start_process(TELEGRAM_MONITOR_SCRIPT, "Telegram Monitor")
-    if telegram_process:
-        all_processes.append({'name': 'Telegram Monitor', 'file': TELEGRAM_MONITOR_SCRIPT, 'process': telegram_process})
-    time.sleep(1)
-
-    # STEP 4: Run Initial Evaluation
-    print("\n📊 Step 4: Running Initial Evaluation...")
-    run_evaluation()
+    evaluation_worker = EvaluationWorker()
+    try:
+        asyncio.run(run_system(evaluation_worker))
+    except KeyboardInterrupt:
+        pass
 
-    # SUMMARY
     print(f"\n{'='*70}")
-    print("SYSTEM STATUS".center(70))
-    print(f"{'='*70}")
-    print(f"  • Starter Bot:      {'✅ Running' if starter_process else '❌ Failed'}")
-    print(f"  • Customer Bots:    ✅ {len(bot_processes)}/{len(BOT_FILES)} running")
-    print(f"  • Telegram Monitor: {'✅ Running' if telegram_process else '❌ Failed'}")
-    print(f"  • Evaluation:       ✅ Running every {EVALUATION_INTERVAL}s")
-    print(f"{'='*70}")
-    print(f"\n📊 Next evaluation in {EVALUATION_INTERVAL}s")
-    print(f"{'-'*70}")
-    print("Press Ctrl+C to stop all processes")
-    print(f"{'-'*70}\n")
-    
-    # START EVALUATION LOOP
-    stop_event = threading.Event()
-    eval_thread = threading.Thread(target=evaluation_loop, args=(stop_event,), daemon=True)
-    eval_thread.start()
-    
-    # MONITOR AND AUTO-RESTART LOOP
+    print("[STOP] STOPPING ALL PROCESSES...".center(70))
+    print(f"{'='*70}\n")
+    evaluation_worker.stop()
+    print(f"  ⏹️ Stopped Evaluation Worker ({evaluation_worker.stats['evaluated']} evaluations)")
 
-    try:
-        while True:
-            # Check and restart Starter Bot if needed
-            if starter_process and starter_process.poll() is not None:
-                print("⚠️ Starter Bot restarting...")
-                starter_process = start_process(STARTER_BOT_SCRIPT, "Starter Bot")
-                # Update in all_processes
-                for p in all_processes:
-                    if p['name'] == 'Starter Bot':
-                        p['process'] = starter_process
-            
-            # Check and restart Customer Bots if needed
-            for bot in bot_processes:
-                if bot['process'].poll() is not None:
-                    print(f"⚠️ {bot['name']} restarting...")
-                    new_proc = start_process(bot['file'], bot['name'])
-                    if new_proc:
-                        bot['process'] = new_proc
-                        # Update in all_processes
-                        for p in all_processes:
-                            if p['name'] == bot['name']:
-                                p['process'] = new_proc
-            
-            # Check and restart Telegram Monitor if needed
-            if telegram_process and telegram_process.poll() is not None:
-                print("⚠️ Telegram Monitor restarting...")
-                telegram_process = start_process(TELEGRAM_MONITOR_SCRIPT, "Telegram Monitor")
-                # Update in all_processes
-                for p in all_processes:
-                    if p['name'] == 'Telegram Monitor':
-                        p['process'] = telegram_process
-            
-            time.sleep(5)
-            
-    except KeyboardInterrupt:
-        print(f"\n{'='*70}")
-        print("[STOP] STOPPING ALL PROCESSES...".center(70))
-        print(f"{'='*70}\n")
-        
-        stop_event.set()
-        
-        # Stop all processes
-        for proc_info in all_processes:
-            try:
-                if proc_info['process'] and proc_info['process'].poll() is None:
-                    proc_info['process'].terminate()
-                    print(f"  ⏹️ Stopped {proc_info['name']}")
-            except Exception as e:
-                print(f"  ⚠️ Error stopping {proc_info['name']}: {e}")
-        
-        print(f"\n{'='*70}")
-        print("✅ ALL PROCESSES STOPPED".center(70))
-        print(f"{'='*70}\n")
+    print(f"\n{'='*70}")
+    print("✅ ALL PROCESSES STOPPED".center(70))
+    print(f"{'='*70}\n")
 
 
 if __name__ == "__main__":
@@ -195,8 +101,8 @@ if __name__ == "__main__":
     print("=" * 70)
     print("\nExecution Order:")
     print("  1️⃣  Starter Bot (starter_bot2.py)")
-    print("  2️⃣  Customer Bots (final_bot1-5.py)")
+    print("  2️⃣  Customer Bots (final_bot1-5.py via bot_runtime.py)")
     print("  3️⃣  Telegram Monitor (telegram_chat.py)")
-    print("  4️⃣  English Evaluation (test_english_level.py)")
+    print("  4️⃣  English Evaluation (evaluation_worker.py, in process)")
     print("=" * 70)
     main()
\ No newline at end of file
@@ -6,9 +6,14 @@ from dotenv import load_dotenv
 import sys
 import io
 import re
-from openai import OpenAI
 import random
 
+# Shared bot modules live in Test_bot/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_bot"))
+from active_test import ActiveTestCache
+from db_schema import ensure_indexes
+from evaluation_engine import EvaluationEngine
+
 # Fix Unicode encoding for Windows console
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -23,27 +28,17 @@ db = mongo_client['Raihan']  # Database name
 conversation_collection = db['chat_bot']  # Collection for conversations
 scores_collection = db['evaluation_scores']  # Collection to store evaluation scores
 test_collection = db['active_test_ids']  # Collection for active test ids
+cache_collection = db['evaluation_cache']  # Per-message scores keyed by content hash
+active_tests = ActiveTestCache(test_collection)  # cached active test_id lookups
 
 # OpenAI setup
 OPENAI_API_KEY = os.getenv("My_OPENAI_API_KEY")
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 
 def get_latest_test_id():
-    """Get the most recent active test_id from database"""
+    """Get the most recent active test_id (served from the in-process cache)"""
     try:
-        latest_test = test_collection.find_one(
-            {"status": "active"},
-            sort=[("created_at", -1)]  # Sorting by creation date in descending order
-        )
-        
-        if latest_test:
-            test_id = latest_test['test_id']
-            print(f"✅ Retrieved latest Test ID from database: {test_id}")
-            return test_id
-        else:
-            print("⚠️  No active test_id found in database. Using default.")
-            return "default"
+        return active_tests.get()
     except Exception as e:
         print(f"❌ Error retrieving test_id: {e}")
         return "default"
@@ -79,20 +74,7 @@ def extract_salesperson_messages(test_id):
     return messages
 
 
-def evaluate_single_message(text):
-    """
-    IMPROVED SYSTEM PROMPT FOR SALESPERSON MESSAGE EVALUATION
-    Aligned with 4-tier scoring system:
-    - 🟢 Excellent (70-100): Strong conversion potential
-    - 🟡 Good (50-69): Good potential, minor improvements needed  
-    - 🟠 Medium (30-49): Needs improvement, re-engage
-    - 🔴 Needs Improvement (0-29): Poor English, consider re-qualifying
-    
-    - Evaluate a single message using "GPT-3.5-turbo" model with high-accuracy expert prompt.
-    - Optimized for Australian English and native-level business communication.
-    - Returns a score between 0-100.
-    """
-    system_prompt = """
+SYSTEM_PROMPT = """
     You are **Dr. Sarah Chen**, PhD in Applied Linguistics with 20+ years specializing in:
     - Australian business English communication assessment
     - Sales conversation analysis and effectiveness evaluation
@@ -430,34 +412,32 @@ def evaluate_single_message(text):
     Now evaluate the message below and respond with ONLY the score (0-100):
 """
 
-    try:
-        # Use OpenAI 1.x API syntax
-        response = openai_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[ 
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"Evaluate this salesperson message:\n\n\"{text}\"\n...."}
-            ],
-            max_tokens=10,
-            temperature=0.0
-        )
-        # Access response with new syntax
-        result = response.choices[0].message.content.strip()
-
-        # Extract numerical score
-        score_match = re.search(r'\d+', result)
-        if score_match:
-            score = int(score_match.group())
-            # Ensure score is within valid range
-            score = max(0, min(100, score))
-            return score
-        else:
-            print(f"[WARNING] Could not parse score from: {result}")
-            return 50
+USER_TEMPLATE = "Evaluate this salesperson message:\n\n\"{text}\"\n...."
 
-    except Exception as e:
-        print(f"[ERROR] Failed to evaluate message: {str(e)}")
-        return 50
+# Scores messages concurrently and caches them (see evaluation_engine.py)
+evaluator = EvaluationEngine(
+    "english_level",
+    SYSTEM_PROMPT,
+    USER_TEMPLATE,
+    api_key=OPENAI_API_KEY,
+    cache_collection=cache_collection
+)
+
+
+def evaluate_single_message(text):
+    """
+    IMPROVED SYSTEM PROMPT FOR SALESPERSON MESSAGE EVALUATION
+    Aligned with 4-tier scoring system:
+    - 🟢 Excellent (70-100): Strong conversion potential
+    - 🟡 Good (50-69): Good potential, minor improvements needed  
+    - 🟠 Medium (30-49): Needs improvement, re-engage
+    - 🔴 Needs Improvement (0-29): Poor English, consider re-qualifying
+    
+    - Evaluate a single message using "GPT-3.5-turbo" model with high-accuracy expert prompt.
+    - Optimized for Australian English and native-level business communication.
+    - Returns a score between 0-100.
+    """
+    return evaluator.score_sync([text])[0]
 
 
 def calculate_duration(start_time, end_time):
@@ -493,12 +473,10 @@ def analyze_salesperson_texts(test_id):
         print("[ERROR] No salesperson messages found for the given Test_ID!")
         return None
 
-    # Step 2: Evaluate each message
-    scores = []
-    for idx, message in enumerate(messages, 1):
-        text = message["text"]
-        score = evaluate_single_message(text)
-        scores.append(score)
+    # Step 2: Evaluate all messages concurrently (already scored ones come from the cache)
+    scores = evaluator.score_sync([message["text"] for message in messages])
+    print(f"[INFO] Scored {len(scores)} messages ({evaluator.last_run['cache_hits']} from cache, "
+          f"{evaluator.last_run['api_calls']} API calls)")
 
     # Step 3: Calculate overall score
     if scores:
@@ -541,9 +519,10 @@ def analyze_salesperson_texts(test_id):
 
     existing_record = scores_collection.find_one({"test_id": test_id})
     if existing_record:
+        # A full re-score replaces the incremental checkpoint (test_english_level.py)
         scores_collection.update_one(
             {"test_id": test_id},
-            {"$set": result_data}
+            {"$set": result_data, "$unset": {"checkpoint": ""}}
         )
     else:
         scores_collection.insert_one(result_data)
@@ -581,6 +560,7 @@ def main():
     """
     Main execution function
     """  
+    ensure_indexes(db)
     test_id = get_latest_test_id()  # Dynamically get the latest test_id
 
     print(f"[INFO] Starting evaluation for Test_ID: {test_id}\n")
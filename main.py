@@ -1,11 +1,14 @@
 # main.py
 
-import subprocess
+import asyncio
 import sys
 import os
-import time
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_bot"))
+
+from supervisor import SUPERVISOR_LOG_DIR, Supervisor
+
 
 if sys.platform == 'win32':
     import io
@@ -13,21 +16,19 @@ if sys.platform == 'win32':
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
 
 
-# CORRECT: Without underscores (matching your actual files)
+# All five customer bots (Ted, James, Charlie, Jayson, Peter) run inside one
+# process - see Test_bot/bot_runtime.py for the bot config table
 BOT_FILES = [
-    "final_bot1.py",
-    "final_bot2.py",
-    "final_bot3.py",
-    "final_bot4.py",
-    "final_bot5.py"
+    os.path.join("Test_bot", "bot_runtime.py")
 ]
 
 BOT_NAMES = [
-    "🤖 Bot_1 - Ted (@Cust0m3rBot)",
-    "🤖 Bot_2 - James (@Cust0m4rBot)",
-    "🤖 Bot_3 - Charlie (@Cust0m5rBot)",
-    "🤖 Bot_4 - Jayson (@Cust0m6rBot)",
-    "🤖 Bot_5 - Peter (@Cust0m7rBot)"
+    "🤖 Customer Bots Runtime (Bot_1 - Bot_5)"
+]
+
+# Prefix on every line of each bot's log (logs/<name>.log)
+BOT_PREFIXES = [
+    "[BOTS]"
 ]
 
 def print_header():
@@ -61,32 +62,34 @@ def check_bot_files():
     print(f"✅ All {len(BOT_FILES)} bot files found!\n")
     return True
 
-def start_bot(bot_file, bot_name):
-    """Start a single bot as a subprocess"""
-    try:
+async def run_bots():
+    """Start every bot under the supervisor and keep them running until Ctrl+C"""
+    supervisor = Supervisor()
+    for bot_file, bot_name, prefix in zip(BOT_FILES, BOT_NAMES, BOT_PREFIXES):
         print(f"🚀 Starting {bot_name}...")
-        
-        process = subprocess.Popen(
-            [sys.executable, bot_file],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-        
-        time.sleep(0.5)
-        
-        if process.poll() is None:
-            print(f"   ✅ Started (PID: {process.pid})")
-            return process
-        else:
-            print(f"   ❌ Failed to start")
-            return None
-        
-    except Exception as e:
-        print(f"   ❌ Error: {e}")
-        return None
+        supervisor.add(bot_name, bot_file, prefix=prefix)
+
+    running = await supervisor.start()
+    if not running:
+        print("\n⚠️  No bots came up - retrying with backoff (see the logs)")
+
+    print("\n" + "="*70)
+    print(f"✅ {len(running)}/{len(BOT_FILES)} BOTS RUNNING".center(70))
+    print("="*70)
+    print("\nActive Bots:")
+    for i, child in enumerate(running, 1):
+        print(f"   {i}. {child.name} (PID: {child.process.pid})")
+    print(f"\nBot output: {SUPERVISOR_LOG_DIR}/ (one rotating log per bot)")
+
+    print("\n" + "-"*70)
+    print("Press Ctrl+C to stop all bots".center(70))
+    print("-"*70 + "\n")
+
+    try:
+        await supervisor.wait()
+    finally:
+        supervisor.print_status()
+
 
 def main():
     """Main function to run all bots concurrently"""
@@ -101,67 +104,14 @@ def main():
     print("Starting all customer bots...".center(70))
     print("-"*70 + "\n")
     
-    processes = []
-    
-    for bot_file, bot_name in zip(BOT_FILES, BOT_NAMES):
-        process = start_bot(bot_file, bot_name)
-        if process:
-            processes.append({
-                'file': bot_file,
-                'name': bot_name,
-                'process': process
-            })
-        time.sleep(1)
-    
-    if not processes:
-        print("\n❌ No bots started!")
-        return
-    
-    print("\n" + "="*70)
-    print(f"✅ {len(processes)}/{len(BOT_FILES)} BOTS RUNNING".center(70))
-    print("="*70)
-    print("\nActive Bots:")
-    for i, bot in enumerate(processes, 1):
-        print(f"   {i}. {bot['name']} (PID: {bot['process'].pid})")
-    
-    print("\n" + "-"*70)
-    print("Press Ctrl+C to stop all bots".center(70))
-    print("-"*70 + "\n")
-    
     try:
-        while True:
-            for bot in processes:
-                poll = bot['process'].poll()
-                if poll is not None:
-                    print(f"\n⚠️  {bot['name']} stopped (code: {poll})")
-                    print(f"🔄 Restarting...")
-                    new_process = start_bot(bot['file'], bot['name'])
-                    if new_process:
-                        bot['process'] = new_process
-            
-            time.sleep(5)
-            
+        asyncio.run(run_bots())
     except KeyboardInterrupt:
-        print("\n\n" + "="*70)
-        print("STOPPING ALL BOTS...".center(70))
-        print("="*70 + "\n")
-        
-        for i, bot in enumerate(processes, 1):
-            try:
-                print(f"   {i}. Stopping {bot['name']}...", end=" ")
-                bot['process'].terminate()
-                bot['process'].wait(timeout=5)
-                print("✅")
-            except Exception as e:
-                print(f"❌")
-                try:
-                    bot['process'].kill()
-                except:
-                    pass
-        
-        print("\n" + "="*70)
-        print("ALL BOTS STOPPED".center(70))
-        print("="*70 + "\n")
+        pass
+
+    print("\n" + "="*70)
+    print("ALL BOTS STOPPED".center(70))
+    print("="*70 + "\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,4 +1,5 @@
 import os
+import sys
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
@@ -8,6 +9,13 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
 
+# Shared bot modules live in Test_bot/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_bot"))
+from active_test import ActiveTestCache
+from db_schema import ensure_indexes
+from conversation_stats import ensure_rollup
+from conversation_summary import get_stats, summarise_conversations
+
 load_dotenv()
 
 MongoDB_Url = os.getenv("MONGODB_URI")
@@ -16,24 +24,16 @@ db = client['Raihan']
 collection = db['chat_bot']
 scores_collection = db['evaluation_scores']
 test_collection = db['active_test_ids']
+active_tests = ActiveTestCache(test_collection)
 
 SALES_PERSON_USERNAME = os.getenv("SALES_PERSON_USERNAME", "raihantapader")
 
 
 # Helper function to get latest test_id
 def get_latest_test_id():
-    """Get the most recent active test_id from database"""
+    """Get the most recent active test_id (served from the in-process cache)"""
     try:
-        latest_test = test_collection.find_one(
-            {"status": "active"},
-            sort=[("created_at", -1)]
-        )
-        
-        if latest_test:
-            return latest_test['test_id']
-        else:
-            print("⚠️  No active test_id found in database. Using default.")
-            return "default"
+        return active_tests.get()
     except Exception as e:
         print(f"[DB] Error: {e}")
         return "default"
@@ -94,6 +94,24 @@ class ConversationStats(BaseModel):
     end_time: Optional[datetime]
 
 
+@app.on_event("startup")
+def create_indexes():
+    """Make sure the chat_bot / evaluation_scores / active_test_ids indexes exist"""
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"[SCHEMA] ⚠️  Could not ensure indexes: {e}")
+
+
+@app.on_event("startup")
+def build_conversation_stats():
+    """Build the conversation_stats rollup the first time (kept current by the bots)"""
+    try:
+        ensure_rollup(db)
+    except Exception as e:
+        print(f"[STATS] ⚠️  Could not build conversation_stats: {e}")
+
+
 # API Endpoints
 
 # First API endpoint to check server status
@@ -160,56 +178,6 @@ def get_conversation(conversation_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving messages: {str(e)}")
 
-def calculate_average_response_time(conversation_id: str):
-    """Calculate average response time between customer and salesperson messages"""
-    try:
-        # Get all messages sorted by timestamp
-        all_messages = list(collection.find(
-            {"conversation_id": conversation_id}
-        ).sort("timestamp", 1))
-        
-        if len(all_messages) < 2:
-            return "N/A"
-        
-        response_times = []
-        
-        # Iterate through consecutive messages
-        for i in range(len(all_messages) - 1):
-            current_msg = all_messages[i]
-            next_msg = all_messages[i + 1]
-            
-            current_role = current_msg.get("role")
-            next_role = next_msg.get("role")
-            
-            # Only calculate if roles are different (one person responds to another)
-            if current_role != next_role:
-                time_diff = next_msg["timestamp"] - current_msg["timestamp"]
-                response_time_seconds = time_diff.total_seconds()
-                
-                # Only count positive response times
-                if response_time_seconds > 0:
-                    response_times.append(response_time_seconds)
-        
-        if not response_times:
-            return "N/A"
-        
-        # Calculate average
-        avg_response_time = sum(response_times) / len(response_times)
-        
-        # Format output
-        if avg_response_time < 60:
-            return f"{avg_response_time:.1f} sec"
-        elif avg_response_time < 3600:
-            minutes = avg_response_time / 60
-            return f"{minutes:.1f} min"
-        else:
-            hours = avg_response_time / 3600
-            return f"{hours:.1f} hr"
-            
-    except Exception as e:
-        print(f"[ERROR] Failed to calculate response time for {conversation_id}: {e}")
-        return "N/A"
-
 # Third API endpoint to get all conversation IDs with evaluation
 @app.get("/api/conversations")
 def get_all_conversations():
@@ -218,93 +186,9 @@ def get_all_conversations():
     Only shows conversations that have evaluation scores.
     """
     try:
-        # Get all test_ids that have evaluation scores
-        evaluated_tests = list(scores_collection.find({}))
-        
-        if not evaluated_tests:
-            return {
-                "total_conversations": 0,
-                "conversations": []
-            }
-        
-        conversations = []
-        
-        for eval_record in evaluated_tests:
-            test_id = eval_record.get("test_id")
-            
-            if not test_id:
-                continue
-                
-            print(f"\n[INFO] Processing test_id: {test_id}")
-            
-            # Check if this test_id has messages in chat_bot collection
-            message_count = collection.count_documents({"conversation_id": test_id})
-            
-            if message_count == 0:
-                print(f"[WARNING] No messages found for test_id: {test_id}")
-                continue
-            
-            # Count total messages
-            total_messages = collection.count_documents({"conversation_id": test_id})
-            
-            # Count by role
-            customer_messages = collection.count_documents({
-                "conversation_id": test_id,
-                "role": "customer"
-            })
-            salesperson_messages = collection.count_documents({
-                "conversation_id": test_id,
-                "role": "salesperson"
-            })
-            
-            # Get first and last message
-            first_msg = collection.find_one(
-                {"conversation_id": test_id},
-                sort=[("timestamp", 1)]
-            )
-            last_msg = collection.find_one(
-                {"conversation_id": test_id},
-                sort=[("timestamp", -1)]
-            )
-            
-            # Calculate test duration
-            duration_str = "N/A"
-            if first_msg and last_msg:
-                duration = last_msg["timestamp"] - first_msg["timestamp"]
-                total_seconds = int(duration.total_seconds())
-     
-                hours = total_seconds // 3600
-                total_seconds %= 3600
-                minutes = total_seconds // 60
-                seconds = total_seconds % 60
-
-                duration_str = f"{hours} Hr {minutes} Min {seconds} Sec"
-            
-            # Calculate average response time
-            avg_response_time = calculate_average_response_time(test_id)
-            print(f"[INFO] Average response time: {avg_response_time}")
-            
-            # Get evaluation data (already have it from eval_record)
-            score = eval_record.get("score", "N/A")
-            english_level = eval_record.get("english_level", "N/A")
-            level_description = eval_record.get("assessment", "N/A")
-            
-            print(f"[SUCCESS] Evaluation: Score={score}, Level={english_level}")
-            
-            # Build conversation object
-            conversations.append({
-                "test_id": test_id,
-                "response_time": avg_response_time,
-                "score": score,
-                "english_level": english_level,
-                "level_description": level_description,
-                "total_messages": total_messages,
-                "customer_messages": customer_messages,
-                "salesperson_messages": salesperson_messages,
-                "test_duration": duration_str,
-                "start_time": first_msg["timestamp"] if first_msg else None,
-                "end_time": last_msg["timestamp"] if last_msg else None
-            })
+        # Counts, first/last message and average response time for every
+        # evaluated test in a single aggregation (see conversation_summary.py)
+        conversations = summarise_conversations(scores_collection)
         
         print(f"\n[INFO] Successfully processed {len(conversations)} conversations")
         
@@ -324,78 +208,17 @@ def get_conversation_stats(test_id: str):
     GET method to fetch statistics for a specific test_id.
     """
     try:
-        # Count total messages
-        total_messages = collection.count_documents({"conversation_id": test_id})
+        # Counters, duration and response time come from the conversation_stats rollup
+        # (recomputed from chat_bot when the rollup is missing or behind)
+        stats = get_stats(db, test_id)
         
-        if total_messages == 0:
+        if stats is None:
             raise HTTPException(
                 status_code=404,
                 detail=f"No messages found for test_id: {test_id}"
             )
         
-        # Count by role
-        customer_messages = collection.count_documents({
-            "conversation_id": test_id,
-            "role": "customer"
-        })
-        
-        salesperson_messages = collection.count_documents({
-            "conversation_id": test_id,
-            "role": "salesperson"
-        })
-        
-        # Get first and last message
-        first_msg = collection.find_one(
-            {"conversation_id": test_id},
-            sort=[("timestamp", 1)]
-        )
-        last_msg = collection.find_one(
-            {"conversation_id": test_id},
-            sort=[("timestamp", -1)]
-        )
-        
-        # Calculate duration
-        duration_str = None
-        if first_msg and last_msg:
-            duration = last_msg["timestamp"] - first_msg["timestamp"]
-            total_seconds = int(duration.total_seconds())
- 
-            hours = total_seconds // 3600
-            total_seconds %= 3600
-            minutes = total_seconds // 60
-            seconds = total_seconds % 60
-
-            duration_str = f"{hours} Hr {minutes} Min {seconds} Sec"
-        
-        # Get evaluation data from evaluation_scores collection
-        result_data = scores_collection.find_one({"test_id": test_id})
-        
-        # Default values
-        score = "N/A"
-        english_level = "N/A"
-        level_description = "N/A"
-        
-        # Extract evaluation results
-        if result_data:
-            score = result_data.get("score", "N/A")
-            english_level = result_data.get("english_level", "N/A")
-            level_description = result_data.get("assessment", "N/A")
-        
-        response_time = calculate_average_response_time(test_id)
-        
-        return {
-            "test_id": test_id,
-            "total_messages": total_messages,
-            "customer_messages": customer_messages,
-            "salesperson_messages": salesperson_messages,
-            "duration": duration_str,
-            "score": score,
-            "english_level": english_level,
-            "level_description": level_description,
-            "response_time": response_time,
-            "start_time": first_msg["timestamp"] if first_msg else None,
-            "end_time": last_msg["timestamp"] if last_msg else None,
-        }
+        return stats
         
     except HTTPException:
         raise